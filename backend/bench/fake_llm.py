@@ -0,0 +1,184 @@
+import asyncio
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+@dataclass
+class FakeLlmWorkload:
+    latency: float = 1.0
+    """Seconds per model response"""
+
+
+workload = FakeLlmWorkload()
+"""The workload served by the fake Responses API, set by the benchmark"""
+
+app = FastAPI()
+requests_by_format: dict[str, int] = {}
+"""Number of requests served, by structured output format name"""
+cached_instructions: set[str] = set()
+"""Instructions seen before, which are counted as cached input tokens"""
+CHARS_PER_TOKEN = 4
+
+
+def _post_evaluations(prompt: str) -> dict[str, Any]:
+    return {
+        "evaluations": [
+            {
+                "post_number": int(number),
+                "product_mentioned": True,
+                "prominence_of_product": "medium",
+                "target_group_fit": "high",
+                "post_type": "review",
+                "estimated_ctr": 1.5,
+                "evaluation_text": "A solid review that shows the product in use.",
+            }
+            for number in re.findall(r"^Post (\d+):", prompt, re.MULTILINE)
+        ]
+    }
+
+
+def _payout_decision(prompt: str) -> dict[str, Any]:
+    return {
+        "success": True,
+        "determined_penalty": 0.0,
+        "penalty_reason": "",
+        "determined_bonus": 0.1,
+        "bonus_reason": "Good engagement",
+        "message_to_creator": "Thanks for the great post!",
+    }
+
+
+def _settlement(prompt: str) -> dict[str, Any]:
+    return {
+        "transfers": [
+            {"transfer_number": int(number), "success": True, "error": ""}
+            for number in re.findall(r"^(\d+)\. ", prompt, re.MULTILINE)
+        ]
+    }
+
+
+def _chat_summary(prompt: str) -> dict[str, Any]:
+    return {"summary": "The creator is happy with the payouts so far."}
+
+
+RESPONDERS = {
+    "PostEvaluationBatchResult": _post_evaluations,
+    "ChatHistorySummary": _chat_summary,
+    "PayoutResult": _payout_decision,
+    "SettlementResult": _settlement,
+}
+"""Builds the structured output for each text format the agents use"""
+
+
+STREAM_CHUNK_SIZE = 16
+"""Characters of output text per streamed delta"""
+
+
+def _usage(body: dict[str, Any], text: str) -> dict[str, Any]:
+    """Token usage, as if the instructions are a cached prompt prefix"""
+    instructions = body.get("instructions") or ""
+    cached = len(instructions) // CHARS_PER_TOKEN
+    if instructions not in cached_instructions:
+        cached_instructions.add(instructions)
+        cached = 0
+    input_tokens = (
+        len(instructions) + len(json.dumps(body["input"]))
+    ) // CHARS_PER_TOKEN
+    output_tokens = len(text) // CHARS_PER_TOKEN
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": cached},
+        "output_tokens": output_tokens,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+def _response(body: dict[str, Any], text: str) -> dict[str, Any]:
+    return {
+        "id": f"resp_{time.monotonic_ns()}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "fake"),
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{time.monotonic_ns()}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": _usage(body, text),
+    }
+
+
+async def _stream_events(response: dict[str, Any]) -> AsyncIterator[str]:
+    """
+    The response as server-sent events: the first delta after half the latency,
+    the rest of the text spread over the other half
+    """
+    message = response["output"][0]
+    part = message["content"][0]
+    text = part["text"]
+    chunks = [
+        text[i : i + STREAM_CHUNK_SIZE] for i in range(0, len(text), STREAM_CHUNK_SIZE)
+    ]
+    item = {"item_id": message["id"], "output_index": 0, "content_index": 0}
+    events = [
+        {
+            "type": "response.created",
+            "response": {**response, "status": "in_progress", "output": []},
+        },
+        {
+            "type": "response.output_item.added",
+            "output_index": 0,
+            "item": {**message, "status": "in_progress", "content": []},
+        },
+        {"type": "response.content_part.added", **item, "part": {**part, "text": ""}},
+        *(
+            {
+                "type": "response.output_text.delta",
+                **item,
+                "delta": chunk,
+                "logprobs": [],
+            }
+            for chunk in chunks
+        ),
+        {"type": "response.output_text.done", **item, "text": text, "logprobs": []},
+        {"type": "response.content_part.done", **item, "part": part},
+        {"type": "response.output_item.done", "output_index": 0, "item": message},
+        {"type": "response.completed", "response": response},
+    ]
+    await asyncio.sleep(workload.latency / 2)
+    for sequence_number, event in enumerate(events):
+        event = {**event, "sequence_number": sequence_number}
+        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        if event["type"] == "response.output_text.delta":
+            await asyncio.sleep(workload.latency / 2 / len(chunks))
+
+
+@app.post("/v1/responses")
+async def create_response(request: Request):
+    body = await request.json()
+    format_name = body.get("text", {}).get("format", {}).get("name", "")
+    prompt = body["input"] if isinstance(body["input"], str) else json.dumps(body)
+    requests_by_format[format_name] = requests_by_format.get(format_name, 0) + 1
+
+    response = _response(body, json.dumps(RESPONDERS[format_name](prompt)))
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream_events(response), media_type="text/event-stream"
+        )
+    await asyncio.sleep(workload.latency)
+    return response
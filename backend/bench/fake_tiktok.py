@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+PAGE_SIZE = 30
+"""Videos per page, as returned by TikTok"""
+
+
+@dataclass
+class FakeTiktokWorkload:
+    posts_per_channel: int = int(os.getenv("FAKE_TIKTOK_POSTS_PER_CHANNEL", "30"))
+    latency: float = float(os.getenv("FAKE_TIKTOK_LATENCY", "0.2"))
+    """Seconds per request, i.e. per user info and per page of videos"""
+
+
+workload = FakeTiktokWorkload()
+"""
+The workload served by all FakeTikTokApi instances, set by the benchmark through
+the environment, so that it applies to the scrape worker processes as well
+"""
+
+
+def _number(username: str, salt: str, modulo: int) -> int:
+    digest = hashlib.sha256(f"{username}:{salt}".encode()).digest()
+    return int.from_bytes(digest[:8]) % modulo
+
+
+class _FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+
+class _FakeSession:
+    def __init__(self):
+        self.page = _FakePage()
+
+
+def _video_data(username: str, index: int) -> dict[str, Any]:
+    created = datetime(2025, 1, 1) - timedelta(hours=6 * index)
+    plays = _number(username, f"plays-{index}", 1_000_000)
+    return {
+        "id": f"{_number(username, 'id', 10**12)}{index:06d}",
+        "createTime": int(created.timestamp()),
+        "desc": f"Post {index} of @{username} #ad #languagelearning",
+        "video": {"cover": f"https://example.com/{username}/{index}.jpg"},
+        "stats": {
+            "playCount": plays,
+            "diggCount": plays // 20,
+            "commentCount": plays // 400,
+            "shareCount": plays // 1000,
+            "collectCount": plays // 800,
+        },
+    }
+
+
+class _FakeVideo:
+    def __init__(self, data: dict[str, Any]):
+        self.id = data["id"]
+        self.as_dict = data
+
+
+class _FakeUser:
+    def __init__(self, username: str):
+        self.username = username
+        self.sec_uid: str | None = None
+
+    async def info(self) -> dict[str, Any]:
+        await asyncio.sleep(workload.latency)
+        self.sec_uid = f"sec-{self.username}"
+        return {
+            "userInfo": {
+                "user": {
+                    "id": str(_number(self.username, "id", 10**12)),
+                    "nickname": self.username.title(),
+                    "uniqueId": self.username,
+                    "signature": f"Fake channel {self.username}",
+                    "avatarLarger": f"https://example.com/{self.username}.jpg",
+                },
+                "stats": {
+                    "followerCount": _number(self.username, "followers", 100_000),
+                    "followingCount": _number(self.username, "following", 1_000),
+                    "heartCount": _number(self.username, "hearts", 10_000_000),
+                    "videoCount": workload.posts_per_channel,
+                },
+            }
+        }
+
+
+class FakeTikTokApi:
+    """Stands in for `TikTokApi`, serving deterministic channels and posts"""
+
+    def __init__(self):
+        self.sessions: list[_FakeSession] = []
+
+    async def create_sessions(self, num_sessions: int = 1, **kwargs):
+        await asyncio.sleep(workload.latency)
+        self.sessions = [_FakeSession() for _ in range(num_sessions)]
+
+    async def close_sessions(self):
+        for session in self.sessions:
+            session.page.closed = True
+        self.sessions = []
+
+    def user(self, username: str) -> _FakeUser:
+        return _FakeUser(username)
+
+    def video(self, data: dict[str, Any]) -> _FakeVideo:
+        return _FakeVideo(data)
+
+    async def make_request(
+        self, url: str, params: dict[str, Any], **kwargs
+    ) -> dict[str, Any]:
+        """Serves the pages of videos of a user, by secUid and cursor"""
+        await asyncio.sleep(workload.latency)
+        username = params["secUid"].removeprefix("sec-")
+        start = int(params["cursor"])
+        end = min(
+            start + min(int(params["count"]), PAGE_SIZE), workload.posts_per_channel
+        )
+        return {
+            "itemList": [_video_data(username, index) for index in range(start, end)],
+            "hasMore": end < workload.posts_per_channel,
+            "cursor": end,
+        }
@@ -0,0 +1,388 @@
+"""
+End-to-end load benchmark of the backend, with fake TikTok and LLM backends.
+
+Runs the real app in-process against a fake `TikTokApi` and a fake Responses API
+server, connects N concurrent websocket clients, and reports:
+- connect-to-first-channel latency
+- time to full sync (all channels, posts and visible evaluations)
+- sync bytes per client
+- payouts/sec of a bulk payout
+- RSS per session
+- import time of the app modules, in a fresh interpreter
+
+Results are saved as JSON in bench/results, and compared against a baseline
+result with --baseline.
+
+    uv run python -m bench.run --clients 20 --baseline bench/results/<file>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import jsonpatch
+import uvicorn
+from websockets.asyncio.client import connect
+
+from bench import fake_llm
+
+RESULTS_DIR = Path(__file__).parent / "results"
+BACKEND_DIR = Path(__file__).parent.parent
+IMPORTED_MODULES = {
+    "models": "pay.model, pay.tiktok, pay.agents.post_evaluation_agent, pay.agents.payout_agent",
+    "server": "pay.server",
+}
+"""Modules whose import time is measured, by name"""
+STATE_KEY = "BackendState"
+HIGHER_IS_BETTER = {"payouts_per_sec"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _git_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure_import_times() -> dict[str, float | None]:
+    """Seconds to import the modules, each in a fresh interpreter without secrets"""
+    times = {}
+    for name, modules in IMPORTED_MODULES.items():
+        code = (
+            "import time; started = time.perf_counter(); "
+            f"import {modules}; print(time.perf_counter() - started)"
+        )
+        env = {"PATH": os.environ.get("PATH", "")}
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=BACKEND_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        times[name] = float(result.stdout) if result.returncode == 0 else None
+    return times
+
+
+async def _serve(app: Any, port: int) -> tuple[uvicorn.Server, asyncio.Task[None]]:
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()  # raises the startup error
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+@dataclass
+class BenchClient:
+    """A dashboard client, keeping its own copy of the synced state"""
+
+    session_id: str
+    expected_channels: int
+    expected_posts: int
+    state: dict[str, Any] = field(default_factory=dict)
+    bytes_received: int = 0
+    connected_at: float = 0
+    first_channel_at: float | None = None
+    synced_at: float | None = None
+    toasts: list[str] = field(default_factory=list)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    ws: Any = None
+
+    def is_synced(self) -> bool:
+        counts = self.state.get("postCountsByChannelId", {})
+        if len(self.state.get("channels", [])) < self.expected_channels:
+            return False
+        if any(
+            counts.get(c["id"]) != self.expected_posts for c in self.state["channels"]
+        ):
+            return False
+        evaluations = self.state.get("postEvaluations", {})
+        return all(
+            post["id"] in evaluations
+            for posts in self.state.get("postsByChannelId", {}).values()
+            for post in posts
+        )
+
+    def handle(self, raw: str | bytes):
+        self.bytes_received += len(raw)
+        message = json.loads(raw)
+        event, data = message.get("type"), message.get("data")
+        if event == f"_SET:{STATE_KEY}":
+            self.state = data
+        elif event == f"_PATCH:{STATE_KEY}":
+            jsonpatch.apply_patch(self.state, data, in_place=True)
+        elif event == "_TOAST":
+            self.toasts.extend(
+                data["message"]
+                if isinstance(data["message"], list)
+                else [data["message"]]
+            )
+
+        now = time.perf_counter()
+        if self.first_channel_at is None and self.state.get("channels"):
+            self.first_channel_at = now
+        if self.synced_at is None and self.is_synced():
+            self.synced_at = now
+        self.changed.set()
+
+    async def wait_for(self, condition, timeout: float):
+        async with asyncio.timeout(timeout):
+            while not condition():
+                self.changed.clear()
+                await self.changed.wait()
+
+    async def run(self, url: str, ready: asyncio.Event, done: asyncio.Event):
+        self.connected_at = time.perf_counter()
+        async with connect(f"{url}/ws/{self.session_id}", max_size=None) as ws:
+            self.ws = ws
+            ready.set()
+            receiving = asyncio.create_task(self._receive(ws))
+            await done.wait()
+            receiving.cancel()
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            self.handle(raw)
+
+    async def action(self, action_type: str, **params: Any):
+        await self.ws.send(
+            json.dumps(
+                {
+                    "type": f"_ACTION:{STATE_KEY}",
+                    "data": {"type": action_type, **params},
+                }
+            )
+        )
+
+
+def _summary(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    return {
+        "p50": statistics.median(values),
+        "p95": values[min(len(values) - 1, round(0.95 * (len(values) - 1)))],
+        "max": values[-1],
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict[str, Any]:
+    fake_llm.workload.latency = args.llm_latency
+
+    from pay import config
+
+    config.load()  # before the overrides below, so that .env doesn't replace them
+    llm_port, app_port = _free_port(), _free_port()
+    os.environ.update(
+        ms_token="bench",
+        LOCUS_API_KEY="bench",
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+        PAY_DB_PATH=str(Path(args.workdir) / "pay.db"),
+        POST_EVALUATION_ENGINE="llm",
+        TIKTOK_NUM_SESSIONS=str(args.tiktok_sessions),
+        TIKTOK_SCRAPE_WORKERS=str(args.scrape_workers),
+        TIKTOK_API_CLASS="bench.fake_tiktok:FakeTikTokApi",
+        FAKE_TIKTOK_POSTS_PER_CHANNEL=str(args.posts),
+        FAKE_TIKTOK_LATENCY=str(args.tiktok_latency),
+        PAY_MEDIA_CACHE="false",  # the fake media URLs can't be downloaded
+    )
+    # imported only now, so that the app picks up the environment above
+    from pay.server import app
+    from pay.sessions import session_registry
+
+    tracked_users = [f"bench_user_{i}" for i in range(args.channels)]
+    get_or_create = session_registry.get_or_create
+
+    async def get_or_create_tracking_bench_users(session_id: str):
+        session = await get_or_create(session_id)
+        session.state._tracked_users = tracked_users  # type: ignore[union-attr]
+        return session
+
+    session_registry.get_or_create = get_or_create_tracking_bench_users  # type: ignore[method-assign]
+
+    llm_server, llm_task = await _serve(fake_llm.app, llm_port)
+    app_server, app_task = await _serve(app, app_port)
+    url = f"ws://127.0.0.1:{app_port}"
+
+    expected_posts = min(args.posts, 30)
+    clients = [
+        BenchClient(f"bench-{i}", args.channels, expected_posts)
+        for i in range(args.clients)
+    ]
+    done = asyncio.Event()
+    readies = [asyncio.Event() for _ in clients]
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(client.run(url, ready, done))
+        for client, ready in zip(clients, readies)
+    ]
+    try:
+        async with asyncio.timeout(args.timeout):
+            await asyncio.gather(*(ready.wait() for ready in readies))
+        await asyncio.gather(
+            *(
+                client.wait_for(lambda c=client: c.synced_at is not None, args.timeout)
+                for client in clients
+            )
+        )
+        full_sync_time = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        # bulk payout from one client, every visible post has been evaluated
+        payer = clients[0]
+        payout_started = time.perf_counter()
+        await payer.action("pay_all_eligible_posts", maxBudget=args.payout_budget)
+        await payer.wait_for(
+            lambda: any(t.startswith("Queued") for t in payer.toasts), args.timeout
+        )
+        queued_toast = next(t for t in payer.toasts if t.startswith("Queued"))
+        num_queued = int(re.findall(r"\d+", queued_toast)[0])
+
+        def payouts_finished() -> bool:
+            jobs = payer.state.get("payoutJobs", {}).values()
+            finished = [j for j in jobs if j["status"] not in ("queued", "running")]
+            return len(finished) >= num_queued
+
+        await payer.wait_for(payouts_finished, args.timeout)
+        payout_time = time.perf_counter() - payout_started
+        num_paid = sum(
+            job["status"] == "paid" for job in payer.state["payoutJobs"].values()
+        )
+    finally:
+        done.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        app_server.should_exit = True
+        llm_server.should_exit = True
+        await asyncio.gather(app_task, llm_task, return_exceptions=True)
+
+    return {
+        "connect_to_first_channel_sec": _summary(
+            [c.first_channel_at - c.connected_at for c in clients if c.first_channel_at]
+        ),
+        "time_to_full_sync_sec": _summary(
+            [c.synced_at - c.connected_at for c in clients if c.synced_at]
+        ),
+        "all_clients_synced_sec": full_sync_time,
+        "sync_bytes_per_client": _summary([c.bytes_received for c in clients]),
+        "payouts_queued": num_queued,
+        "payouts_paid": num_paid,
+        "payouts_per_sec": num_paid / payout_time if payout_time else 0.0,
+        "rss_per_session_bytes": (rss_after - rss_before) / len(clients),
+        "llm_requests_by_format": dict(fake_llm.requests_by_format),
+    }
+
+
+def _flatten(metrics: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat |= _flatten(value, f"{prefix}{name}.")
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], threshold: float) -> bool:
+    """Print the change of each metric, returns whether any metric regressed"""
+    current, previous = _flatten(result["metrics"]), _flatten(baseline["metrics"])
+    regressed = False
+    print(f"\nCompared to {baseline['version']} ({baseline['date']}):")
+    for name, value in current.items():
+        if name not in previous or name.startswith("llm_requests_by_format"):
+            continue
+        before = previous[name]
+        change = (value - before) / before if before else 0.0
+        worse = -change if name.split(".")[0] in HIGHER_IS_BETTER else change
+        flag = ""
+        if worse > threshold:
+            flag = "  <-- regression"
+            regressed = True
+        print(f"  {name:45} {before:14.4g} -> {value:14.4g} ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--posts", type=int, default=30, help="per channel")
+    parser.add_argument("--tiktok-latency", type=float, default=0.2)
+    parser.add_argument("--tiktok-sessions", type=int, default=2, help="per worker")
+    parser.add_argument("--scrape-workers", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--payout-budget", type=float, default=1000)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--baseline", type=Path, help="result file to compare to")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="relative change that fails"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        metrics = asyncio.run(run_benchmark(args))
+    metrics["import_sec"] = measure_import_times()
+
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ("workdir", "baseline")
+    }
+    result = {
+        "version": _git_version(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "metrics": metrics,
+    }
+    print(json.dumps(result, indent=2))
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{result['version']}.json"
+    path.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"Saved to {path}")
+
+    if args.baseline and compare(
+        result, json.loads(args.baseline.read_text()), args.threshold
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
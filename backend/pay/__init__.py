@@ -1,6 +0,0 @@
-import logging
-
-import dotenv
-
-logging.basicConfig(level=logging.INFO)
-dotenv.load_dotenv(override=True)
@@ -0,0 +1,3 @@
+COMPANY_INFO = """
+We are Tenmin AI, a language learning platform that helps users learn languages through interactive content and personalized learning paths.
+""".strip()
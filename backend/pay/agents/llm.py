@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from pay import metrics
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+"""Size of the HTTP connection pool to the provider"""
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+"""Max number of model calls in flight, across the whole process"""
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "120"))
+"""Timeout of a single HTTP request, in seconds"""
+CALL_DEADLINE = float(os.getenv("OPENAI_CALL_DEADLINE", "300"))
+"""Deadline of a call including all retries and waiting for a slot, in seconds"""
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("OPENAI_BREAKER_FAILURE_THRESHOLD", "5"))
+"""Consecutive provider failures after which calls fail fast"""
+BREAKER_RESET_TIMEOUT = float(os.getenv("OPENAI_BREAKER_RESET_TIMEOUT", "30"))
+"""Seconds the breaker stays open before letting a trial call through"""
+
+
+class CircuitOpenError(Exception):
+    """The provider is considered degraded, so the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, and then fails calls
+    fast until `reset_timeout` has passed. After that, a single trial call is let
+    through (half-open), which closes the breaker again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_in_flight):
+            raise CircuitOpenError("LLM provider is degraded, failing fast")
+        if state == "half-open":
+            self._trial_in_flight = True
+
+    def release(self):
+        """The call tells nothing about the provider, e.g. it was cancelled"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                logger.warning("LLM circuit breaker opened")
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Rate limits, server errors and connection problems (incl. timeouts)"""
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, APIConnectionError)
+
+
+def _retry_after(e: Exception) -> float | None:
+    from openai import APIStatusError
+
+    if isinstance(e, APIStatusError):
+        try:
+            return float(e.response.headers["retry-after"])
+        except (KeyError, ValueError):
+            return None
+    return None
+
+
+def _observe_request(
+    kwargs: dict[str, Any], started: float, outcome: str, resp: Any = None
+):
+    """Latency of the request, and its token usage if it succeeded"""
+    seconds = time.perf_counter() - started
+    format_name = getattr(kwargs.get("text_format"), "__name__", "text")
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        cached = usage.input_tokens_details.cached_tokens
+        logger.debug(
+            f"LLM request for {format_name} took {seconds:.2f}s, {usage.input_tokens} "
+            f"input tokens ({cached} cached), {usage.output_tokens} output tokens"
+        )
+    if not metrics.ENABLED:
+        return
+    metrics.llm_request_seconds.observe(seconds, format=format_name, outcome=outcome)
+    if usage is not None:
+        metrics.llm_tokens_total.inc(
+            usage.input_tokens, format=format_name, type="input"
+        )
+        metrics.llm_tokens_total.inc(cached, format=format_name, type="cached_input")
+        metrics.llm_tokens_total.inc(
+            usage.output_tokens, format=format_name, type="output"
+        )
+
+
+class LlmClient:
+    """
+    The shared OpenAI client, with an explicit connection pool, per-call deadlines,
+    a process-wide concurrency limit, jittered retries on 429/5xx and a circuit
+    breaker that fails fast while the provider is degraded.
+
+    The OpenAI client itself is built on first use, so importing the agents is cheap
+    and doesn't need the API key.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        max_concurrency: int = MAX_CONCURRENCY,
+        request_timeout: float = REQUEST_TIMEOUT,
+        call_deadline: float = CALL_DEADLINE,
+        max_retries: int = MAX_RETRIES,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.request_timeout = request_timeout
+        self._openai: "AsyncOpenAI | None" = None
+        self.call_deadline = call_deadline
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker(
+            BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            self._openai = AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                timeout=self.request_timeout,
+                max_retries=0,  # retried here, so that the breaker sees every failure
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                    timeout=self.request_timeout,
+                ),
+            )
+        return self._openai
+
+    async def parse(self, retry: bool = True, **kwargs: Any):
+        """
+        `responses.parse` with the limits, retries and breaker applied. Calls with
+        side effects (e.g. tools that send payments) must pass `retry=False`, as a
+        failed request may still have run them.
+        """
+        return await self._call(
+            lambda: self.openai.responses.parse(**kwargs), kwargs, retry
+        )
+
+    async def stream(
+        self,
+        on_event: Callable[[Any], Awaitable[None]],
+        retry: bool = True,
+        **kwargs: Any,
+    ):
+        """
+        `responses.stream`, calling `on_event` with each stream event as it arrives,
+        and returning the final parsed response like `parse`. A retried call starts
+        streaming again from the beginning, so calls with side effects must pass
+        `retry=False` as with `parse`.
+        """
+
+        async def request():
+            async with self.openai.responses.stream(**kwargs) as stream:
+                async for event in stream:
+                    await on_event(event)
+                return await stream.get_final_response()
+
+        return await self._call(request, kwargs, retry)
+
+    async def _call(
+        self,
+        request: Callable[[], Awaitable[Any]],
+        kwargs: dict[str, Any],
+        retry: bool = True,
+    ):
+        async with asyncio.timeout(self.call_deadline):
+            attempt = 0
+            while True:
+                self.breaker.before_call()
+                started = time.perf_counter()
+                try:
+                    async with self._semaphore:
+                        started = time.perf_counter()  # without the queueing
+                        resp = await request()
+                except asyncio.CancelledError:
+                    self.breaker.release()
+                    raise
+                except Exception as e:
+                    _observe_request(kwargs, started, type(e).__name__)
+                    if not _is_retryable(e):
+                        # e.g. a bad request, which tells nothing about the provider
+                        self.breaker.release()
+                        raise
+                    self.breaker.record_failure()
+                    if not retry or attempt >= self.max_retries:
+                        raise
+                    # exponential backoff with full jitter
+                    delay = _retry_after(e) or random.uniform(0, 2**attempt)
+                    logger.warning(f"LLM call failed ({e!r}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                else:
+                    _observe_request(kwargs, started, "success", resp)
+                    self.breaker.record_success()
+                    return resp
+
+    async def close(self):
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+
+
+llm = LlmClient()
+"""The process-wide LLM client, shared by all agents"""
@@ -1,13 +1,23 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Literal
+from typing import Any, Awaitable, Callable, Literal
 
-from openai import AsyncOpenAI
 from pydantic import BaseModel
 
+from pay import config, metrics
+from pay.agents.company import COMPANY_INFO
+from pay.agents.llm import CircuitOpenError, llm
 from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.agents.prompts import Prompt, chat_history_compactor
+from pay.batching import MicroBatcher
+from pay.cache import AsyncTTLCache
 from pay.model import Model
+from pay.pricing import PriceQuote, quote_post
 from pay.tiktok import TiktokChannel, TiktokPost
 
 logger = logging.getLogger(__name__)
@@ -50,13 +60,38 @@ class Payout(Model):
     """Date paid"""
 
 
+PayoutJobStatus = Literal[
+    "queued", "running", "paid", "failed", "skipped", "unconfirmed"
+]
+
+
+class PayoutJob(Model):
+    post_id: str
+    """The post to pay for, a post is paid at most once by a payout job"""
+    channel_id: str
+    """The channel of the post"""
+    status: PayoutJobStatus = "queued"
+    """
+    Current status of the job. A failed job sent nothing, while an unconfirmed job
+    may have paid, and must be reconciled with the wallet before paying again
+    """
+    reserved_budget: float | None = None
+    """Budget reserved for this payout from the shared budget, in USDC"""
+    final_payout: float | None = None
+    """The amount paid, in USDC"""
+    error: str | None = None
+    """Why the job failed, was skipped or is unconfirmed"""
+    date_created: datetime
+    """Date enqueued"""
+    date_updated: datetime
+    """Date of the last status change"""
+
+
 # models for prompting the agent
 class PayoutResult(BaseModel):
+    """The agent's judgement on top of the base payout of the pricing rules"""
+
     success: bool
-    determined_price_per_1k: float
-    """Determined price per 1K views, based on the post evaluation"""
-    determined_base_payout: float
-    """Determined base payout for the post, in USDC"""
     determined_penalty: float
     """Determined penalty for the post, in USDC, so value of x means the payout is reduced by x USDC, always non-negative"""
     penalty_reason: str
@@ -65,33 +100,242 @@ class PayoutResult(BaseModel):
     """Determined bonus for the post, in USDC, so value of x means the payout is increased by x USDC, always non-negative"""
     bonus_reason: str
     """Reason for the bonus"""
-    determined_final_payout: float
-    """Determined final payout based on all factors, in USDC"""
 
     message_to_creator: str
     """A nicely worded message to the creator, to inform them of the payout along with feedback"""
-    destination_wallet_address: str
-    """The destination wallet address to pay the creator to"""
+
+
+# models for streaming the progress of a payout
+PayoutStage = Literal["deciding", "paying", "paid", "failed"]
+
+
+class ToolCallProgress(Model):
+    id: str
+    name: str
+    """Name of the MCP tool"""
+    status: Literal["running", "completed", "failed"] = "running"
+
+
+class PayoutProgress(Model):
+    stage: PayoutStage = "deciding"
+    message_to_creator: str = ""
+    """The message to the creator, partial while the agent is still writing it"""
+    result: PayoutResult | None = None
+    """The agent's decision, once complete"""
+    tool_calls: list[ToolCallProgress] = []
+    """MCP tool calls of the settlement batch the payment is sent in"""
+    error: str | None = None
+
+
+ProgressCallback = Callable[[PayoutProgress], Awaitable[None]]
 
 
 # Agent service
-client = AsyncOpenAI()
-
-LOCUS_API_KEY = os.getenv("LOCUS_API_KEY")
-assert LOCUS_API_KEY is not None
-LOCUS_MCP_TOOL = {
-    "type": "mcp",
-    "server_label": "locus",
-    "server_description": "Agentic payment processing platform, use this to process payments.",
-    "server_url": "https://mcp.paywithlocus.com/mcp",
-    "headers": {
-        "Authorization": f"Bearer {LOCUS_API_KEY}",
-    },
-    "require_approval": "never",
-}
+def locus_mcp_tool() -> dict:
+    return {
+        "type": "mcp",
+        "server_label": "locus",
+        "server_description": "Agentic payment processing platform, use this to process payments.",
+        "server_url": "https://mcp.paywithlocus.com/mcp",
+        "headers": {
+            "Authorization": f"Bearer {config.locus_api_key()}",
+        },
+        "require_approval": "never",
+    }
+
+
+DECISION_CACHE_TTL = float(os.getenv("PAYOUT_DECISION_CACHE_TTL", str(24 * 3600)))
+"""Seconds a payout decision is reused for identical inputs"""
+SETTLEMENT_BATCH_SIZE = int(os.getenv("PAYOUT_SETTLEMENT_BATCH_SIZE", "20"))
+"""Max number of transfers settled in one tool-enabled model call"""
+SETTLEMENT_MAX_WAIT = float(os.getenv("PAYOUT_SETTLEMENT_MAX_WAIT", "2"))
+"""Seconds to wait for more transfers before settling a partial batch"""
+
+PAYOUT_AGENT_INSTRUCTIONS = f"""
+You are a marketing payout agent, as a manager of multiple tiktok UGC (User Generated Content) creators.
+
+Information about the company you work for:
+{COMPANY_INFO}
+
+You are given a tiktok content creator you are currently managing, your chat history with them, one of their posts, its evaluation, and its pricing, already determined by our pricing rules.
+
+Your task is to judge whether the post deserves a bonus (at most the max bonus of the pricing) or a penalty (at most the base payout) on top of the base payout, and why.
+Set success to true if the creator should be paid.
+The payment itself will be sent afterwards.
+
+Finally, output the payout result, with a message to the creator.
+""".strip()
+SETTLEMENT_INSTRUCTIONS = """
+You are the payment executor of a marketing payout agent.
+The given payouts have already been approved, send each of them using the locus MCP.
+
+You need no approval from me, just immediately send the payments!
+Send every payment exactly once, and report for each transfer number whether it was sent.
+""".strip()
+
+
+# models for settling payouts
+class SettledTransfer(BaseModel):
+    transfer_number: int
+    """Number of the transfer, as given in the list of transfers"""
+    success: bool
+    """Whether the payment was sent"""
+    error: str
+    """Why the payment failed, empty on success"""
+
+
+class SettlementResult(BaseModel):
+    transfers: list[SettledTransfer]
+
+
+class PaymentUnconfirmedError(Exception):
+    """
+    The payment may or may not have been sent, so the post must not be paid again
+    before the payment is reconciled
+    """
+
+
+@dataclass
+class PendingTransfer:
+    destination_wallet_address: str
+    amount: float
+    """Amount in USDC"""
+    memo: str
+    on_tool_call: Callable[[ToolCallProgress], Awaitable[None]] | None = None
+    """Called when an MCP tool call of the batch starts or finishes"""
+
+
+class PayoutSettler:
+    """
+    Collects approved payouts and sends them with one tool-enabled model call per
+    batch, instead of one per payout.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SETTLEMENT_BATCH_SIZE,
+        max_wait: float = SETTLEMENT_MAX_WAIT,
+    ):
+        self._batcher: MicroBatcher[PendingTransfer, None] = MicroBatcher(
+            self._settle_batch, batch_size=batch_size, max_wait=max_wait
+        )
+
+    async def settle(
+        self,
+        destination_wallet_address: str,
+        amount: float,
+        memo: str,
+        on_tool_call: Callable[[ToolCallProgress], Awaitable[None]] | None = None,
+    ):
+        """Send the payment as part of the next batch, raises if it failed"""
+        await self._batcher.submit(
+            PendingTransfer(
+                destination_wallet_address=destination_wallet_address,
+                amount=amount,
+                memo=memo,
+                on_tool_call=on_tool_call,
+            )
+        )
+
+    async def _settle_batch(
+        self, batch: list[PendingTransfer]
+    ) -> list[None | Exception]:
+        transfers = "\n".join(
+            f"{i}. {transfer.amount:.2f} USDC to {transfer.destination_wallet_address} ({transfer.memo})"
+            for i, transfer in enumerate(batch, start=1)
+        )
+        listeners = [t.on_tool_call for t in batch if t.on_tool_call is not None]
+
+        async def on_event(event: Any):
+            if event.type not in (
+                "response.output_item.added",
+                "response.output_item.done",
+            ) or (event.item.type != "mcp_call"):
+                return
+            if event.type == "response.output_item.added":
+                status = "running"
+            else:
+                status = "failed" if event.item.error else "completed"
+            tool_call = ToolCallProgress(
+                id=event.item.id, name=event.item.name, status=status
+            )
+            await asyncio.gather(*(listener(tool_call) for listener in listeners))
+
+        # only stream if someone is watching the tool calls. Never retried: the
+        # payments may have been sent by the failed request already
+        call = (
+            (lambda **kwargs: llm.stream(on_event, retry=False, **kwargs))
+            if listeners
+            else (lambda **kwargs: llm.parse(retry=False, **kwargs))
+        )
+        prompt = Prompt(
+            instructions=SETTLEMENT_INSTRUCTIONS,
+            sections=[("Approved payouts", transfers)],
+            cache_key="payout-settlement",
+        )
+        try:
+            resp = await call(
+                model="gpt-5.1",
+                tools=[locus_mcp_tool()],
+                **prompt.request(),
+                text_format=SettlementResult,
+            )
+        except CircuitOpenError:
+            raise  # not attempted, so nothing was sent
+        except Exception as e:
+            logger.exception("Settlement failed, its payments may have been sent")
+            return [
+                PaymentUnconfirmedError(f"Payment outcome unknown: {e!r}")
+                for _ in batch
+            ]
+        logger.info(resp.output_parsed)
+        if resp.output_parsed is None:
+            return [
+                PaymentUnconfirmedError("Payment outcome unknown: no settlement result")
+                for _ in batch
+            ]
+
+        results = {t.transfer_number: t for t in resp.output_parsed.transfers}
+        settled: list[None | Exception] = []
+        for i in range(1, len(batch) + 1):
+            result = results.get(i)
+            if result is None:
+                settled.append(PaymentUnconfirmedError("Payment was not confirmed"))
+            elif result.success:
+                settled.append(None)
+            else:
+                settled.append(RuntimeError(result.error))
+        return settled
+
+
+def _decision_cache_key(
+    creator_channel: TiktokChannel,
+    post: TiktokPost,
+    post_evaluation: TiktokPostEvaluation,
+    chat_between_agent_and_creator: ChatBetweenAgentAndCreator,
+) -> str:
+    """Hash of everything the decision depends on (chat timestamps excluded)"""
+    inputs = json.dumps(
+        [
+            creator_channel.model_dump(mode="json"),
+            post.model_dump(mode="json"),
+            post_evaluation.model_dump(mode="json", exclude={"date_evaluated"}),
+            [
+                (message.role, message.content)
+                for message in chat_between_agent_and_creator.chat_history
+            ],
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha256(inputs.encode()).hexdigest()
 
 
 class PayoutAgentService:
+    decision_cache: AsyncTTLCache[str, PayoutResult] = AsyncTTLCache(
+        ttl=DECISION_CACHE_TTL, max_size=10_000
+    )
+    settler = PayoutSettler()
+
     @staticmethod
     async def evaluate_and_pay_for_post(
         creator_channel: TiktokChannel,
@@ -100,6 +344,7 @@ class PayoutAgentService:
         chat_between_agent_and_creator: ChatBetweenAgentAndCreator,
         destination_wallet_address: str,
         max_budget: float,
+        on_progress: ProgressCallback | None = None,
     ) -> Payout:
         """
         Given:
@@ -107,90 +352,180 @@ class PayoutAgentService:
         - its performance evaluation (by the post evaluation agent)
         - a chat history between the agent and the creator as context
 
-        Agent should:
-        - determine the payout amount
-        - use the locus MCP to pay the tiktok user
+        The base payout is priced by the pricing rules, and the agent should:
+        - judge a bonus or penalty on top of it
         - send chat message to the creator, to inform them of the payout along with feedback
-        """
 
-        agent_prompt = f"""
-You are a marketing payout agent, as a manager of multiple tiktok UGC (User Generated Content) creators.
-
-Information about the company you work for:
-{COMPANY_INFO}
-
-Information about the tiktok content creator you are currently managing:
-{format_creator_info(creator_channel)}
-
-Information about the tiktok post you are currently managing:
-{format_post_info(post)}
-
-Information about the post evaluation:
-{format_post_evaluation_info(post_evaluation)}
+        Deciding and paying are separate stages: the decision is cached, and the
+        payment is settled (with the locus MCP) in a batch together with concurrent
+        payouts. With `on_progress`, the decision is streamed, and the progress is
+        reported as the message is written and the MCP tools are called.
+        """
+        progress = PayoutProgress()
+        streaming = on_progress is not None
+
+        async def report():
+            if on_progress is not None:
+                await on_progress(progress)
+
+        async def on_message(message: str):
+            progress.message_to_creator = message
+            await report()
+
+        async def on_tool_call(tool_call: ToolCallProgress):
+            progress.tool_calls = [
+                *(call for call in progress.tool_calls if call.id != tool_call.id),
+                tool_call,
+            ]
+            await report()
+
+        try:
+            quote = quote_post(post, post_evaluation)
+            result = await PayoutAgentService.decide_payout(
+                creator_channel=creator_channel,
+                post=post,
+                post_evaluation=post_evaluation,
+                chat_between_agent_and_creator=chat_between_agent_and_creator,
+                quote=quote,
+                on_message=on_message if streaming else None,
+            )
+            progress.result = result
+            progress.message_to_creator = result.message_to_creator
+
+            # never pay more than the pricing rules and the budget allow, whatever the
+            # model decided
+            bonus = min(max(result.determined_bonus, 0), quote.max_bonus)
+            penalty = min(max(result.determined_penalty, 0), quote.base_payout)
+            amount = min(round(quote.base_payout + bonus - penalty, 2), max_budget)
+            if result.success and amount > 0:
+                progress.stage = "paying"
+                await report()
+                await PayoutAgentService.settler.settle(
+                    destination_wallet_address=destination_wallet_address,
+                    amount=amount,
+                    memo=f"payout for post {post.id} by @{creator_channel.handle}",
+                    on_tool_call=on_tool_call if streaming else None,
+                )
+                metrics.payouts_total.inc()
+                metrics.payout_usdc_total.inc(amount)
+            else:
+                amount = 0
+
+            chat_between_agent_and_creator.chat_history.append(
+                ChatMessage(
+                    role="payout_agent",
+                    content=result.message_to_creator,
+                    timestamp=datetime.now(),
+                )
+            )
 
-Information about the chat history between the agent and the creator:
-{format_chat_between_agent_and_creator(chat_between_agent_and_creator)}
+            # create final payout object
+            final_payout = Payout(
+                chat_between_agent_and_creator=chat_between_agent_and_creator,
+                number_of_views=post.stats.play_count,
+                determined_price_per_1k=quote.price_per_1k,
+                determined_base_payout=quote.base_payout,
+                determined_penalty=penalty,
+                penalty_reason=result.penalty_reason,
+                determined_bonus=bonus,
+                bonus_reason=result.bonus_reason,
+                determined_final_payout=amount,
+                date_paid=datetime.now(),
+            )
+        except Exception as e:
+            progress.stage = "failed"
+            progress.error = str(e)
+            await report()
+            raise
+        progress.stage = "paid"
+        await report()
 
+        return final_payout
 
-Now, your task is to determine a fair payout amount for the post, based on the information provided. The maximum budget you have is {max_budget} USDC.
+    @staticmethod
+    async def decide_payout(
+        creator_channel: TiktokChannel,
+        post: TiktokPost,
+        post_evaluation: TiktokPostEvaluation,
+        chat_between_agent_and_creator: ChatBetweenAgentAndCreator,
+        quote: PriceQuote,
+        on_message: Callable[[str], Awaitable[None]] | None = None,
+    ) -> PayoutResult:
+        """
+        Stage one: let the agent judge the payout without paying yet.
+        Identical inputs reuse the cached decision, so retries don't query the model again.
+        With `on_message`, the response is streamed, and `on_message` is called with
+        the partial message to the creator whenever it grows.
+        """
+        key = _decision_cache_key(
+            creator_channel, post, post_evaluation, chat_between_agent_and_creator
+        )
 
-Once you have determined the payout amount, use the locus MCP to pay the tiktok user.
-This is their wallet address: {destination_wallet_address}
-You need no approval from me, just immediately send the payment!
+        async def decide() -> PayoutResult:
+            # the creator and chat are shared by the payouts of a creator's posts
+            prompt = Prompt(
+                instructions=PAYOUT_AGENT_INSTRUCTIONS,
+                sections=[
+                    (
+                        "Information about the tiktok content creator",
+                        format_creator_info(creator_channel),
+                    ),
+                    (
+                        "Information about the chat history between the agent and the creator",
+                        await format_chat_between_agent_and_creator(
+                            creator_channel, chat_between_agent_and_creator
+                        ),
+                    ),
+                    ("Information about the tiktok post", format_post_info(post)),
+                    (
+                        "Information about the post evaluation",
+                        format_post_evaluation_info(post_evaluation),
+                    ),
+                    ("Pricing of the post", format_price_quote(quote)),
+                ],
+                cache_key="payout-decision",
+            )
 
-Finally, output the payout result.
-        """.strip()
+            request = dict(
+                model="gpt-5.1",
+                **prompt.request(),
+                # reasoning={"effort": "none"},
+                text_format=PayoutResult,
+            )
+            if on_message is None:
+                resp = await llm.parse(**request)
+            else:
+                message = ""
 
-        resp = await client.responses.parse(
-            model="gpt-5.1",
-            tools=[
-                {
-                    "type": "mcp",
-                    "server_label": "locus",
-                    "server_description": "Agentic payment processing platform, use this to process payments.",
-                    "server_url": "https://mcp.paywithlocus.com/mcp",
-                    "headers": {
-                        "Authorization": f"Bearer {LOCUS_API_KEY}",
-                    },
-                    "require_approval": "never",
-                },
-            ],
-            input=agent_prompt,
-            # reasoning={"effort": "none"},
-            text_format=PayoutResult,
-        )
-        logger.info(resp.output_parsed)
+                async def on_event(event: Any):
+                    nonlocal message
+                    if event.type != "response.output_text.delta":
+                        return
+                    partial = _partial_message_to_creator(event.snapshot)
+                    if partial != message:
+                        message = partial
+                        await on_message(message)
 
-        assert resp.output_parsed is not None
+                resp = await llm.stream(on_event, **request)
+            logger.info(resp.output_parsed)
 
-        chat_between_agent_and_creator.chat_history.append(
-            ChatMessage(
-                role="payout_agent",
-                content=resp.output_parsed.message_to_creator,
-                timestamp=datetime.now(),
-            )
-        )
+            assert resp.output_parsed is not None
+            return resp.output_parsed
 
-        # create final payout object
-        final_payout = Payout(
-            chat_between_agent_and_creator=chat_between_agent_and_creator,
-            number_of_views=post.stats.play_count,
-            determined_price_per_1k=resp.output_parsed.determined_price_per_1k,
-            determined_base_payout=resp.output_parsed.determined_base_payout,
-            determined_penalty=resp.output_parsed.determined_penalty,
-            penalty_reason=resp.output_parsed.penalty_reason,
-            determined_bonus=resp.output_parsed.determined_bonus,
-            bonus_reason=resp.output_parsed.bonus_reason,
-            determined_final_payout=resp.output_parsed.determined_final_payout,
-            date_paid=datetime.now(),
-        )
+        return await PayoutAgentService.decision_cache.get(key, decide)
 
-        return final_payout
 
+def _partial_message_to_creator(snapshot: str) -> str:
+    """`message_to_creator` of the partial JSON of a `PayoutResult`"""
+    from jiter import from_json
 
-COMPANY_INFO = """
-We are Tenmin AI, a language learning platform that helps users learn languages through interactive content and personalized learning paths.
-""".strip()
+    try:
+        partial = from_json(snapshot.encode(), partial_mode="trailing-strings")
+    except ValueError:
+        return ""
+    if not isinstance(partial, dict):
+        return ""
+    return partial.get("message_to_creator", "")
 
 
 def format_creator_info(channel: TiktokChannel) -> str:
@@ -220,16 +555,26 @@ Estimated CTR: {post_evaluation.estimated_ctr}
 """.strip()
 
 
-def format_chat_between_agent_and_creator(
+def format_price_quote(quote: PriceQuote) -> str:
+    return f"""
+Price per 1K views: {quote.price_per_1k} USDC
+Base payout: {quote.base_payout} USDC
+Max bonus: {quote.max_bonus} USDC
+""".strip()
+
+
+async def format_chat_between_agent_and_creator(
+    creator_channel: TiktokChannel,
     chat_between_agent_and_creator: ChatBetweenAgentAndCreator,
 ) -> str:
-    return (
-        f"""
-Chat History with the creator:
-{"\n\n".join([format_chat_message(chat_message) for chat_message in chat_between_agent_and_creator.chat_history])}
-""".strip()
-        or "No chat history"
-    )
+    """The chat, with the older messages summarized if it exceeds the token budget"""
+    messages = [
+        format_chat_message(chat_message)
+        for chat_message in chat_between_agent_and_creator.chat_history
+    ]
+    if not messages:
+        return "No chat history"
+    return await chat_history_compactor.fit(creator_channel.id, messages)
 
 
 def format_chat_message(chat_message: ChatMessage) -> str:
@@ -1,7 +1,33 @@
+import hashlib
+import logging
+import math
+import os
+import random
 from datetime import datetime
 from typing import Literal
 
+from pydantic import BaseModel
+
+from pay.agents.company import COMPANY_INFO
+from pay.agents.llm import LlmClient, llm
+from pay.batching import MicroBatcher
+from pay.cache import AsyncTTLCache
 from pay.model import Model
+from pay.tiktok import TiktokChannel, TiktokPost
+
+logger = logging.getLogger(__name__)
+
+EVALUATION_ENGINE = os.getenv("POST_EVALUATION_ENGINE", "mock")
+"""Either "llm" for the evaluation agent, or "mock" for random evaluations"""
+EVALUATION_MODEL = os.getenv("POST_EVALUATION_MODEL", "gpt-5.1")
+EVALUATION_BATCH_SIZE = int(os.getenv("POST_EVALUATION_BATCH_SIZE", "20"))
+"""Max number of posts evaluated in one model request"""
+EVALUATION_MAX_WAIT = float(os.getenv("POST_EVALUATION_MAX_WAIT", "1"))
+"""Seconds to wait for more posts before evaluating a partial batch"""
+EVALUATION_CONCURRENCY = int(os.getenv("POST_EVALUATION_CONCURRENCY", "4"))
+"""Max number of batches evaluated at the same time"""
+STATS_CHANGE_FACTOR = 1.5
+"""Stats have to grow by this factor before a post is re-evaluated"""
 
 
 class TiktokPostEvaluation(Model):
@@ -23,3 +49,192 @@ class TiktokPostEvaluation(Model):
     """Date evaluated"""
     evaluation_text: str | None = None
     """Evaluation"""
+    content_hash: str | None = None
+    """Hash of the evaluated post content, see `evaluation_content_hash`"""
+
+
+# models for prompting the agent
+class PostEvaluationResult(BaseModel):
+    post_number: int
+    """Number of the post, as given in the list of posts"""
+    product_mentioned: bool
+    """Whether the product is mentioned in the post"""
+    prominence_of_product: Literal["high", "medium", "low"]
+    """How prominent the product is in the post"""
+    target_group_fit: Literal["high", "medium", "low"]
+    """How well the post fits the target group"""
+    post_type: Literal["demo", "review", "product recommendation", "trend", "other"]
+    """Type of post"""
+    estimated_ctr: float
+    """Estimated CTR in percent (typically around 0.2% to 5%)"""
+    evaluation_text: str
+    """A short evaluation of the post, explaining the above"""
+
+
+class PostEvaluationBatchResult(BaseModel):
+    evaluations: list[PostEvaluationResult]
+
+
+def _stats_bucket(count: int) -> int:
+    """Counts in the same bucket are within STATS_CHANGE_FACTOR of each other"""
+    return math.floor(math.log(count + 1, STATS_CHANGE_FACTOR))
+
+
+def evaluation_content_hash(post: TiktokPost) -> str:
+    """
+    Hash of what an evaluation depends on: the description and the order of
+    magnitude of the stats, so that small stat changes don't trigger re-evaluation
+    """
+    stats = post.stats
+    content = "|".join(
+        [
+            post.description,
+            *(
+                str(_stats_bucket(count))
+                for count in (
+                    stats.play_count,
+                    stats.like_count,
+                    stats.comment_count,
+                    stats.share_count,
+                    stats.save_count,
+                )
+            ),
+        ]
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def needs_evaluation(post: TiktokPost, evaluation: TiktokPostEvaluation | None) -> bool:
+    return evaluation is None or evaluation.content_hash != evaluation_content_hash(
+        post
+    )
+
+
+class PostEvaluationEngine:
+    """
+    Evaluates posts with the post evaluation agent.
+
+    Posts submitted concurrently are evaluated together in one structured-output
+    request per batch, and a limited number of batches run at the same time.
+    Evaluations are cached by post id and content hash.
+    """
+
+    def __init__(
+        self,
+        client: LlmClient | None = None,
+        model: str = EVALUATION_MODEL,
+        batch_size: int = EVALUATION_BATCH_SIZE,
+        max_wait: float = EVALUATION_MAX_WAIT,
+        max_concurrent_batches: int = EVALUATION_CONCURRENCY,
+    ):
+        self.client = client or llm
+        self.model = model
+        self.cache: AsyncTTLCache[str, TiktokPostEvaluation] = AsyncTTLCache(
+            ttl=math.inf, max_size=100_000
+        )
+        self._batcher: MicroBatcher[
+            tuple[TiktokChannel, TiktokPost], TiktokPostEvaluation
+        ] = MicroBatcher(
+            self._evaluate_batch,
+            batch_size=batch_size,
+            max_wait=max_wait,
+            max_concurrent_batches=max_concurrent_batches,
+        )
+
+    async def evaluate(
+        self, creator_channel: TiktokChannel, post: TiktokPost
+    ) -> TiktokPostEvaluation:
+        key = f"{post.id}:{evaluation_content_hash(post)}"
+        return await self.cache.get(
+            key, lambda: self._batcher.submit((creator_channel, post))
+        )
+
+    async def _evaluate_batch(
+        self, batch: list[tuple[TiktokChannel, TiktokPost]]
+    ) -> list[TiktokPostEvaluation | Exception]:
+        posts = "\n\n".join(
+            f"""
+Post {i}:
+Creator: {channel.nickname} (@{channel.handle}), {channel.stats.follower_count} followers
+Date Posted: {post.date_posted}
+Description: {post.description}
+Stats: {post.stats.play_count} plays, {post.stats.like_count} likes, {post.stats.comment_count} comments, {post.stats.share_count} shares, {post.stats.save_count} saves
+            """.strip()
+            for i, (channel, post) in enumerate(batch, start=1)
+        )
+
+        resp = await self.client.parse(
+            model=self.model,
+            input=f"""
+You are a marketing analyst, evaluating tiktok UGC (User Generated Content) posts made for the company you work for.
+
+Information about the company you work for:
+{COMPANY_INFO}
+
+Evaluate each of the following posts, and output one evaluation per post number:
+
+{posts}
+            """.strip(),
+            text_format=PostEvaluationBatchResult,
+        )
+        assert resp.output_parsed is not None
+
+        results = {r.post_number: r for r in resp.output_parsed.evaluations}
+        now = datetime.now()
+        evaluations: list[TiktokPostEvaluation | Exception] = []
+        for i, (_, post) in enumerate(batch, start=1):
+            result = results.get(i)
+            if result is None:
+                evaluations.append(RuntimeError(f"Post {post.id} was not evaluated"))
+                continue
+            evaluations.append(
+                TiktokPostEvaluation(
+                    id=post.id,
+                    product_mentioned=result.product_mentioned,
+                    prominence_of_product=result.prominence_of_product,
+                    target_group_fit=result.target_group_fit,
+                    post_type=result.post_type,
+                    estimated_ctr=round(result.estimated_ctr, 2),
+                    date_evaluated=now,
+                    evaluation_text=result.evaluation_text,
+                    content_hash=evaluation_content_hash(post),
+                )
+            )
+        return evaluations
+
+
+class MockPostEvaluationEngine:
+    """Random evaluations, for running without the evaluation agent"""
+
+    async def evaluate(
+        self, creator_channel: TiktokChannel, post: TiktokPost
+    ) -> TiktokPostEvaluation:
+        post_types = ["demo", "review", "product recommendation", "trend", "other"]
+        prominence_levels = ["high", "medium", "low"]
+        target_fit_levels = ["high", "medium", "low"]
+
+        product_mentioned = random.choice([True, False])
+        prominence = random.choice(prominence_levels)
+        target_fit = random.choice(target_fit_levels)
+        post_type = random.choice(post_types)
+        estimated_ctr = random.uniform(0.2, 5.0)
+
+        evaluation_text = f"This {post_type} post shows {'strong' if product_mentioned else 'no'} product presence with {prominence} prominence. The content aligns {target_fit} with our target audience. Based on engagement metrics and content quality, we estimate a {estimated_ctr:.2f}% CTR."
+
+        return TiktokPostEvaluation(
+            id=post.id,
+            product_mentioned=product_mentioned,
+            prominence_of_product=prominence,
+            target_group_fit=target_fit,
+            post_type=post_type,
+            estimated_ctr=round(estimated_ctr, 2),
+            date_evaluated=datetime.now(),
+            evaluation_text=evaluation_text,
+            content_hash=evaluation_content_hash(post),
+        )
+
+
+evaluation_engine = (
+    PostEvaluationEngine() if EVALUATION_ENGINE == "llm" else MockPostEvaluationEngine()
+)
+"""The process-wide post evaluation engine"""
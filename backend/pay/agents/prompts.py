@@ -0,0 +1,169 @@
+"""
+Prompt assembly for the agents, laid out for provider prompt caching.
+
+The instructions of an agent are the same for every call and go into the
+`instructions` of the request, which the Responses API puts right after the tool
+and output format definitions, so the whole stable part is one cacheable prefix.
+The per-call data follows in the input, ordered from the most to the least shared.
+
+Chat histories are fit into a token budget: the newest messages are kept as is,
+and the older ones are replaced by a summary, memoized per creator.
+"""
+
+import hashlib
+import logging
+import math
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic import BaseModel
+
+from pay.agents.llm import llm
+from pay.cache import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("PAYOUT_CHAT_HISTORY_TOKEN_BUDGET", "1000"))
+"""Max estimated tokens of a chat history in a prompt, including its summary"""
+CHAT_SUMMARY_TOKEN_RESERVE = 200
+"""Part of the chat history budget kept free for the summary of older messages"""
+CHAT_SUMMARY_CACHE_TTL = float(os.getenv("PAYOUT_CHAT_SUMMARY_CACHE_TTL", "86400"))
+"""Seconds a summary of chat messages is reused"""
+CHAT_SUMMARY_CACHE_SIZE = 10_000
+"""Max number of chat summaries kept, and of creators whose latest one is kept"""
+CHARS_PER_TOKEN = 4
+"""Rough number of characters per token of English text, to estimate prompt sizes"""
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class Prompt:
+    instructions: str
+    """The same for every call of the agent, so it's served from the prompt cache"""
+    sections: list[tuple[str, str]]
+    """(title, body) of the per-call data, the most shared across calls first"""
+    cache_key: str
+    """Routes the calls of the agent to the same prompt cache"""
+
+    @property
+    def input(self) -> str:
+        return "\n\n".join(f"{title}:\n{body}" for title, body in self.sections)
+
+    def request(self) -> dict[str, Any]:
+        """The prompt arguments of a Responses API request"""
+        return dict(
+            instructions=self.instructions,
+            input=self.input,
+            prompt_cache_key=self.cache_key,
+        )
+
+
+# ===== chat history ===== #
+CHAT_SUMMARY_INSTRUCTIONS = """
+You summarize the chat between a marketing payout agent and a tiktok UGC creator, so the agent can keep the context in later chats.
+Keep the agreements, promises, complaints and feedback, and the tone of the creator. Leave out greetings and small talk.
+""".strip()
+
+
+class ChatHistorySummary(BaseModel):
+    summary: str
+    """Summary of the chat, in a few sentences"""
+
+
+@dataclass
+class _CreatorSummary:
+    num_messages: int
+    """Number of oldest messages summarized"""
+    digest: str
+    """Hash of those messages, to tell whether a chat continues them"""
+    summary: str
+
+
+def _digest(messages: list[str]) -> str:
+    return hashlib.sha256("\0".join(messages).encode()).hexdigest()
+
+
+class ChatHistoryCompactor:
+    """
+    Fits formatted chat messages into a token budget. The messages that don't fit
+    are summarized, and a creator's summary is extended with the newly dropped
+    messages instead of summarizing the whole history again.
+    """
+
+    def __init__(self, budget: int = CHAT_HISTORY_TOKEN_BUDGET):
+        self.budget = budget
+        self._summaries: AsyncTTLCache[str, str] = AsyncTTLCache(
+            ttl=CHAT_SUMMARY_CACHE_TTL, max_size=CHAT_SUMMARY_CACHE_SIZE
+        )
+        self._latest: AsyncTTLCache[str, _CreatorSummary] = AsyncTTLCache(
+            ttl=CHAT_SUMMARY_CACHE_TTL, max_size=CHAT_SUMMARY_CACHE_SIZE
+        )
+        """The latest summary of each creator, to extend"""
+
+    async def fit(self, creator_id: str, messages: list[str]) -> str:
+        """The messages, oldest first, as they fit into the budget"""
+        if sum(estimate_tokens(message) + 1 for message in messages) <= self.budget:
+            return "\n\n".join(messages)
+
+        budget = self.budget - CHAT_SUMMARY_TOKEN_RESERVE
+        kept: list[str] = []
+        tokens = 0
+        for message in reversed(messages):
+            tokens += estimate_tokens(message) + 1
+            if tokens > budget and kept:
+                break
+            kept.append(message)
+        kept.reverse()
+        # the newest message is always kept, if need be cut to the budget
+        kept[-1] = kept[-1][: budget * CHARS_PER_TOKEN]
+        older = messages[: len(messages) - len(kept)]
+        if not older:
+            return "\n\n".join(kept)
+        try:
+            summary = await self._summaries.get(
+                f"{creator_id}:{_digest(older)}",
+                lambda: self._summarize(creator_id, older),
+            )
+        except Exception:
+            # the payout can do without the older messages
+            logger.exception(f"Failed to summarize the chat with {creator_id}")
+            return "\n\n".join(kept)
+        return "\n\n".join([f"[summary of the earlier chat: {summary}]", *kept])
+
+    async def _summarize(self, creator_id: str, messages: list[str]) -> str:
+        latest = self._latest.peek(creator_id)
+        if (
+            latest is not None
+            and latest.num_messages <= len(messages)
+            and _digest(messages[: latest.num_messages]) == latest.digest
+        ):
+            previous = f"Summary of the chat so far:\n{latest.summary}\n\n"
+            new_messages = messages[latest.num_messages :]
+        else:
+            previous = ""
+            new_messages = messages
+
+        resp = await llm.parse(
+            model="gpt-5.1",
+            instructions=CHAT_SUMMARY_INSTRUCTIONS,
+            input=f"{previous}Chat messages:\n" + "\n\n".join(new_messages),
+            prompt_cache_key="chat-summary",
+            text_format=ChatHistorySummary,
+        )
+        assert resp.output_parsed is not None
+        summary = resp.output_parsed.summary
+        self._latest.set(
+            creator_id,
+            _CreatorSummary(
+                num_messages=len(messages), digest=_digest(messages), summary=summary
+            ),
+        )
+        return summary
+
+
+chat_history_compactor = ChatHistoryCompactor()
+"""The process-wide chat history compactor, shared by all payouts"""
@@ -0,0 +1,303 @@
+import math
+import time
+from typing import Literal
+
+import numpy as np
+
+from pay.agents.payout_agent import Payout
+from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.model import Model
+from pay.tiktok import TiktokPost
+
+COUNT_COLUMNS = (
+    "play_count",
+    "like_count",
+    "comment_count",
+    "share_count",
+    "save_count",
+)
+"""Post stats columns, in the order of the `counts` matrix"""
+PLAYS, LIKES, COMMENTS, SHARES, SAVES = range(len(COUNT_COLUMNS))
+
+RankingMetric = Literal[
+    "play_count",
+    "like_count",
+    "comment_count",
+    "share_count",
+    "save_count",
+    "engagement_rate",
+    "view_velocity",
+    "estimated_ctr",
+    "payout",
+    "cpm",
+]
+
+
+class ChannelAnalytics(Model):
+    channel_id: str
+    num_posts: int
+    play_count: int
+    like_count: int
+    comment_count: int
+    share_count: int
+    save_count: int
+    engagement_rate: float | None
+    """(likes + comments + shares + saves) / plays over all posts of the channel"""
+    mean_estimated_ctr: float | None
+    """Mean estimated CTR of the evaluated posts, in percent"""
+    payout_total: float
+    """Total paid for the channel's posts, in USDC"""
+    cpm: float | None
+    """Payouts per 1k plays implied by the paid posts, in USDC"""
+
+
+class RankedPost(Model):
+    post_id: str
+    channel_id: str
+    value: float
+    """Value of the ranking metric"""
+
+
+class PostAnalytics(Model):
+    channels: list[ChannelAnalytics] = []
+    """Per-channel aggregates"""
+    ranked_by: RankingMetric | None = None
+    ranking: list[RankedPost] = []
+    """Top posts by `ranked_by`"""
+
+
+def _optional(value: float) -> float | None:
+    return None if math.isnan(value) or math.isinf(value) else float(value)
+
+
+class PostStatsStore:
+    """
+    Columnar store of per-post stats, evaluation scores and payouts, for vectorized
+    analytics over all posts instead of loops over the post models.
+
+    Each post is a row, ingested posts are upserted by id. Rows of removed
+    channels are only marked dead, and the arrays grow by doubling.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        """Number of used rows, including dead ones"""
+        self.post_ids: list[str] = []
+        self.channel_ids: list[str] = []
+        """Channel id by channel code"""
+        self._row_by_post_id: dict[str, int] = {}
+        self._code_by_channel_id: dict[str, int] = {}
+
+        self.counts = np.zeros((capacity, len(COUNT_COLUMNS)), dtype=np.int64)
+        self.date_posted = np.zeros(capacity, dtype=np.float64)
+        """Unix timestamps"""
+        self.estimated_ctr = np.full(capacity, np.nan)
+        """NaN until the post is evaluated"""
+        self.payout = np.zeros(capacity, dtype=np.float64)
+        """Total paid for the post, in USDC"""
+        self.channel = np.zeros(capacity, dtype=np.int32)
+        """Channel code of the post"""
+        self.alive = np.zeros(capacity, dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return len(self._row_by_post_id)
+
+    # ===== ingest ===== #
+    def load(
+        self,
+        posts_by_channel_id: dict[str, list[TiktokPost]],
+        post_evaluations: dict[str, TiktokPostEvaluation],
+        post_payouts: dict[str, list[Payout]],
+    ):
+        for channel_id, posts in posts_by_channel_id.items():
+            self.upsert_posts(channel_id, posts)
+        for post_id, evaluation in post_evaluations.items():
+            self.set_estimated_ctr(post_id, evaluation.estimated_ctr)
+        for post_id, payouts in post_payouts.items():
+            for payout in payouts:
+                self.add_payout(post_id, payout.determined_final_payout or 0.0)
+
+    def _grow(self, min_capacity: int):
+        capacity = len(self.alive)
+        while capacity < min_capacity:
+            capacity *= 2
+        for name in ("counts", "date_posted", "estimated_ctr", "payout", "channel"):
+            old = getattr(self, name)
+            new = np.empty((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+        alive = np.zeros(capacity, dtype=np.bool_)
+        alive[: self.size] = self.alive[: self.size]
+        self.alive = alive
+
+    def _channel_code(self, channel_id: str) -> int:
+        code = self._code_by_channel_id.get(channel_id)
+        if code is None:
+            code = self._code_by_channel_id[channel_id] = len(self.channel_ids)
+            self.channel_ids.append(channel_id)
+        return code
+
+    def _new_row(self, post_id: str) -> int:
+        if self.size == len(self.alive):
+            self._grow(self.size + 1)
+        row = self.size
+        self.size += 1
+        self.post_ids.append(post_id)
+        self._row_by_post_id[post_id] = row
+        self.estimated_ctr[row] = np.nan
+        self.payout[row] = 0.0
+        return row
+
+    def upsert_posts(self, channel_id: str, posts: list[TiktokPost]):
+        if not posts:
+            return
+        rows = [
+            self._row_by_post_id[post.id]
+            if post.id in self._row_by_post_id
+            else self._new_row(post.id)
+            for post in posts
+        ]
+        self.counts[rows] = [
+            (
+                post.stats.play_count,
+                post.stats.like_count,
+                post.stats.comment_count,
+                post.stats.share_count,
+                post.stats.save_count,
+            )
+            for post in posts
+        ]
+        self.date_posted[rows] = [post.date_posted.timestamp() for post in posts]
+        self.channel[rows] = self._channel_code(channel_id)
+        self.alive[rows] = True
+
+    def set_estimated_ctr(self, post_id: str, estimated_ctr: float | None):
+        row = self._row_by_post_id.get(post_id)
+        if row is not None:
+            self.estimated_ctr[row] = np.nan if estimated_ctr is None else estimated_ctr
+
+    def add_payout(self, post_id: str, amount: float):
+        row = self._row_by_post_id.get(post_id)
+        if row is not None:
+            self.payout[row] += amount
+
+    def remove_channel(self, channel_id: str):
+        code = self._code_by_channel_id.get(channel_id)
+        if code is None:
+            return
+        rows = np.flatnonzero(
+            self.alive[: self.size] & (self.channel[: self.size] == code)
+        )
+        self.alive[rows] = False
+        for row in rows:
+            del self._row_by_post_id[self.post_ids[row]]
+
+    # ===== queries ===== #
+    def channel_summaries(self) -> list[ChannelAnalytics]:
+        alive = self.alive[: self.size]
+        codes = self.channel[: self.size][alive]
+        counts = self.counts[: self.size][alive].astype(np.float64)
+        ctr = self.estimated_ctr[: self.size][alive]
+        payout = self.payout[: self.size][alive]
+        k = len(self.channel_ids)
+
+        num_posts = np.bincount(codes, minlength=k)
+        totals = np.stack(
+            [np.bincount(codes, weights=counts[:, i], minlength=k) for i in range(5)],
+            axis=1,
+        )
+        payout_totals = np.bincount(codes, weights=payout, minlength=k)
+        paid = payout > 0
+        paid_plays = np.bincount(codes[paid], weights=counts[paid, PLAYS], minlength=k)
+        evaluated = ~np.isnan(ctr)
+        ctr_sums = np.bincount(codes[evaluated], weights=ctr[evaluated], minlength=k)
+        num_evaluated = np.bincount(codes[evaluated], minlength=k)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            engagement = totals[:, LIKES:].sum(axis=1) / totals[:, PLAYS]
+            mean_ctr = ctr_sums / num_evaluated
+            cpm = payout_totals / paid_plays * 1000
+
+        return [
+            ChannelAnalytics(
+                channel_id=channel_id,
+                num_posts=int(num_posts[code]),
+                play_count=int(totals[code, PLAYS]),
+                like_count=int(totals[code, LIKES]),
+                comment_count=int(totals[code, COMMENTS]),
+                share_count=int(totals[code, SHARES]),
+                save_count=int(totals[code, SAVES]),
+                engagement_rate=_optional(engagement[code]),
+                mean_estimated_ctr=_optional(mean_ctr[code]),
+                payout_total=float(payout_totals[code]),
+                cpm=_optional(cpm[code]),
+            )
+            for code, channel_id in enumerate(self.channel_ids)
+            if num_posts[code] > 0
+        ]
+
+    def metric(self, metric: RankingMetric) -> np.ndarray:
+        """The metric for every row, NaN where it's undefined"""
+        counts = self.counts[: self.size]
+        plays = counts[:, PLAYS].astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            match metric:
+                case "engagement_rate":
+                    values = counts[:, LIKES:].sum(axis=1) / plays
+                case "view_velocity":
+                    # plays per day since posted, at least an hour to avoid spikes
+                    age_days = (time.time() - self.date_posted[: self.size]) / 86400
+                    values = plays / np.maximum(age_days, 1 / 24)
+                case "estimated_ctr":
+                    values = self.estimated_ctr[: self.size].copy()
+                case "payout":
+                    values = self.payout[: self.size].copy()
+                case "cpm":
+                    payout = self.payout[: self.size]
+                    values = np.where(payout > 0, payout / plays * 1000, np.nan)
+                case _:
+                    values = counts[:, COUNT_COLUMNS.index(metric)].astype(np.float64)
+        return values
+
+    def rank_posts(
+        self,
+        by: RankingMetric,
+        limit: int = 20,
+        channel_id: str | None = None,
+        descending: bool = True,
+    ) -> list[RankedPost]:
+        values = self.metric(by)
+        mask = self.alive[: self.size] & np.isfinite(values)
+        if channel_id is not None:
+            code = self._code_by_channel_id.get(channel_id, -1)
+            mask &= self.channel[: self.size] == code
+        rows = np.flatnonzero(mask)
+        keys = -values[rows] if descending else values[rows]
+        if len(rows) > limit:
+            top = np.argpartition(keys, limit)[:limit]
+            rows, keys = rows[top], keys[top]
+        rows = rows[np.argsort(keys, kind="stable")]
+        return [
+            RankedPost(
+                post_id=self.post_ids[row],
+                channel_id=self.channel_ids[self.channel[row]],
+                value=float(values[row]),
+            )
+            for row in rows
+        ]
+
+    def query(
+        self,
+        rank_by: RankingMetric,
+        limit: int = 20,
+        channel_id: str | None = None,
+    ) -> PostAnalytics:
+        return PostAnalytics(
+            channels=self.channel_summaries(),
+            ranked_by=rank_by,
+            ranking=self.rank_posts(rank_by, limit=limit, channel_id=channel_id),
+        )
+
+
+post_stats = PostStatsStore()
+"""The process-wide post stats, loaded on startup and kept in sync by the store"""
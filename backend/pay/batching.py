@@ -0,0 +1,70 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class MicroBatcher[T, R]:
+    """
+    Collects items submitted concurrently and processes them in batches.
+
+    A batch is processed once `batch_size` items are pending, or `max_wait` seconds
+    after its first item arrived. At most `max_concurrent_batches` batches are
+    processed at the same time.
+
+    `process_batch` returns one result per item, in order. A result that is an
+    exception is raised to the submitter of that item only, while an exception
+    raised by `process_batch` itself fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[list[T]], Awaitable[list[R | Exception]]],
+        batch_size: int,
+        max_wait: float,
+        max_concurrent_batches: int = 1,
+    ):
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(max_concurrent_batches)
+        self._pending: list[tuple[T, asyncio.Future[R]]] = []
+        self._task_flush: asyncio.Task[None] | None = None
+        self._tasks_process: set[asyncio.Task[None]] = set()
+
+    async def submit(self, item: T) -> R:
+        result = asyncio.get_running_loop().create_future()
+        self._pending.append((item, result))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._task_flush is None:
+            self._task_flush = asyncio.create_task(self._flush_later())
+        return await result
+
+    def _flush(self):
+        if self._task_flush is not None:
+            self._task_flush.cancel()
+            self._task_flush = None
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._process(batch))
+        self._tasks_process.add(task)
+        task.add_done_callback(self._tasks_process.discard)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_wait)
+        self._task_flush = None
+        self._flush()
+
+    async def _process(self, batch: list[tuple[T, asyncio.Future[R]]]):
+        async with self._semaphore:
+            try:
+                results = await self.process_batch([item for item, _ in batch])
+                assert len(results) == len(batch), "one result per item expected"
+            except Exception as e:
+                results = [e] * len(batch)
+
+        for (_, future), result in zip(batch, results):
+            if future.done():  # the submitter was cancelled
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
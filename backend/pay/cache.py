@@ -0,0 +1,72 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+_MISSING = object()
+
+
+class AsyncTTLCache[K, V]:
+    """
+    A bounded in-memory cache for values produced by async loaders.
+
+    - entries older than `ttl` seconds are considered stale and reloaded on access
+    - at most `max_size` entries are kept, the least recently used are evicted first
+    - concurrent `get`s of the same missing key share a single loader call
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._inflight: dict[K, asyncio.Task[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: K):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def peek(self, key: K) -> V | None:
+        """Return the fresh cached value, without loading it"""
+        value = self._lookup(key)
+        return None if value is _MISSING else value
+
+    def set(self, key: K, value: V):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K):
+        self._entries.pop(key, None)
+
+    async def get(self, key: K, loader: Callable[[], Awaitable[V]]) -> V:
+        """Return the cached value, or load it (once, for all concurrent callers)"""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            # run the loader as its own task, so that a cancelled caller does not
+            # cancel the load for everyone else waiting on it
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+
+            def _on_done(t: asyncio.Task[V]):
+                self._inflight.pop(key, None)
+                if not t.cancelled() and t.exception() is None:
+                    self.set(key, t.result())
+
+            task.add_done_callback(_on_done)
+
+        return await asyncio.shield(task)
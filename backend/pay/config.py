@@ -0,0 +1,64 @@
+"""
+Process-wide configuration.
+
+Modules read their own optional settings from the environment (with defaults),
+while the secrets the app can't run without are validated here, once, at startup.
+Nothing happens on import: the entrypoint calls `load()` before importing the
+app modules, and `validate()` on startup.
+"""
+
+import logging
+import os
+
+REQUIRED_ENV = {
+    "ms_token": "TikTok ms_token, or several comma-separated tokens",
+    "LOCUS_API_KEY": "Locus API key, for sending payouts",
+    "OPENAI_API_KEY": "OpenAI API key, for the agents",
+}
+"""Required environment variables, with what they're for"""
+
+_loaded = False
+
+
+class ConfigError(Exception):
+    pass
+
+
+def load():
+    """Load the .env file and configure logging, only the first call has an effect"""
+    global _loaded
+    if _loaded:
+        return
+    import dotenv
+
+    logging.basicConfig(level=logging.INFO)
+    dotenv.load_dotenv(override=True)
+    _loaded = True
+
+
+def validate():
+    """Fail fast with all missing settings, instead of on first use"""
+    missing = [
+        f"{name} ({description})"
+        for name, description in REQUIRED_ENV.items()
+        if not os.getenv(name)
+    ]
+    if missing:
+        raise ConfigError(f"Missing environment variables: {', '.join(missing)}")
+
+
+def _require(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise ConfigError(f"{name} is not set ({REQUIRED_ENV[name]})")
+    return value
+
+
+def ms_tokens() -> list[str]:
+    """ms_token may hold several comma-separated tokens, sessions are spread over them"""
+    tokens = [token.strip() for token in _require("ms_token").split(",")]
+    return [token for token in tokens if token]
+
+
+def locus_api_key() -> str:
+    return _require("LOCUS_API_KEY")
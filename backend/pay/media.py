@@ -0,0 +1,396 @@
+"""
+Local cache of the avatar and cover images of the scraped channels and posts.
+
+TikTok's media URLs are signed and expire, so instead of passing them to the
+clients, the scraped models are localized: their URLs point to `/media/{key}` of
+this server, and the image is downloaded once, right when it's scraped. The files
+are kept in a bounded LRU disk cache, and served with an ETag and long cache
+headers. Media whose download failed is redirected to its source for a while,
+instead of being downloaded again by every request. Post covers also get a downscaled thumbnail for the post grid, if Pillow
+is installed.
+
+The key of an asset is the hash of its URL without the query, which holds the
+signature that changes on every scrape. The latest signed URL of each key is saved
+in the store, to download the image again after it was evicted or a restart.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+from urllib.parse import urlsplit
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from pay import metrics
+from pay.store import store
+from pay.tiktok import TiktokChannel, TiktokPost
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("PAY_MEDIA_CACHE", "true").lower() != "false"
+"""When disabled, the TikTok media URLs are passed to the clients as they are"""
+MEDIA_DIR = os.getenv("PAY_MEDIA_DIR", "media")
+"""Directory of the cached media files"""
+MAX_CACHE_BYTES = int(os.getenv("PAY_MEDIA_CACHE_MAX_BYTES", str(500 * 1024**2)))
+"""Max total size of the cached files, the least recently used are evicted first"""
+MAX_FILE_BYTES = int(os.getenv("PAY_MEDIA_MAX_FILE_BYTES", str(20 * 1024**2)))
+"""Larger files are not cached, but served from TikTok"""
+FETCH_CONCURRENCY = int(os.getenv("PAY_MEDIA_FETCH_CONCURRENCY", "8"))
+"""Max number of media downloads at the same time"""
+FETCH_TIMEOUT = float(os.getenv("PAY_MEDIA_FETCH_TIMEOUT", "30"))
+"""Seconds until a media download is given up"""
+FAILURE_TTL = float(os.getenv("PAY_MEDIA_FAILURE_TTL", "60"))
+"""Seconds a failed download isn't retried, the media is redirected meanwhile"""
+THUMBNAIL_SIZE = int(os.getenv("PAY_MEDIA_THUMBNAIL_SIZE", "320"))
+"""Max width and height of the thumbnails, in pixels"""
+CACHE_MAX_AGE = 365 * 24 * 3600
+"""Seconds the clients may cache a media file, the file of a key never changes"""
+
+_PATH_PREFIX = "/media/"
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+_THUMBNAIL_SUFFIX = ".thumb.jpg"
+
+
+def media_key(url: str) -> str:
+    scheme, netloc, path, _, _ = urlsplit(url)
+    return hashlib.sha256(f"{scheme}://{netloc}{path}".encode()).hexdigest()
+
+
+@dataclass
+class MediaFile:
+    path: Path
+    thumbnail: Path | None
+    size: int
+    """Size of the file and its thumbnail, in bytes"""
+
+
+def _etag(path: Path) -> str:
+    stat = path.stat()
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class _CachedFileResponse(FileResponse):
+    """Releases the cached file once it's sent, or the client is gone"""
+
+    def __init__(self, path: Path, release: Callable[[], None], **kwargs):
+        super().__init__(path, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+
+def _make_thumbnail(source: Path, target: Path) -> bool:
+    """Downscale the first frame of the image to a JPEG, False without Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    with Image.open(source) as image:
+        image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image.convert("RGB").save(target, "JPEG", quality=80, optimize=True)
+    return True
+
+
+class MediaCache:
+    """
+    LRU disk cache of media files by key. Each file is downloaded at most once at
+    a time, and files of keys requested before their download finished are
+    downloaded right away.
+    """
+
+    def __init__(
+        self,
+        directory: str = MEDIA_DIR,
+        max_bytes: int = MAX_CACHE_BYTES,
+        fetch_concurrency: int = FETCH_CONCURRENCY,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        """Total size of the cached files, in bytes"""
+        self._files: OrderedDict[str, MediaFile] = OrderedDict()
+        """Cached files by key, least recently used first"""
+        self._too_large: set[str] = set()
+        """Keys of the media that's served from the source instead"""
+        self._failed: OrderedDict[str, float] = OrderedDict()
+        """Monotonic time until which a failed download isn't retried, by key"""
+        self._serving: Counter[str] = Counter()
+        """Number of responses sending each key's files, which aren't evicted"""
+        self._inflight: dict[str, asyncio.Task[MediaFile | None]] = {}
+        self._semaphore = asyncio.Semaphore(fetch_concurrency)
+        self._client: "httpx.AsyncClient | None" = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                timeout=FETCH_TIMEOUT,
+                follow_redirects=True,
+                headers={"Referer": "https://www.tiktok.com/"},
+            )
+        return self._client
+
+    def start(self):
+        """Index the files cached by previous runs, the oldest as least recent"""
+        if not ENABLED:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        paths = sorted(
+            (path for path in self.directory.iterdir() if path.is_file()),
+            key=lambda path: path.stat().st_mtime,
+        )
+        thumbnails = {
+            path.name for path in paths if path.name.endswith(_THUMBNAIL_SUFFIX)
+        }
+        for path in paths:
+            if path.name.endswith(".tmp"):
+                path.unlink()  # an interrupted download
+                continue
+            key = path.name.split(".", 1)[0]
+            if not _KEY_PATTERN.fullmatch(key) or path.name in thumbnails:
+                continue
+            thumbnail = self.directory / f"{key}{_THUMBNAIL_SUFFIX}"
+            has_thumbnail = thumbnail.name in thumbnails
+            size = path.stat().st_size + (
+                thumbnail.stat().st_size if has_thumbnail else 0
+            )
+            self._files[key] = MediaFile(
+                path=path, thumbnail=thumbnail if has_thumbnail else None, size=size
+            )
+            self.size += size
+        self._evict()
+
+    async def close(self):
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ===== ingest ===== #
+    def localize(self, url: str, thumbnail: bool = False) -> str:
+        """
+        The path to load the media from this server, relative to its origin,
+        downloading it in the background if it isn't cached yet
+        """
+        if not ENABLED or not url or url.startswith(_PATH_PREFIX):
+            return url
+        key = media_key(url)
+        if store.media_source(key) != (url, thumbnail):
+            store.save_media_source(key, url, thumbnail)
+            self._failed.pop(key, None)  # e.g. expired, so the new URL is tried
+        if (
+            key not in self._files
+            and key not in self._inflight
+            and key not in self._too_large
+            and not self._failed_recently(key)
+        ):
+            self._fetch_in_background(key)
+        return f"{_PATH_PREFIX}{key}"
+
+    def _fetch_in_background(self, key: str):
+        task = asyncio.create_task(self._fetch(key))
+        self._inflight[key] = task
+
+        def _on_done(t: asyncio.Task[MediaFile | None]):
+            self._inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Failed to cache media {key}: {t.exception()!r}")
+                self._remember_failure(key)
+
+        task.add_done_callback(_on_done)
+
+    def _remember_failure(self, key: str):
+        now = time.monotonic()
+        self._failed[key] = now + FAILURE_TTL
+        self._failed.move_to_end(key)
+        # all entries have the same TTL, so the oldest are the expired ones
+        while self._failed and next(iter(self._failed.values())) <= now:
+            self._failed.popitem(last=False)
+
+    def _failed_recently(self, key: str) -> bool:
+        retry_after = self._failed.get(key)
+        if retry_after is None:
+            return False
+        if retry_after <= time.monotonic():
+            del self._failed[key]
+            return False
+        return True
+
+    async def _fetch(self, key: str) -> MediaFile | None:
+        """Download the media and make its thumbnail, None if it's too large"""
+        source = store.media_source(key)
+        if source is None:
+            return None
+        url, thumbnail = source
+        async with self._semaphore:
+            async with self.client.stream("GET", url) as resp:
+                resp.raise_for_status()
+                content_type = resp.headers.get("content-type", "").split(";")[0]
+                content = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    content.extend(chunk)
+                    if len(content) > MAX_FILE_BYTES:
+                        self._too_large.add(key)
+                        return None
+        extension = mimetypes.guess_extension(content_type) or ""
+        path = self.directory / f"{key}{extension}"
+        thumbnail_path = (
+            self.directory / f"{key}{_THUMBNAIL_SUFFIX}" if thumbnail else None
+        )
+        media_file = await asyncio.to_thread(
+            self._write, path, bytes(content), thumbnail_path
+        )
+        self._files[key] = media_file
+        self.size += media_file.size
+        metrics.media_downloads_total.inc()
+        self._evict()
+        return media_file
+
+    def _write(
+        self, path: Path, content: bytes, thumbnail_path: Path | None
+    ) -> MediaFile:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_bytes(content)
+        tmp.replace(path)
+        size = len(content)
+        if thumbnail_path is not None:
+            try:
+                if _make_thumbnail(path, thumbnail_path):
+                    size += thumbnail_path.stat().st_size
+                else:
+                    thumbnail_path = None
+            except Exception:
+                # e.g. a video or an unsupported format, the original is served
+                logger.exception(f"Failed to make a thumbnail of {path.name}")
+                thumbnail_path = None
+        return MediaFile(path=path, thumbnail=thumbnail_path, size=size)
+
+    def _evict(self):
+        """
+        Delete the least recently used files until the cache fits. Files being sent
+        are kept, and evicted once released if the cache is still too large.
+        """
+        serving = []
+        while self.size > self.max_bytes and self._files:
+            key, media_file = self._files.popitem(last=False)
+            if self._serving[key]:
+                serving.append((key, media_file))
+                continue
+            self.size -= media_file.size
+            media_file.path.unlink(missing_ok=True)
+            if media_file.thumbnail is not None:
+                media_file.thumbnail.unlink(missing_ok=True)
+        for key, media_file in reversed(serving):
+            self._files[key] = media_file
+            self._files.move_to_end(key, last=False)
+
+    def _release(self, key: str):
+        self._serving[key] -= 1
+        if self._serving[key] <= 0:
+            del self._serving[key]
+            self._evict()
+
+    # ===== serving ===== #
+    async def get(self, key: str) -> MediaFile | None:
+        """The cached file, downloaded first if it was evicted or is in flight"""
+        media_file = self._files.get(key)
+        if media_file is not None:
+            self._files.move_to_end(key)
+            return media_file
+        if (
+            key in self._too_large
+            or self._failed_recently(key)
+            or store.media_source(key) is None
+        ):
+            return None
+        if key not in self._inflight:
+            self._fetch_in_background(key)
+        try:
+            return await asyncio.shield(self._inflight[key])
+        except Exception:
+            return None
+
+    async def response(
+        self, key: str, thumbnail: bool, if_none_match: str | None
+    ) -> Response:
+        """
+        The cached file, or 304 if the client's copy is current. Media that can't be
+        cached is redirected to its source.
+        """
+        if not _KEY_PATTERN.fullmatch(key):
+            raise HTTPException(status_code=404, detail="Media not found")
+        media_file = await self.get(key)
+        if media_file is None:
+            source = store.media_source(key)
+            if source is None:
+                raise HTTPException(status_code=404, detail="Media not found")
+            metrics.media_requests_total.inc(outcome="redirect")
+            return RedirectResponse(source[0])
+
+        path = (
+            media_file.thumbnail
+            if thumbnail and media_file.thumbnail
+            else media_file.path
+        )
+        headers = {
+            "ETag": _etag(path),
+            "Cache-Control": f"public, max-age={CACHE_MAX_AGE}, immutable",
+        }
+        if if_none_match is not None and headers["ETag"] in (
+            tag.strip() for tag in if_none_match.split(",")
+        ):
+            metrics.media_requests_total.inc(outcome="not_modified")
+            return Response(status_code=304, headers=headers)
+        metrics.media_requests_total.inc(outcome="hit")
+        # held until sent, so a download finishing meanwhile doesn't evict it
+        self._serving[key] += 1
+        return _CachedFileResponse(
+            path, release=lambda: self._release(key), headers=headers
+        )
+
+
+media_cache = MediaCache()
+"""The process-wide media cache, started and closed with the app"""
+
+metrics.Gauge(
+    "pay_media_cache_bytes",
+    "Total size of the cached media files",
+    collect=lambda: media_cache.size,
+)
+
+
+def localize_channel(channel: TiktokChannel) -> TiktokChannel:
+    avatar_url = media_cache.localize(channel.avatar_url)
+    if avatar_url == channel.avatar_url:
+        return channel
+    return channel.model_copy(update={"avatar_url": avatar_url})
+
+
+def localize_post(post: TiktokPost) -> TiktokPost:
+    cover_url = media_cache.localize(post.dynamic_cover_url, thumbnail=True)
+    if cover_url == post.dynamic_cover_url:
+        return post
+    return post.model_copy(update={"dynamic_cover_url": cover_url})
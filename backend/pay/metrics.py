@@ -0,0 +1,264 @@
+import math
+import os
+import time
+from typing import Callable
+
+ENABLED = os.getenv("PAY_METRICS_ENABLED", "true").lower() != "false"
+"""When disabled, all instrumentation hooks return right away"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+"""Histogram buckets in seconds"""
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+"""Histogram buckets in bytes"""
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...]):
+    if not label_names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{value.replace("\\", "\\\\").replace('"', '\\"')}"'
+        for name, value in zip(label_names, label_values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.help}",
+                f"# TYPE {self.name} {self.type}",
+                *self.samples(),
+            ]
+        )
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: tuple[str, ...] = ()):
+        super().__init__(name, help, label_names)
+        self.values: dict[tuple[str, ...], float] = {} if label_names else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from `collect` at scrape time"""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], float] | None = None,
+    ):
+        super().__init__(name, help)
+        self.collect = collect
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        if ENABLED:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        if ENABLED:
+            self.value -= amount
+
+    def samples(self) -> list[str]:
+        value = self.collect() if self.collect is not None else self.value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, label_names)
+        self.buckets = (*buckets, math.inf)
+        self.bucket_counts: dict[tuple[str, ...], list[int]] = {}
+        self.sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        counts = self.bucket_counts.get(key)
+        if counts is None:
+            counts = self.bucket_counts[key] = [0] * len(self.buckets)
+            self.sums[key] = 0.0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        self.sums[key] += value
+
+    def drain(self) -> list[tuple[tuple[str, ...], list[int], float]]:
+        """
+        The observations since the last drain, as (label values, bucket counts, sum),
+        for another process to `merge` them into its own histogram
+        """
+        observed = [
+            (key, counts, self.sums[key]) for key, counts in self.bucket_counts.items()
+        ]
+        self.bucket_counts = {}
+        self.sums = {}
+        return observed
+
+    def merge(self, observed: list[tuple[tuple[str, ...], list[int], float]]):
+        """Add the observations drained from the same histogram in another process"""
+        if not ENABLED:
+            return
+        for key, counts, total in observed:
+            key = tuple(key)
+            own = self.bucket_counts.get(key)
+            if own is None:
+                own = self.bucket_counts[key] = [0] * len(self.buckets)
+                self.sums[key] = 0.0
+            for i, count in enumerate(counts):
+                own[i] += count
+            self.sums[key] += total
+
+    def time(self, **labels: str) -> _Timer | _NullTimer:
+        """Context manager observing the duration of its body, in seconds"""
+        if not ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self.bucket_counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    (*self.label_names, "le"), (*key, _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+registry: list[Metric] = []
+"""All metrics, in the order they were defined"""
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    return "\n\n".join(metric.render() for metric in registry) + "\n"
+
+
+# ===== metrics of the app ===== #
+tiktok_request_seconds = Histogram(
+    "pay_tiktok_request_seconds",
+    "Latency of TikTok requests, per user info and per page of videos",
+    ("operation",),
+)
+tiktok_browsers = Gauge("pay_tiktok_browsers", "Number of live TikTok browsers")
+"""Collected from the scrape workers when the browsers run in them"""
+llm_request_seconds = Histogram(
+    "pay_llm_request_seconds",
+    "Latency of single LLM requests (each retry is a request)",
+    ("format", "outcome"),
+)
+llm_tokens_total = Counter(
+    "pay_llm_tokens_total",
+    "Tokens of successful LLM requests, by type (input, cached_input, output)",
+    ("format", "type"),
+)
+state_syncs_total = Counter(
+    "pay_state_syncs_total", "Number of BackendState.sync calls"
+)
+state_sync_seconds = Histogram(
+    "pay_state_sync_seconds", "Duration of BackendState.sync calls"
+)
+sync_payload_bytes = Histogram(
+    "pay_sync_payload_bytes",
+    "Size of the serialized messages sent to clients",
+    ("event",),
+    buckets=SIZE_BUCKETS,
+)
+payouts_total = Counter("pay_payouts_total", "Number of payouts made")
+payout_usdc_total = Counter("pay_payout_usdc_total", "Total amount paid out, in USDC")
+media_downloads_total = Counter(
+    "pay_media_downloads_total", "Number of media files downloaded into the cache"
+)
+media_requests_total = Counter(
+    "pay_media_requests_total",
+    "Number of media requests, by outcome (hit, not_modified, redirect)",
+    ("outcome",),
+)
+stats_refresh_polls_total = Counter(
+    "pay_stats_refresh_polls_total",
+    "Number of background TikTok polls for fresh stats",
+    ("operation",),
+)
+stats_refresh_changed_posts_total = Counter(
+    "pay_stats_refresh_changed_posts_total",
+    "Number of posts whose stats changed when re-polled",
+)
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from pay.agents.payout_agent import (
+    ChatBetweenAgentAndCreator,
+    PaymentUnconfirmedError,
+    Payout,
+    PayoutAgentService,
+    PayoutJob,
+    PayoutJobStatus,
+    ProgressCallback,
+)
+from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.store import store
+from pay.tiktok import TiktokChannel, TiktokPost
+
+logger = logging.getLogger(__name__)
+
+NUM_WORKERS = int(os.getenv("PAYOUT_WORKERS", "4"))
+"""Number of payouts processed concurrently"""
+MIN_PAYOUT_BUDGET = 0.01
+"""Smallest budget (in USDC) worth starting a payout for"""
+
+
+class PayoutBudget:
+    """
+    A budget shared by the jobs of one bulk payout.
+    Jobs reserve their share before paying, so parallel jobs can't overspend it.
+    """
+
+    def __init__(self, total: float):
+        self.total = total
+        self.reserved = 0.0
+        self.spent = 0.0
+
+    @property
+    def available(self) -> float:
+        return self.total - self.reserved - self.spent
+
+    def reserve(self, amount: float) -> float:
+        """Reserve up to `amount`, returns the reserved amount (0 if exhausted)"""
+        amount = min(amount, self.available)
+        if amount < MIN_PAYOUT_BUDGET:
+            return 0.0
+        self.reserved += amount
+        return amount
+
+    def settle(self, reserved: float, spent: float):
+        self.reserved -= reserved
+        self.spent += spent
+
+
+@dataclass
+class QueuedPayout:
+    job: PayoutJob
+    creator_channel: TiktokChannel
+    post: TiktokPost
+    post_evaluation: TiktokPostEvaluation
+    chat_between_agent_and_creator: ChatBetweenAgentAndCreator
+    destination_wallet_address: str
+    max_budget_per_post: float
+    budget: PayoutBudget
+    on_update: Callable[[PayoutJob, Payout | None], Awaitable[None]] | None = None
+    """Called after every status change, with the payout once decided"""
+    on_progress: ProgressCallback | None = None
+    """Called with the live progress of the payout, see `evaluate_and_pay_for_post`"""
+
+
+class PayoutJobQueue:
+    """
+    Process-wide queue of payout jobs, worked off by a bounded pool of workers.
+
+    Jobs are keyed by post id and persisted, so a post is never paid twice by
+    payout jobs, even across restarts.
+    """
+
+    def __init__(self, num_workers: int = NUM_WORKERS):
+        self.num_workers = num_workers
+        self.jobs: dict[str, PayoutJob] = {}
+        """All payout jobs by post id"""
+        self._queue: asyncio.Queue[QueuedPayout] = asyncio.Queue()
+        self._workers: list[asyncio.Task[None]] = []
+
+    async def start(self):
+        self.jobs = store.load_payout_jobs()
+        for job in self.jobs.values():
+            # the queue itself isn't persisted, so interrupted jobs can't resume
+            if job.status == "queued":
+                self._update(job, "skipped", error="Interrupted before it started")
+            elif job.status == "running":
+                # it may or may not have paid, so it must not be paid again blindly
+                self._update(job, "unconfirmed", error="Interrupted while paying")
+        # posts paid before payouts were queued as jobs mustn't be paid again either
+        for post_id, (channel_id, paid) in store.load_paid_posts().items():
+            if post_id not in self.jobs:
+                now = datetime.now()
+                job = PayoutJob(
+                    post_id=post_id,
+                    channel_id=channel_id,
+                    status="paid",
+                    final_payout=paid,
+                    date_created=now,
+                    date_updated=now,
+                )
+                self.jobs[post_id] = job
+                store.save_payout_job(job)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"payout-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def is_eligible(self, post_id: str) -> bool:
+        """Whether the post may be paid, i.e. no job paid or may have paid for it"""
+        job = self.jobs.get(post_id)
+        return job is None or job.status in ("skipped", "failed")
+
+    def enqueue(
+        self,
+        creator_channel: TiktokChannel,
+        post: TiktokPost,
+        post_evaluation: TiktokPostEvaluation,
+        chat_between_agent_and_creator: ChatBetweenAgentAndCreator,
+        destination_wallet_address: str,
+        max_budget_per_post: float,
+        budget: PayoutBudget,
+        on_update: Callable[[PayoutJob, Payout | None], Awaitable[None]] | None = None,
+        on_progress: ProgressCallback | None = None,
+    ) -> PayoutJob | None:
+        """Enqueue a payout for the post, or return None if it already has a job"""
+        if not self.is_eligible(post.id):
+            return None
+
+        now = datetime.now()
+        job = PayoutJob(
+            post_id=post.id,
+            channel_id=creator_channel.id,
+            date_created=now,
+            date_updated=now,
+        )
+        self.jobs[post.id] = job
+        store.save_payout_job(job)
+        self._queue.put_nowait(
+            QueuedPayout(
+                job=job,
+                creator_channel=creator_channel,
+                post=post,
+                post_evaluation=post_evaluation,
+                chat_between_agent_and_creator=chat_between_agent_and_creator,
+                destination_wallet_address=destination_wallet_address,
+                max_budget_per_post=max_budget_per_post,
+                budget=budget,
+                on_update=on_update,
+                on_progress=on_progress,
+            )
+        )
+        return job
+
+    def _update(self, job: PayoutJob, status: PayoutJobStatus, **changes):
+        job.status = status
+        for name, value in changes.items():
+            setattr(job, name, value)
+        job.date_updated = datetime.now()
+        store.save_payout_job(job)
+
+    async def _notify(self, item: QueuedPayout, payout: Payout | None = None):
+        if item.on_update is None:
+            return
+        try:
+            await item.on_update(item.job, payout)
+        except Exception:
+            logger.exception(f"Error notifying about payout job {item.job.post_id}")
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._run(item)
+            except Exception:
+                logger.exception(f"Error in payout job {item.job.post_id}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, item: QueuedPayout):
+        job = item.job
+        reserved = item.budget.reserve(item.max_budget_per_post)
+        if not reserved:
+            self._update(job, "skipped", error="Budget exhausted")
+            await self._notify(item)
+            return
+
+        self._update(job, "running", reserved_budget=reserved)
+        await self._notify(item)
+        try:
+            payout = await PayoutAgentService.evaluate_and_pay_for_post(
+                creator_channel=item.creator_channel,
+                post=item.post,
+                post_evaluation=item.post_evaluation,
+                chat_between_agent_and_creator=item.chat_between_agent_and_creator,
+                destination_wallet_address=item.destination_wallet_address,
+                max_budget=reserved,
+                on_progress=item.on_progress,
+            )
+        except PaymentUnconfirmedError as e:
+            # the payment may have gone through, so keep the reservation and the
+            # job unconfirmed (i.e. not eligible to be paid again)
+            logger.exception(f"Payment for post {job.post_id} is unconfirmed")
+            item.budget.settle(reserved, reserved)
+            self._update(job, "unconfirmed", error=str(e))
+            await self._notify(item)
+            return
+        except Exception as e:
+            # nothing was sent, so the post may be paid again
+            logger.exception(f"Error paying for post {job.post_id}")
+            item.budget.settle(reserved, 0.0)
+            self._update(job, "failed", error=str(e))
+            await self._notify(item)
+            return
+
+        paid = payout.determined_final_payout or 0.0
+        item.budget.settle(reserved, paid)
+        store.add_payout(job.post_id, payout)
+        if paid > 0:
+            self._update(job, "paid", final_payout=paid)
+        else:
+            self._update(
+                job, "skipped", final_payout=0.0, error="The agent decided not to pay"
+            )
+        await self._notify(item, payout)
+
+
+payout_queue = PayoutJobQueue()
+"""The process-wide payout job queue, started and closed with the app"""
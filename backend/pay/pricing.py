@@ -0,0 +1,112 @@
+"""
+Rule-based pricing of posts, computed for whole batches of posts at once.
+
+The price per 1k views starts at `BASE_PRICE_PER_1K` and is scaled by a factor per
+evaluation field, by the estimated CTR and by the engagement of the post. Posts
+that don't mention the product, or aren't evaluated yet, are priced at 0.
+The payout agent only judges a bonus or penalty on top of the base payout.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.tiktok import TiktokPost
+
+BASE_PRICE_PER_1K = float(os.getenv("PAYOUT_BASE_PRICE_PER_1K", "0.5"))
+"""Price per 1k views of an average post, in USDC"""
+MAX_BASE_PAYOUT = float(os.getenv("PAYOUT_MAX_BASE_PAYOUT", "50"))
+"""Max base payout of a single post, in USDC"""
+MAX_BONUS_SHARE = float(os.getenv("PAYOUT_MAX_BONUS_SHARE", "0.5"))
+"""Max bonus the agent can add, as a share of the base payout"""
+
+PROMINENCE_FACTORS = {"high": 1.5, "medium": 1.0, "low": 0.6}
+TARGET_GROUP_FIT_FACTORS = {"high": 1.3, "medium": 1.0, "low": 0.7}
+POST_TYPE_FACTORS = {
+    "demo": 1.3,
+    "review": 1.2,
+    "product recommendation": 1.1,
+    "trend": 1.0,
+    "other": 0.8,
+}
+REFERENCE_CTR = 1.0
+"""Estimated CTR (in percent) of an average post"""
+CTR_FACTOR_RANGE = (0.5, 2.0)
+REFERENCE_ENGAGEMENT_RATE = 0.05
+"""(likes + comments + shares + saves) / plays of an average post"""
+ENGAGEMENT_FACTOR_RANGE = (0.75, 1.25)
+
+
+@dataclass
+class PriceQuote:
+    price_per_1k: float
+    """Price per 1k views, in USDC"""
+    base_payout: float
+    """Views / 1k * price per 1k, capped at `MAX_BASE_PAYOUT`, in USDC"""
+
+    @property
+    def max_bonus(self) -> float:
+        """Max bonus on top of the base payout, in USDC"""
+        return round(self.base_payout * MAX_BONUS_SHARE, 2)
+
+
+def _factors(values: list[str | None], table: dict[str, float]) -> np.ndarray:
+    return np.array([table.get(value, 1.0) if value else 1.0 for value in values])
+
+
+def price_posts(
+    posts: list[TiktokPost],
+    evaluations: list[TiktokPostEvaluation | None],
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Price per 1k views and base payout (rounded to cents) of each post, given the
+    evaluation of each post (None if not evaluated)
+    """
+    if not posts:
+        return np.zeros(0), np.zeros(0)
+    evaluations = [evaluation or TiktokPostEvaluation() for evaluation in evaluations]
+
+    counts = np.array(
+        [
+            (
+                post.stats.play_count,
+                post.stats.like_count
+                + post.stats.comment_count
+                + post.stats.share_count
+                + post.stats.save_count,
+            )
+            for post in posts
+        ],
+        dtype=np.float64,
+    )
+    plays, interactions = counts[:, 0], counts[:, 1]
+    mentioned = np.array([bool(e.product_mentioned) for e in evaluations])
+    ctr = np.array(
+        [np.nan if e.estimated_ctr is None else e.estimated_ctr for e in evaluations]
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr_factor = np.clip(ctr / REFERENCE_CTR, *CTR_FACTOR_RANGE)
+        engagement_factor = np.clip(
+            interactions / plays / REFERENCE_ENGAGEMENT_RATE, *ENGAGEMENT_FACTOR_RANGE
+        )
+    price_per_1k = (
+        BASE_PRICE_PER_1K
+        * mentioned
+        * _factors([e.prominence_of_product for e in evaluations], PROMINENCE_FACTORS)
+        * _factors([e.target_group_fit for e in evaluations], TARGET_GROUP_FIT_FACTORS)
+        * _factors([e.post_type for e in evaluations], POST_TYPE_FACTORS)
+        * np.nan_to_num(ctr_factor, nan=1.0)
+        * np.nan_to_num(engagement_factor, nan=1.0)
+    )
+    base_payout = np.minimum(plays / 1000 * price_per_1k, MAX_BASE_PAYOUT)
+    return np.round(price_per_1k, 4), np.round(base_payout, 2)
+
+
+def quote_post(post: TiktokPost, evaluation: TiktokPostEvaluation) -> PriceQuote:
+    price_per_1k, base_payout = price_posts([post], [evaluation])
+    return PriceQuote(
+        price_per_1k=float(price_per_1k[0]), base_payout=float(base_payout[0])
+    )
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Allows `rate` tokens per second on average, in bursts of up to `capacity`.
+
+    `acquire` waits until a token is available (waiters are served in order), while
+    `spend` takes tokens right away, even into debt: requests that shouldn't be
+    delayed still count against the budget, and slow down the waiting ones.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._tokens + (now - self._updated) * self.rate, self.capacity
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def spend(self, tokens: float = 1):
+        self._refill()
+        self._tokens -= tokens
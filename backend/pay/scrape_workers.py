@@ -0,0 +1,517 @@
+"""
+TikTok scraping in separate worker processes.
+
+Each worker process runs its own `TiktokService` (browsers and event loop), so
+scraping doesn't add latency to the websockets served by the web process. The web
+process talks to the workers over their stdin/stdout, one JSON message per line:
+
+- requests: `{"id": 1, "op": "user_info", "username": "..."}`,
+  `{"id": 1, "op": "user_video_pages", "username": "...", "paging": {...}}`,
+  and `{"id": 1, "op": "cancel"}` to stop a request early
+- responses: `{"id": 1, "item": [...]}` per result record (a channel, or a page of
+  posts with its cursor), then `{"id": 1}` once done, or
+  `{"id": 1, "error": "...", "kind": "..."}`
+- before each TikTok request, the worker asks for a token of the web process's
+  `scrape_budget` with `{"id": 1, "token": "videos_page"}` and waits for
+  `{"id": 1, "op": "token"}`, so the budget limits the requests actually made
+- every few seconds, and once ready, the worker reports its metrics with
+  `{"stats": {"browsers": 2, "request_seconds": [...]}}`, its number of browsers and
+  the TikTok request latencies observed since its last report
+
+Channels and posts are sent as compact positional records instead of model JSON.
+Workers that exit are restarted by the pool, their running requests fail.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, AsyncIterator
+
+from pay import metrics
+from pay.tiktok import (
+    TakeToken,
+    TiktokChannel,
+    TiktokPost,
+    TiktokPostStats,
+    TiktokService,
+    TiktokUserStats,
+    TiktokVideoPage,
+    VideoPaging,
+    spend_token,
+)
+
+logger = logging.getLogger(__name__)
+
+NUM_WORKERS = int(os.getenv("TIKTOK_SCRAPE_WORKERS", "1"))
+"""Number of scraping worker processes, 0 to scrape in the web process instead"""
+MAX_RESTART_DELAY = 30
+"""Max seconds between restarts of a crashing worker"""
+MIN_STABLE_UPTIME = 60
+"""Seconds a worker must have run for its next restart to not be backed off"""
+LINE_LIMIT = 16 * 1024 * 1024
+"""Max size of one message, in bytes"""
+STARTUP_TIMEOUT = 120
+"""Max seconds the app startup waits for the first worker to be ready"""
+STATS_INTERVAL = 5
+"""Seconds between the metrics reports of a worker"""
+
+
+class ScrapeWorkerError(Exception):
+    """Scraping failed in the worker, or the worker died while scraping"""
+
+    def __init__(self, message: str, kind: str = "ScrapeWorkerError"):
+        super().__init__(message)
+        self.kind = kind
+        """Class name of the original exception"""
+
+
+# ===== compact records ===== #
+def channel_to_record(channel: TiktokChannel) -> list[Any]:
+    stats = channel.stats
+    return [
+        channel.id,
+        channel.nickname,
+        channel.handle,
+        channel.description,
+        channel.avatar_url,
+        stats.follower_count,
+        stats.following_count,
+        stats.heart_count,
+        stats.video_count,
+    ]
+
+
+def channel_from_record(record: list[Any]) -> TiktokChannel:
+    (id, nickname, handle, description, avatar_url, *stats) = record
+    followers, following, hearts, videos = stats
+    return TiktokChannel(
+        id=id,
+        nickname=nickname,
+        handle=handle,
+        description=description,
+        avatar_url=avatar_url,
+        stats=TiktokUserStats(
+            follower_count=followers,
+            following_count=following,
+            heart_count=hearts,
+            video_count=videos,
+        ),
+    )
+
+
+def post_to_record(post: TiktokPost) -> list[Any]:
+    stats = post.stats
+    return [
+        post.id,
+        post.date_posted.timestamp(),
+        post.description,
+        post.url,
+        post.dynamic_cover_url,
+        stats.play_count,
+        stats.like_count,
+        stats.comment_count,
+        stats.share_count,
+        stats.save_count,
+    ]
+
+
+def post_from_record(record: list[Any]) -> TiktokPost:
+    (id, date_posted, description, url, dynamic_cover_url, *stats) = record
+    plays, likes, comments, shares, saves = stats
+    return TiktokPost(
+        id=id,
+        date_posted=datetime.fromtimestamp(date_posted),
+        description=description,
+        url=url,
+        dynamic_cover_url=dynamic_cover_url,
+        stats=TiktokPostStats(
+            play_count=plays,
+            like_count=likes,
+            comment_count=comments,
+            share_count=shares,
+            save_count=saves,
+        ),
+    )
+
+
+def page_to_record(page: TiktokVideoPage) -> list[Any]:
+    return [[post_to_record(post) for post in page.posts], page.cursor]
+
+
+def page_from_record(record: list[Any]) -> TiktokVideoPage:
+    posts, cursor = record
+    return TiktokVideoPage(
+        posts=[post_from_record(post) for post in posts], cursor=cursor
+    )
+
+
+def paging_to_dict(paging: VideoPaging) -> dict[str, Any]:
+    since = paging.since.timestamp() if paging.since is not None else None
+    return {**dataclasses.asdict(paging), "since": since}
+
+
+def paging_from_dict(data: dict[str, Any]) -> VideoPaging:
+    since = data["since"]
+    return VideoPaging(
+        **{
+            **data,
+            "since": datetime.fromtimestamp(since) if since is not None else None,
+        }
+    )
+
+
+def _encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+# ===== web process side ===== #
+class ScrapeWorker:
+    """One worker process, with the requests currently running on it"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: asyncio.subprocess.Process | None = None
+        self.ready = False
+        self.browsers = 0
+        """Number of live browsers, as last reported by the worker"""
+        self._next_id = 0
+        self._responses: dict[int, asyncio.Queue[dict[str, Any]]] = {}
+        self._task_read: asyncio.Task[None] | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._responses)
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "pay.scrape_workers",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT,
+        )
+        assert self.process.stdout is not None
+        # the worker reports ready once its browsers are launched
+        line = await self.process.stdout.readline()
+        if not line:
+            raise ScrapeWorkerError(f"Scrape worker {self.index} exited on startup")
+        self._apply_stats(json.loads(line)["stats"])
+        self.ready = True
+        self._task_read = asyncio.create_task(self._read_loop())
+
+    async def stop(self):
+        self.ready = False
+        if self.process is None or self.process.returncode is not None:
+            return
+        assert self.process.stdin is not None
+        self.process.stdin.close()  # the worker closes its browsers and exits
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=10)
+        except TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    async def wait(self) -> int | None:
+        """Wait until the worker exits and its running requests have failed"""
+        assert self.process is not None
+        returncode = await self.process.wait()
+        if self._task_read is not None:
+            await self._task_read
+        return returncode
+
+    async def request(
+        self, op: str, take_token: TakeToken, **params: Any
+    ) -> AsyncIterator[Any]:
+        """
+        Yield the records of the request, as they arrive. The worker's TikTok
+        requests take their tokens with `take_token`.
+        """
+        assert self.process is not None and self.process.stdin is not None
+        self._next_id += 1
+        request_id = self._next_id
+        responses: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._responses[request_id] = responses
+        done = False
+        try:
+            self.process.stdin.write(_encode({"id": request_id, "op": op, **params}))
+            await self.process.stdin.drain()
+            while True:
+                response = await responses.get()
+                if "token" in response:
+                    await take_token(response["token"])
+                    self.process.stdin.write(_encode({"id": request_id, "op": "token"}))
+                    await self.process.stdin.drain()
+                    continue
+                if "error" in response:
+                    done = True
+                    raise ScrapeWorkerError(response["error"], response["kind"])
+                if "item" not in response:
+                    done = True
+                    return
+                yield response["item"]
+        finally:
+            del self._responses[request_id]
+            if not done and self.ready:
+                # stopped early by the caller, so let the worker stop as well
+                self.process.stdin.write(_encode({"id": request_id, "op": "cancel"}))
+
+    async def _read_loop(self):
+        assert self.process is not None and self.process.stdout is not None
+        try:
+            async for line in self.process.stdout:
+                response = json.loads(line)
+                if "stats" in response:
+                    self._apply_stats(response["stats"])
+                    continue
+                responses = self._responses.get(response["id"])
+                if responses is not None:
+                    responses.put_nowait(response)
+        except Exception:
+            # e.g. a malformed or too long line, after which the stream is out of
+            # step, so the worker is restarted
+            logger.exception(f"Failed to read from scrape worker {self.index}")
+            if self.process.returncode is None:
+                self.process.kill()
+        finally:
+            # the worker exited, fail the requests still running on it
+            self.ready = False
+            self.browsers = 0
+            for responses in self._responses.values():
+                responses.put_nowait(
+                    {
+                        "error": f"Scrape worker {self.index} exited",
+                        "kind": "ScrapeWorkerError",
+                    }
+                )
+
+    def _apply_stats(self, stats: dict[str, Any]):
+        self.browsers = stats["browsers"]
+        metrics.tiktok_request_seconds.merge(stats["request_seconds"])
+
+
+class ScrapeWorkerPool:
+    """
+    Has the same interface as `TiktokService`, but scrapes in a pool of supervised
+    worker processes. Requests go to the least loaded ready worker, and workers
+    that exit are restarted with backoff.
+    """
+
+    def __init__(self, num_workers: int = NUM_WORKERS):
+        self.workers = [ScrapeWorker(i) for i in range(num_workers)]
+        self._worker_ready = asyncio.Condition()
+        self._tasks_supervise: list[asyncio.Task[None]] = []
+        self._closing = False
+
+    @property
+    def num_ready(self) -> int:
+        return sum(worker.ready for worker in self.workers)
+
+    async def start(self):
+        """Start the workers, each launches and warms up its own browsers"""
+        self._tasks_supervise = [
+            asyncio.create_task(self._supervise(worker)) for worker in self.workers
+        ]
+        try:
+            async with asyncio.timeout(STARTUP_TIMEOUT):
+                async with self._worker_ready:
+                    await self._worker_ready.wait_for(lambda: self.num_ready > 0)
+        except TimeoutError:
+            logger.warning("No scrape worker is ready yet, requests will wait")
+
+    async def end(self):
+        self._closing = True
+        for task in self._tasks_supervise:
+            task.cancel()
+        await asyncio.gather(*self._tasks_supervise, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+    async def get_user_info(
+        self, username: str, take_token: TakeToken | None = None
+    ) -> TiktokChannel:
+        records = self._request(
+            "user_info", take_token or spend_token, username=username
+        )
+        async with aclosing(records):
+            async for record in records:
+                return channel_from_record(record)
+        raise ScrapeWorkerError(f"No user info returned for {username}")
+
+    async def get_user_video_pages(
+        self,
+        username: str,
+        paging: VideoPaging = VideoPaging(),
+        take_token: TakeToken | None = None,
+    ) -> AsyncIterator[TiktokVideoPage]:
+        records = self._request(
+            "user_video_pages",
+            take_token or spend_token,
+            username=username,
+            paging=paging_to_dict(paging),
+        )
+        async with aclosing(records):
+            async for record in records:
+                yield page_from_record(record)
+
+    async def get_user_videos(
+        self,
+        username: str,
+        paging: VideoPaging = VideoPaging(),
+        take_token: TakeToken | None = None,
+    ) -> AsyncIterator[TiktokPost]:
+        pages = self.get_user_video_pages(username, paging, take_token)
+        async with aclosing(pages):
+            async for page in pages:
+                for post in page.posts:
+                    yield post
+
+    async def _request(
+        self, op: str, take_token: TakeToken, **params: Any
+    ) -> AsyncIterator[Any]:
+        async with self._worker_ready:
+            await self._worker_ready.wait_for(lambda: self.num_ready > 0)
+            worker = min(
+                (worker for worker in self.workers if worker.ready),
+                key=lambda worker: worker.in_flight,
+            )
+        async with aclosing(worker.request(op, take_token, **params)) as records:
+            async for record in records:
+                yield record
+
+    async def _supervise(self, worker: ScrapeWorker):
+        delay = 1.0
+        while not self._closing:
+            started = time.monotonic()
+            try:
+                await worker.start()
+                async with self._worker_ready:
+                    self._worker_ready.notify_all()
+                logger.info(f"Scrape worker {worker.index} is ready")
+                returncode = await worker.wait()
+                logger.error(f"Scrape worker {worker.index} exited ({returncode})")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Failed to start scrape worker {worker.index}")
+                await worker.stop()
+            # a worker that crashes right after getting ready is backed off as well
+            if time.monotonic() - started >= MIN_STABLE_UPTIME:
+                delay = 1.0
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+
+metrics.Gauge(
+    "pay_scrape_workers",
+    "Number of ready scraping worker processes",
+    collect=lambda: (
+        tiktok_service.num_ready if isinstance(tiktok_service, ScrapeWorkerPool) else 0
+    ),
+)
+
+tiktok_service: TiktokService | ScrapeWorkerPool = (
+    ScrapeWorkerPool() if NUM_WORKERS > 0 else TiktokService()
+)
+"""The process-wide scraper, shared by all sessions, started and closed with the app"""
+
+if isinstance(tiktok_service, ScrapeWorkerPool):
+    # the browsers run in the workers, which report their number
+    metrics.tiktok_browsers.collect = lambda: sum(
+        worker.browsers for worker in tiktok_service.workers
+    )
+
+
+# ===== worker process side ===== #
+async def _serve_requests(protocol_out: int):
+    loop = asyncio.get_running_loop()
+    stdin = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(stdin), sys.stdin.buffer
+    )
+    out = os.fdopen(protocol_out, "wb", buffering=0)
+
+    def send(message: dict[str, Any]):
+        out.write(_encode(message))
+
+    def stats() -> dict[str, Any]:
+        return {
+            "browsers": metrics.tiktok_browsers.value,
+            "request_seconds": metrics.tiktok_request_seconds.drain(),
+        }
+
+    async def report_stats():
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            send({"stats": stats()})
+
+    service = TiktokService()
+    await service.start()
+    send({"ready": True, "stats": stats()})
+    task_report_stats = asyncio.create_task(report_stats())
+
+    tasks: dict[int, asyncio.Task[None]] = {}
+    tokens: dict[int, asyncio.Queue[None]] = {}
+
+    async def run(request: dict[str, Any]):
+        request_id, op, username = request["id"], request["op"], request["username"]
+        tokens[request_id] = asyncio.Queue()
+
+        async def take_token(operation: str):
+            send({"id": request_id, "token": operation})
+            await tokens[request_id].get()
+
+        try:
+            if op == "user_info":
+                channel = await service.get_user_info(username, take_token)
+                send({"id": request_id, "item": channel_to_record(channel)})
+            else:
+                paging = paging_from_dict(request["paging"])
+                pages = service.get_user_video_pages(username, paging, take_token)
+                async for page in pages:
+                    send({"id": request_id, "item": page_to_record(page)})
+            send({"id": request_id})
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception(f"Error scraping {op} of {username}")
+            send({"id": request_id, "error": str(e), "kind": type(e).__name__})
+        finally:
+            tasks.pop(request_id, None)
+            tokens.pop(request_id, None)
+
+    async for line in stdin:
+        request = json.loads(line)
+        if request["op"] == "cancel":
+            if task := tasks.get(request["id"]):
+                task.cancel()
+            continue
+        if request["op"] == "token":
+            if queue := tokens.get(request["id"]):
+                queue.put_nowait(None)
+            continue
+        tasks[request["id"]] = asyncio.create_task(run(request))
+
+    # stdin was closed by the web process
+    task_report_stats.cancel()
+    for task in list(tasks.values()):
+        task.cancel()
+    await service.end()
+    send({"stats": stats()})  # the latencies since the last report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    # keep stdout for the protocol only, anything else printed goes to stderr
+    protocol_out = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    asyncio.run(_serve_requests(protocol_out))
+
+
+if __name__ == "__main__":
+    main()
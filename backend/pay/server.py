@@ -2,12 +2,25 @@ import asyncio
 import logging
 from functools import cache
 
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, Header, HTTPException, WebSocket
 from fastapi.openapi.utils import get_openapi
-from ws_sync import Session
+from fastapi.responses import PlainTextResponse
 from ws_sync.synced_model import registered_synced_models
 
-from pay.synced import BackendState
+from pay import config
+
+# the app modules read their settings from the environment when imported
+config.load()
+
+from pay import metrics  # noqa: E402
+from pay.agents.llm import llm  # noqa: E402
+from pay.analytics import post_stats  # noqa: E402
+from pay.media import media_cache  # noqa: E402
+from pay.payout_jobs import payout_queue  # noqa: E402
+from pay.scrape_workers import tiktok_service  # noqa: E402
+from pay.sessions import session_registry  # noqa: E402
+from pay.stats_refresh import stats_refresher  # noqa: E402
+from pay.store import store  # noqa: E402
 
 logger = logging.getLogger(__name__)
 app = FastAPI()
@@ -36,29 +49,73 @@ async def setup_asyncio_exception_handler():
     logger.info("Asyncio exception handler configured")
 
 
+@app.on_event("startup")
+async def start_background_services():
+    """Launch the browsers before the first connection, so no client waits for them"""
+    config.validate()
+    await tiktok_service.start()
+    await store.start()
+    media_cache.start()
+    stored = store.load()
+    post_stats.load(
+        stored.posts_by_channel_id, stored.post_evaluations, stored.post_payouts
+    )
+    await payout_queue.start()
+    await session_registry.start()
+    await stats_refresher.start()
+
+
+@app.on_event("shutdown")
+async def close_background_services():
+    """Stop the sessions, browsers and payout workers and flush the pending writes"""
+    await stats_refresher.close()
+    await session_registry.close()
+    await tiktok_service.end()
+    await payout_queue.close()
+    await store.close()
+    await media_cache.close()
+    await llm.close()
+
+
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Prometheus metrics, see pay/metrics.py"""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# ========== cached avatar and cover images ========== #
+@app.get("/media/{key}")
+async def read_media(key: str, if_none_match: str | None = Header(default=None)):
+    """Cached media file of a scraped channel or post, see pay/media.py"""
+    return await media_cache.response(key, thumbnail=False, if_none_match=if_none_match)
+
+
+@app.get("/media/{key}/thumbnail")
+async def read_media_thumbnail(
+    key: str, if_none_match: str | None = Header(default=None)
+):
+    """Downscaled post cover for the post grid, the original if there's none"""
+    return await media_cache.response(key, thumbnail=True, if_none_match=if_none_match)
+
+
 # ========== websocket frontend dashboard sessions ========== #
-sessions: dict[str, Session] = {}
+sessions = session_registry.sessions
+"""Live sessions by id, idle ones are evicted and rehydrated by the registry"""
 
 
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(ws: WebSocket, session_id: str):
-    if session_id not in sessions:
-        logger.info(f"Creating new session: {session_id}")
-        session = Session()
-        with session:
-            session.state = BackendState()
-
-        sessions[session_id] = session  # save session to global sessions dict
-    else:
-        logger.info(f"Session already exists: {session_id}")
-        session = sessions[session_id]
-
+    session = await session_registry.get_or_create(session_id)
     await session.handle_connection(ws)
+    if session_id in sessions:
+        session_registry.touch(session_id)  # idle from now on
 
 
 # ========== ws-sync json schema endpoints ========== #
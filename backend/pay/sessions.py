@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from ws_sync import Session
+
+from pay import metrics
+from pay.synced import BackendState, SessionSnapshot
+
+logger = logging.getLogger(__name__)
+
+MAX_LIVE_SESSIONS = int(os.getenv("PAY_MAX_LIVE_SESSIONS", "50"))
+"""Max number of sessions kept in memory, least recently used ones are evicted"""
+SESSION_IDLE_TIMEOUT = float(os.getenv("PAY_SESSION_IDLE_TIMEOUT", "900"))
+"""Seconds a disconnected session is kept in memory before it's evicted"""
+MAX_SNAPSHOTS = int(os.getenv("PAY_MAX_SESSION_SNAPSHOTS", "10000"))
+"""Max number of evicted session snapshots kept for rehydration"""
+SWEEP_INTERVAL = 30
+"""Seconds between checks for idle sessions"""
+
+
+class MeteredSession(Session):
+    """Records the size of the messages sent to the client"""
+
+    async def send(self, event: str, data: Any):
+        if not metrics.ENABLED or self.ws is None:
+            return await super().send(event, data)
+        try:
+            # serialized here instead of by send_json, to measure it without
+            # serializing twice
+            text = json.dumps(
+                {"type": event, "data": data},
+                separators=(",", ":"),
+                ensure_ascii=False,
+            )
+            metrics.sync_payload_bytes.observe(
+                len(text.encode()), event=event.split(":")[0]
+            )
+            await self.ws.send_text(text)
+        except Exception as e:
+            logger.error(f"Error sending event {event}: {e}")
+
+
+class SessionRegistry:
+    """
+    The live dashboard sessions by session id.
+
+    Sessions that stay disconnected for `idle_timeout`, or the least recently used
+    ones once there are more than `max_live_sessions`, are evicted: their
+    background tasks are stopped, and only a compact snapshot is kept, from which
+    the session is rehydrated when the same id connects again.
+    """
+
+    def __init__(
+        self,
+        max_live_sessions: int = MAX_LIVE_SESSIONS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        max_snapshots: int = MAX_SNAPSHOTS,
+    ):
+        self.max_live_sessions = max_live_sessions
+        self.idle_timeout = idle_timeout
+        self.max_snapshots = max_snapshots
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+        """Live sessions, least recently used first"""
+        self.snapshots: OrderedDict[str, SessionSnapshot] = OrderedDict()
+        """Snapshots of evicted sessions, oldest first"""
+        self._last_active: dict[str, float] = {}
+        self._task_sweep: asyncio.Task[None] | None = None
+
+    async def start(self):
+        self._task_sweep = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._task_sweep is not None:
+            self._task_sweep.cancel()
+            await asyncio.gather(self._task_sweep, return_exceptions=True)
+        for session_id in list(self.sessions):
+            await self.evict(session_id)
+
+    async def get_or_create(self, session_id: str) -> Session:
+        # no awaits until the session is registered, so concurrent connects of the
+        # same session get the same state
+        if session_id in self.sessions:
+            logger.info(f"Session already exists: {session_id}")
+            session = self.sessions[session_id]
+        else:
+            session = MeteredSession()
+            snapshot = self.snapshots.pop(session_id, None)
+            if snapshot is not None:
+                logger.info(f"Rehydrating evicted session: {session_id}")
+                with session:
+                    session.state = BackendState.from_snapshot(snapshot)
+            else:
+                logger.info(f"Creating new session: {session_id}")
+                with session:
+                    session.state = BackendState()
+            self.sessions[session_id] = session
+
+        self.touch(session_id)
+        await self._evict_over_capacity(keep=session_id)
+        return session
+
+    def touch(self, session_id: str):
+        self.sessions.move_to_end(session_id)
+        self._last_active[session_id] = time.monotonic()
+
+    async def evict(self, session_id: str):
+        session = self.sessions.pop(session_id)
+        self._last_active.pop(session_id, None)
+        logger.info(f"Evicting session: {session_id}")
+
+        # snapshot before any await, so a reconnect in the meantime rehydrates it
+        state = session.state
+        if isinstance(state, BackendState):
+            self.snapshots[session_id] = state.snapshot()
+            self.snapshots.move_to_end(session_id)
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+
+        if session.is_connected:
+            await session.disconnect(
+                "This session was closed to free up resources, please refresh the page."
+            )
+        if isinstance(state, BackendState):
+            await state.close()
+        session.state = None
+
+    async def _evict_over_capacity(self, keep: str):
+        """
+        Evict the least recently used sessions, preferring disconnected ones. The
+        `keep` session is about to connect, so it's never evicted.
+        """
+        while len(self.sessions) > self.max_live_sessions:
+            others = [session_id for session_id in self.sessions if session_id != keep]
+            if not others:
+                return
+            candidates = [
+                session_id
+                for session_id in others
+                if not self.sessions[session_id].is_connected
+            ] or others
+            await self.evict(candidates[0])
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if session.is_connected:
+                    self._last_active[session_id] = now
+                elif now - self._last_active[session_id] > self.idle_timeout:
+                    try:
+                        await self.evict(session_id)
+                    except Exception:
+                        logger.exception(f"Error evicting session {session_id}")
+
+
+session_registry = SessionRegistry()
+"""The process-wide session registry, started and closed with the app"""
+
+metrics.Gauge(
+    "pay_sessions",
+    "Number of live sessions",
+    collect=lambda: len(session_registry.sessions),
+)
+metrics.Gauge(
+    "pay_connected_sessions",
+    "Number of sessions with a connected client",
+    collect=lambda: sum(
+        session.is_connected for session in session_registry.sessions.values()
+    ),
+)
@@ -0,0 +1,294 @@
+"""
+Background refresh of post and channel stats, so that payouts are computed from
+recent stats and not from whatever was scraped when a client last connected.
+
+Each post is re-polled at an interval that grows with its age and shrinks with its
+recent growth: hot, fast-growing posts every few minutes, old, flat ones about once
+a day. A channel's posts are re-polled by paging through its newest videos until all
+of its due posts are seen, so polling the recent posts is cheap. Every TikTok request
+of the refresh waits for a token of the shared `scrape_budget`, right before it's
+made.
+
+The refreshed stats are stored and re-evaluated once here, and the live sessions
+only merge them into their state.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import datetime
+
+from pay import metrics
+from pay.agents.post_evaluation_agent import evaluation_engine, needs_evaluation
+from pay.media import localize_channel, localize_post
+from pay.scrape_workers import tiktok_service
+from pay.sessions import session_registry
+from pay.store import store
+from pay.synced import BackendState
+from pay.tiktok import (
+    TiktokChannel,
+    TiktokPost,
+    VideoPaging,
+    channel_cache,
+    posts_cache,
+    scrape_budget,
+    wait_for_token,
+)
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("TIKTOK_STATS_REFRESH", "true").lower() != "false"
+MIN_REFRESH_INTERVAL = float(os.getenv("TIKTOK_STATS_MIN_REFRESH_INTERVAL", "120"))
+"""Min seconds between polls of the same post"""
+MAX_REFRESH_INTERVAL = float(
+    os.getenv("TIKTOK_STATS_MAX_REFRESH_INTERVAL", str(24 * 3600))
+)
+"""Max seconds between polls of the same post"""
+CHANNEL_REFRESH_INTERVAL = float(os.getenv("TIKTOK_CHANNEL_REFRESH_INTERVAL", "3600"))
+"""Seconds between polls of the same channel's stats"""
+REFRESH_AGE_FACTOR = 0.05
+"""Seconds between polls per second of post age, before adjusting for growth"""
+GROWTH_WEIGHT = 10
+"""How much more often a post is polled per unit of relative play growth per hour"""
+MAX_TICK = 10
+"""Max seconds between checks for due posts, so that new sessions are picked up"""
+
+
+def refresh_interval(age: float, growth_per_hour: float) -> float:
+    """
+    Seconds until a post is polled again, given its age in seconds and its relative
+    play growth per hour since the last poll
+    """
+    interval = age * REFRESH_AGE_FACTOR / (1 + GROWTH_WEIGHT * max(growth_per_hour, 0))
+    return min(max(interval, MIN_REFRESH_INTERVAL), MAX_REFRESH_INTERVAL)
+
+
+@dataclass
+class PostSchedule:
+    due: float
+    """Monotonic time the post is polled next"""
+    play_count: int
+    """Plays at the last poll"""
+    polled: float
+    """Monotonic time of the last poll"""
+
+
+class StatsRefreshScheduler:
+    """Re-polls the stats of the channels and posts shown by the live sessions"""
+
+    def __init__(self):
+        self.post_schedules: dict[str, PostSchedule] = {}
+        """Schedules of the tracked posts, by post id"""
+        self.channels_due: dict[str, float] = {}
+        """Monotonic time each tracked channel is polled next, by username"""
+        self._task_loop: asyncio.Task[None] | None = None
+        self._tasks_evaluate: set[asyncio.Task[None]] = set()
+
+    async def start(self):
+        if ENABLED:
+            self._task_loop = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task_loop is not None:
+            self._task_loop.cancel()
+            await asyncio.gather(self._task_loop, return_exceptions=True)
+            self._task_loop = None
+        tasks = [*self._tasks_evaluate]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _states(self) -> list[BackendState]:
+        return [
+            session.state
+            for session in session_registry.sessions.values()
+            if isinstance(session.state, BackendState)
+        ]
+
+    def _tracked(self) -> dict[str, tuple[TiktokChannel, list[TiktokPost]]]:
+        """The channels of the live sessions by username, with their known posts"""
+        tracked: dict[str, tuple[TiktokChannel, list[TiktokPost]]] = {}
+        for state in self._states():
+            for channel in state.channels:
+                posts = state.get_channel_posts(channel.id)
+                known = tracked.get(channel.handle)
+                if known is None or len(posts) > len(known[1]):
+                    tracked[channel.handle] = (channel, posts)
+        return tracked
+
+    async def _loop(self):
+        while True:
+            now = time.monotonic()
+            next_check = now + MAX_TICK
+            refreshes = []
+            tracked = self._tracked()
+            for username, (channel, posts) in tracked.items():
+                due_posts = []
+                for post in posts:
+                    schedule = self.post_schedules.get(post.id)
+                    if schedule is None:
+                        schedule = self.post_schedules[post.id] = PostSchedule(
+                            due=now + refresh_interval(_age(post), 0),
+                            play_count=post.stats.play_count,
+                            polled=now,
+                        )
+                    if schedule.due <= now:
+                        due_posts.append(post)
+                    else:
+                        next_check = min(next_check, schedule.due)
+                channel_due = self.channels_due.setdefault(
+                    username, now + CHANNEL_REFRESH_INTERVAL
+                )
+                if channel_due <= now:
+                    refreshes.append(self._refresh_channel(username))
+                else:
+                    next_check = min(next_check, channel_due)
+                if due_posts:
+                    refreshes.append(
+                        self._refresh_posts(username, channel, posts, due_posts)
+                    )
+
+            results = await asyncio.gather(*refreshes, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(
+                        "Failed to refresh stats from TikTok",
+                        exc_info=(type(result), result, result.__traceback__),
+                    )
+
+            # forget the posts and channels no live session shows anymore
+            tracked_post_ids = {
+                post.id for _, posts in tracked.values() for post in posts
+            }
+            for post_id in self.post_schedules.keys() - tracked_post_ids:
+                del self.post_schedules[post_id]
+            for username in self.channels_due.keys() - tracked.keys():
+                del self.channels_due[username]
+
+            await asyncio.sleep(max(next_check - time.monotonic(), 1))
+
+    async def _refresh_channel(self, username: str):
+        # retried after the full interval if it fails, the stats are just less fresh
+        self.channels_due[username] = time.monotonic() + CHANNEL_REFRESH_INTERVAL
+        channel = localize_channel(
+            await tiktok_service.get_user_info(username, _take_token)
+        )
+        channel_cache.set(username, channel)
+        stored = store.channel(channel.id)
+        if stored is None:
+            return  # removed meanwhile
+        if stored != channel:
+            store.save_channel(channel)
+        for state in self._states():
+            await state.apply_refreshed_channel(channel)
+
+    async def _refresh_posts(
+        self,
+        username: str,
+        channel: TiktokChannel,
+        known_posts: list[TiktokPost],
+        due_posts: list[TiktokPost],
+    ):
+        now = time.monotonic()
+        for post in due_posts:
+            # retried after the min interval if the poll fails
+            self.post_schedules[post.id].due = now + MIN_REFRESH_INTERVAL
+
+        refreshed = await self._poll_posts(username, due_posts)
+
+        now = time.monotonic()
+        known = {post.id: post for post in known_posts}
+        changed = []
+        for post in refreshed:
+            schedule = self.post_schedules.get(post.id)
+            if schedule is None or post.id not in known:
+                continue  # new posts are fetched when a client connects
+            hours = max(now - schedule.polled, 1) / 3600
+            plays = post.stats.play_count
+            growth = (plays - schedule.play_count) / max(schedule.play_count, 1) / hours
+            schedule.due = now + refresh_interval(_age(post), growth)
+            schedule.play_count = plays
+            schedule.polled = now
+            if known[post.id] != post:
+                changed.append(post)
+        if not changed or store.channel(channel.id) is None:
+            return
+
+        metrics.stats_refresh_changed_posts_total.inc(len(changed))
+        store.save_posts(channel.id, changed)
+        for state in self._states():
+            await state.apply_refreshed_posts(channel.id, changed)
+        if (cached := posts_cache.peek(username)) is not None:
+            by_id = {post.id: post for post in changed}
+            posts_cache.set(username, [by_id.get(post.id, post) for post in cached])
+        self._evaluate_in_background(
+            channel,
+            [
+                post
+                for post in changed
+                if needs_evaluation(post, store.post_evaluation(post.id))
+            ],
+        )
+
+    def _evaluate_in_background(self, channel: TiktokChannel, posts: list[TiktokPost]):
+        """Re-evaluate the refreshed posts, and apply the results to every session"""
+
+        async def evaluate(post: TiktokPost):
+            try:
+                evaluation = await evaluation_engine.evaluate(channel, post)
+            except Exception:
+                logger.exception(f"Failed to re-evaluate post {post.id}")
+                return
+            store.save_evaluation(post.id, evaluation)
+            for state in self._states():
+                await state.apply_evaluation(post.id, evaluation)
+
+        for post in posts:
+            task = asyncio.create_task(evaluate(post))
+            task.add_done_callback(self._tasks_evaluate.discard)
+            self._tasks_evaluate.add(task)
+
+    async def _poll_posts(
+        self, username: str, due_posts: list[TiktokPost]
+    ) -> list[TiktokPost]:
+        """
+        Scrape the newest videos of the user until all due posts are seen, or until
+        past the oldest due post
+        """
+        due_ids = {post.id for post in due_posts}
+        paging = VideoPaging(
+            max_count=None, since=min(post.date_posted for post in due_posts)
+        )
+        polled: list[TiktokPost] = []
+
+        pages = tiktok_service.get_user_video_pages(username, paging, _take_token)
+        async with aclosing(pages):
+            async for page in pages:
+                polled.extend(localize_post(post) for post in page.posts)
+                due_ids.difference_update(post.id for post in page.posts)
+                if not due_ids or page.cursor is None:
+                    break
+        return polled
+
+
+async def _take_token(operation: str):
+    await wait_for_token(operation)
+    metrics.stats_refresh_polls_total.inc(operation=operation)
+
+
+def _age(post: TiktokPost) -> float:
+    """Age of the post in seconds"""
+    return max(datetime.now().timestamp() - post.date_posted.timestamp(), 0)
+
+
+stats_refresher = StatsRefreshScheduler()
+"""The process-wide stats refresh, started and closed with the app"""
+
+metrics.Gauge(
+    "pay_scrape_budget_tokens",
+    "Tokens left in the TikTok request budget",
+    collect=lambda: scrape_budget.tokens,
+)
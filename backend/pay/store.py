@@ -0,0 +1,458 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+
+from pay.agents.payout_agent import Payout, PayoutJob
+from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.analytics import post_stats
+from pay.tiktok import TiktokChannel, TiktokPost
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("PAY_DB_PATH", "pay.db")
+"""Path of the local SQLite database"""
+FLUSH_INTERVAL = float(os.getenv("PAY_DB_FLUSH_INTERVAL", "0.5"))
+"""Seconds to collect writes before they're flushed to disk in one transaction"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    date_posted TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_channel_id_date_posted
+    ON posts (channel_id, date_posted DESC);
+CREATE INDEX IF NOT EXISTS posts_date_posted ON posts (date_posted DESC);
+CREATE TABLE IF NOT EXISTS post_evaluations (
+    post_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS post_payouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id TEXT NOT NULL,
+    date_paid TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS post_payouts_post_id ON post_payouts (post_id, id);
+CREATE TABLE IF NOT EXISTS payout_jobs (
+    post_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payout_jobs_status ON payout_jobs (status);
+CREATE TABLE IF NOT EXISTS video_cursors (
+    channel_id TEXT PRIMARY KEY,
+    cursor INTEGER
+);
+CREATE TABLE IF NOT EXISTS media_sources (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    thumbnail INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class StoredState:
+    channels: list[TiktokChannel] = field(default_factory=list)
+    posts_by_channel_id: dict[str, list[TiktokPost]] = field(default_factory=dict)
+    post_evaluations: dict[str, TiktokPostEvaluation] = field(default_factory=dict)
+    post_payouts: dict[str, list[Payout]] = field(default_factory=dict)
+
+
+@dataclass
+class _PendingWrites:
+    channels: dict[str, TiktokChannel] = field(default_factory=dict)
+    posts: dict[str, tuple[str, TiktokPost]] = field(default_factory=dict)
+    """(channel id, post) by post id"""
+    post_evaluations: dict[str, TiktokPostEvaluation] = field(default_factory=dict)
+    post_payouts: list[tuple[str, Payout]] = field(default_factory=list)
+    payout_jobs: dict[str, PayoutJob] = field(default_factory=dict)
+    video_cursors: dict[str, int | None] = field(default_factory=dict)
+    media_sources: dict[str, tuple[str, bool]] = field(default_factory=dict)
+    """(source URL, whether it gets a thumbnail) by media key"""
+    deleted_channels: set[str] = field(default_factory=set)
+    """Channel ids to delete along with their posts, before any other write"""
+
+    def __bool__(self):
+        return bool(
+            self.channels
+            or self.posts
+            or self.post_evaluations
+            or self.post_payouts
+            or self.payout_jobs
+            or self.video_cursors
+            or self.media_sources
+            or self.deleted_channels
+        )
+
+    def merge(self, newer: "_PendingWrites") -> "_PendingWrites":
+        """These writes followed by the newer ones, as one batch"""
+        deleted = newer.deleted_channels
+        return _PendingWrites(
+            channels={
+                **{
+                    channel_id: channel
+                    for channel_id, channel in self.channels.items()
+                    if channel_id not in deleted
+                },
+                **newer.channels,
+            },
+            posts={
+                **{
+                    post_id: (channel_id, post)
+                    for post_id, (channel_id, post) in self.posts.items()
+                    if channel_id not in deleted
+                },
+                **newer.posts,
+            },
+            post_evaluations={**self.post_evaluations, **newer.post_evaluations},
+            post_payouts=[*self.post_payouts, *newer.post_payouts],
+            payout_jobs={**self.payout_jobs, **newer.payout_jobs},
+            video_cursors={
+                **{
+                    channel_id: cursor
+                    for channel_id, cursor in self.video_cursors.items()
+                    if channel_id not in deleted
+                },
+                **newer.video_cursors,
+            },
+            media_sources={**self.media_sources, **newer.media_sources},
+            deleted_channels=self.deleted_channels | deleted,
+        )
+
+
+class Store:
+    """
+    Persists the backend state in a local SQLite database.
+
+    Writes are queued in memory (repeated writes of the same entity are coalesced)
+    and flushed in a single transaction on a worker thread, so the event loop never
+    waits on disk I/O. Every write also updates the columnar post stats.
+
+    The state is read from the database once on startup and then kept in memory,
+    so new sessions start from a snapshot without reading the database.
+    """
+
+    def __init__(self, path: str = DB_PATH, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._pending = _PendingWrites()
+        self._task_writer: asyncio.Task[None] | None = None
+        self._dirty = asyncio.Event()
+        # the in-memory state, as of the latest writes
+        self._channels: dict[str, TiktokChannel] = {}
+        """Channels by id, in the order they were first saved"""
+        self._posts: dict[str, dict[str, TiktokPost]] = {}
+        """Posts by id, by channel id"""
+        self._post_evaluations: dict[str, TiktokPostEvaluation] = {}
+        self._post_payouts: dict[str, list[Payout]] = {}
+        self._video_cursors: dict[str, int | None] = {}
+        self._media_sources: dict[str, tuple[str, bool]] = {}
+        """(source URL, whether it gets a thumbnail) by media key"""
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    async def start(self):
+        self._task_writer = asyncio.create_task(self._writer_loop())
+
+    async def close(self):
+        if self._task_writer:
+            self._task_writer.cancel()
+        await self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ===== reads ===== #
+    def load(self) -> StoredState:
+        """Read the whole state from the database, and keep it in memory"""
+        state = StoredState()
+        with self._lock:
+            for (data,) in self.conn.execute(
+                "SELECT data FROM channels ORDER BY rowid"
+            ):
+                state.channels.append(TiktokChannel.model_validate_json(data))
+            for channel_id, data in self.conn.execute(
+                "SELECT channel_id, data FROM posts ORDER BY channel_id, date_posted DESC"
+            ):
+                state.posts_by_channel_id.setdefault(channel_id, []).append(
+                    TiktokPost.model_validate_json(data)
+                )
+            for post_id, data in self.conn.execute(
+                "SELECT post_id, data FROM post_evaluations"
+            ):
+                state.post_evaluations[post_id] = (
+                    TiktokPostEvaluation.model_validate_json(data)
+                )
+            for post_id, data in self.conn.execute(
+                "SELECT post_id, data FROM post_payouts ORDER BY post_id, id"
+            ):
+                state.post_payouts.setdefault(post_id, []).append(
+                    Payout.model_validate_json(data)
+                )
+            self._video_cursors = dict(
+                self.conn.execute("SELECT channel_id, cursor FROM video_cursors")
+            )
+            self._media_sources = {
+                key: (url, bool(thumbnail))
+                for key, url, thumbnail in self.conn.execute(
+                    "SELECT key, url, thumbnail FROM media_sources"
+                )
+            }
+        self._channels = {channel.id: channel for channel in state.channels}
+        self._posts = {
+            channel_id: {post.id: post for post in posts}
+            for channel_id, posts in state.posts_by_channel_id.items()
+        }
+        self._post_evaluations = dict(state.post_evaluations)
+        self._post_payouts = {
+            post_id: list(payouts) for post_id, payouts in state.post_payouts.items()
+        }
+        return state
+
+    def snapshot(self) -> StoredState:
+        """
+        Copy of the in-memory state, as of the latest writes. The models are shared,
+        the containers are not.
+        """
+        return StoredState(
+            channels=list(self._channels.values()),
+            posts_by_channel_id={
+                channel_id: sorted(
+                    posts.values(), key=lambda post: post.date_posted, reverse=True
+                )
+                for channel_id, posts in self._posts.items()
+            },
+            post_evaluations=dict(self._post_evaluations),
+            post_payouts={
+                post_id: list(payouts)
+                for post_id, payouts in self._post_payouts.items()
+            },
+        )
+
+    def channel(self, channel_id: str) -> TiktokChannel | None:
+        """The channel as of the latest writes, None if it isn't stored"""
+        return self._channels.get(channel_id)
+
+    def channel_posts(self, channel_id: str) -> dict[str, TiktokPost]:
+        """The channel's posts by id, as of the latest writes"""
+        return dict(self._posts.get(channel_id, {}))
+
+    def post_evaluation(self, post_id: str) -> TiktokPostEvaluation | None:
+        return self._post_evaluations.get(post_id)
+
+    def load_payout_jobs(self) -> dict[str, PayoutJob]:
+        with self._lock:
+            return {
+                post_id: PayoutJob.model_validate_json(data)
+                for post_id, data in self.conn.execute(
+                    "SELECT post_id, data FROM payout_jobs"
+                )
+            }
+
+    def load_paid_posts(self) -> dict[str, tuple[str, float]]:
+        """
+        (channel id, total paid in USDC) of the posts paid more than 0 USDC, by post
+        id. The channel id is empty if the channel was deleted.
+        """
+        with self._lock:
+            return {
+                post_id: (channel_id, paid)
+                for post_id, channel_id, paid in self.conn.execute(
+                    "SELECT post_payouts.post_id, COALESCE(posts.channel_id, ''), "
+                    "SUM(json_extract(post_payouts.data, '$.determined_final_payout')) "
+                    "AS paid FROM post_payouts "
+                    "LEFT JOIN posts ON posts.id = post_payouts.post_id "
+                    "GROUP BY post_payouts.post_id HAVING paid > 0"
+                )
+            }
+
+    def video_cursor(self, channel_id: str) -> int | None:
+        """
+        Cursor to resume the backfill of the channel's videos from, 0 if it never
+        started and None if it reached the oldest video
+        """
+        return self._video_cursors.get(channel_id, 0)
+
+    def media_source(self, key: str) -> tuple[str, bool] | None:
+        """Latest source URL of the media, and whether it gets a thumbnail"""
+        return self._media_sources.get(key)
+
+    # ===== writes ===== #
+    def save_channel(self, channel: TiktokChannel):
+        self._channels[channel.id] = channel
+        self._pending.channels[channel.id] = channel
+        self._pending.deleted_channels.discard(channel.id)
+        self._dirty.set()
+
+    def delete_channel(self, channel_id: str):
+        """Delete the channel and its posts, evaluations and payouts are kept"""
+        self._channels.pop(channel_id, None)
+        self._posts.pop(channel_id, None)
+        self._video_cursors.pop(channel_id, None)
+        self._pending.channels.pop(channel_id, None)
+        self._pending.video_cursors.pop(channel_id, None)
+        self._pending.posts = {
+            post_id: (post_channel_id, post)
+            for post_id, (post_channel_id, post) in self._pending.posts.items()
+            if post_channel_id != channel_id
+        }
+        self._pending.deleted_channels.add(channel_id)
+        post_stats.remove_channel(channel_id)
+        self._dirty.set()
+
+    def save_posts(self, channel_id: str, posts: list[TiktokPost]):
+        channel_posts = self._posts.setdefault(channel_id, {})
+        for post in posts:
+            channel_posts[post.id] = post
+            self._pending.posts[post.id] = (channel_id, post)
+        post_stats.upsert_posts(channel_id, posts)
+        self._dirty.set()
+
+    def save_evaluation(self, post_id: str, evaluation: TiktokPostEvaluation):
+        self._post_evaluations[post_id] = evaluation
+        self._pending.post_evaluations[post_id] = evaluation
+        post_stats.set_estimated_ctr(post_id, evaluation.estimated_ctr)
+        self._dirty.set()
+
+    def add_payout(self, post_id: str, payout: Payout):
+        self._post_payouts.setdefault(post_id, []).append(payout)
+        self._pending.post_payouts.append((post_id, payout))
+        post_stats.add_payout(post_id, payout.determined_final_payout or 0.0)
+        self._dirty.set()
+
+    def save_payout_job(self, job: PayoutJob):
+        self._pending.payout_jobs[job.post_id] = job
+        self._dirty.set()
+
+    def save_video_cursor(self, channel_id: str, cursor: int | None):
+        self._video_cursors[channel_id] = cursor
+        self._pending.video_cursors[channel_id] = cursor
+        self._dirty.set()
+
+    def save_media_source(self, key: str, url: str, thumbnail: bool):
+        self._media_sources[key] = (url, thumbnail)
+        self._pending.media_sources[key] = (url, thumbnail)
+        self._dirty.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, _PendingWrites()
+        try:
+            await asyncio.to_thread(self._write, pending)
+        except Exception:
+            # the transaction was rolled back, so retry its writes with the next
+            # flush, before the writes made in the meantime
+            self._pending = pending.merge(self._pending)
+            self._dirty.set()
+            raise
+
+    async def _writer_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_interval)  # collect more writes
+            self._dirty.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write to the store")
+
+    def _write(self, pending: _PendingWrites):
+        # serialize on the worker thread as well, it's not free for large batches
+        channels = [
+            (channel.id, channel.model_dump_json())
+            for channel in pending.channels.values()
+        ]
+        posts = [
+            (post.id, channel_id, post.date_posted.isoformat(), post.model_dump_json())
+            for channel_id, post in pending.posts.values()
+        ]
+        evaluations = [
+            (post_id, evaluation.model_dump_json())
+            for post_id, evaluation in pending.post_evaluations.items()
+        ]
+        payouts = [
+            (post_id, payout.date_paid.isoformat(), payout.model_dump_json())
+            for post_id, payout in pending.post_payouts
+        ]
+
+        payout_jobs = [
+            (post_id, job.status, job.model_dump_json())
+            for post_id, job in pending.payout_jobs.items()
+        ]
+        video_cursors = list(pending.video_cursors.items())
+        media_sources = [
+            (key, url, thumbnail)
+            for key, (url, thumbnail) in pending.media_sources.items()
+        ]
+        deleted_channels = [(channel_id,) for channel_id in pending.deleted_channels]
+
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM channels WHERE id = ?", deleted_channels)
+            self.conn.executemany(
+                "DELETE FROM posts WHERE channel_id = ?", deleted_channels
+            )
+            self.conn.executemany(
+                "DELETE FROM video_cursors WHERE channel_id = ?", deleted_channels
+            )
+            self.conn.executemany(
+                "INSERT INTO channels (id, data) VALUES (?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+                channels,
+            )
+            self.conn.executemany(
+                "INSERT INTO posts (id, channel_id, date_posted, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET channel_id = excluded.channel_id, "
+                "date_posted = excluded.date_posted, data = excluded.data",
+                posts,
+            )
+            self.conn.executemany(
+                "INSERT INTO post_evaluations (post_id, data) VALUES (?, ?) "
+                "ON CONFLICT (post_id) DO UPDATE SET data = excluded.data",
+                evaluations,
+            )
+            self.conn.executemany(
+                "INSERT INTO post_payouts (post_id, date_paid, data) VALUES (?, ?, ?)",
+                payouts,
+            )
+            self.conn.executemany(
+                "INSERT INTO payout_jobs (post_id, status, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (post_id) DO UPDATE SET status = excluded.status, "
+                "data = excluded.data",
+                payout_jobs,
+            )
+            self.conn.executemany(
+                "INSERT INTO video_cursors (channel_id, cursor) VALUES (?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET cursor = excluded.cursor",
+                video_cursors,
+            )
+            self.conn.executemany(
+                "INSERT INTO media_sources (key, url, thumbnail) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET url = excluded.url, "
+                "thumbnail = excluded.thumbnail",
+                media_sources,
+            )
+
+
+store = Store()
+"""The process-wide store, started and closed with the app"""
@@ -1,23 +1,91 @@
 # synced object
 import asyncio
+import bisect
 import logging
+import os
+import time
+from contextlib import aclosing
 from datetime import datetime
-from typing import override
+from typing import Any, Callable, Literal, override
 
+from pydantic import Field
 from ws_sync import SessionState, SyncedAsCamelCase, remote_action, sync_all
 
+from pay import metrics
 from pay.agents.payout_agent import (
     ChatBetweenAgentAndCreator,
     ChatMessage,
     Payout,
-    PayoutAgentService,
+    PayoutJob,
+    PayoutProgress,
 )
-from pay.agents.post_evaluation_agent import TiktokPostEvaluation
+from pay.agents.post_evaluation_agent import (
+    TiktokPostEvaluation,
+    evaluation_engine,
+    needs_evaluation,
+)
+from pay.analytics import PostAnalytics, RankingMetric, post_stats
+from pay.media import localize_channel, localize_post
 from pay.model import Model
-from pay.tiktok import TiktokChannel, TiktokPost, TiktokService
+from pay.payout_jobs import MIN_PAYOUT_BUDGET, PayoutBudget, payout_queue
+from pay.pricing import price_posts
+from pay.scrape_workers import tiktok_service
+from pay.store import store
+from pay.tiktok import (
+    TiktokChannel,
+    TiktokPost,
+    VideoPaging,
+    channel_cache,
+    posts_cache,
+)
 
 logger = logging.getLogger(__name__)
 
+FETCH_CONCURRENCY = int(os.getenv("TIKTOK_FETCH_CONCURRENCY", "4"))
+"""Max number of channels fetched from TikTok at the same time (1 = sequential)"""
+FETCH_STALE_AFTER = float(os.getenv("TIKTOK_FETCH_STALE_AFTER", "300"))
+"""Seconds after a completed fetch before a new connection fetches again"""
+FETCH_DETACHED_GRACE = float(os.getenv("TIKTOK_FETCH_DETACHED_GRACE", "30"))
+"""Seconds a fetch keeps running without connected clients before it's cancelled"""
+BACKFILL_MAX_POSTS = int(os.getenv("TIKTOK_BACKFILL_MAX_POSTS", "300"))
+"""Default max number of posts fetched per backfill of a channel"""
+BACKFILL_PAGES_PER_BATCH = int(os.getenv("TIKTOK_BACKFILL_PAGES_PER_BATCH", "3"))
+"""TikTok pages fetched between merges of a backfill (and saves of its cursor)"""
+
+DESTINATION_WALLET_ADDRESS = "0x063c106d59a9b7aff602e7f1df600a9e10ba15de"
+MAX_BUDGET_PER_POST = 4
+"""Max payout for a single post, in USDC"""
+PAYOUT_PROGRESS_SYNC_INTERVAL = 0.1
+"""Min seconds between syncs of the streamed progress of a payout"""
+MAX_ANALYTICS_LIMIT = 1000
+"""Max number of ranked posts a client can query at once"""
+MAX_POST_PAGE_SIZE = 500
+"""Max number of posts per page of the post window"""
+
+
+def _initial_chat() -> ChatBetweenAgentAndCreator:
+    return ChatBetweenAgentAndCreator(
+        chat_history=[
+            ChatMessage(
+                role="creator",
+                content="Hi I've just created my post, and I'm proud of the quality of the content",
+                timestamp=datetime.now(),
+            )
+        ]
+    )
+
+
+def _payout_job_toast(job: PayoutJob) -> str:
+    match job.status:
+        case "paid":
+            return f"Payout completed: {job.final_payout} USDC"
+        case "skipped":
+            return f"No payout for post {job.post_id}: {job.error}"
+        case "unconfirmed":
+            return f"Payout for post {job.post_id} is unconfirmed: {job.error}"
+        case _:
+            return f"Error evaluating and paying for post {job.post_id}: {job.error}"
+
 
 def _log_task_exception(task: asyncio.Task):
     """Log exceptions from completed tasks."""
@@ -29,19 +97,90 @@ def _log_task_exception(task: asyncio.Task):
         logger.exception(f"Exception in task {task.get_name()}")
 
 
+PostSortKey = Literal[
+    "date_posted", "play_count", "like_count", "comment_count", "share_count"
+]
+
+POST_SORT_KEYS: dict[str, Callable[[TiktokPost], Any]] = {
+    "date_posted": lambda post: post.date_posted,
+    "play_count": lambda post: post.stats.play_count,
+    "like_count": lambda post: post.stats.like_count,
+    "comment_count": lambda post: post.stats.comment_count,
+    "share_count": lambda post: post.stats.share_count,
+}
+
+
+class PostWindow(Model):
+    channel_id: str | None = None
+    """Channel whose posts are shown, or None for the first page(s) of every channel"""
+    page: int = Field(0, ge=0)
+    """Zero-based page index"""
+    page_size: int = Field(30, gt=0, le=MAX_POST_PAGE_SIZE)
+    """Number of posts per page"""
+    sort_by: PostSortKey = "date_posted"
+    """Post field to sort by"""
+    descending: bool = True
+    """Sort order"""
+
+
+class SessionSnapshot(Model):
+    """
+    What's left of an evicted session. The data itself is in the store, so only
+    the per-session view and settings have to be kept.
+    """
+
+    post_window: PostWindow
+    payout_job_post_ids: list[str]
+    """Post ids of the bulk payout jobs started from the session"""
+    tracked_users: list[str]
+    date_evicted: datetime
+
+
 class BackendState(SessionState, SyncedAsCamelCase, Model):
+    """
+    Each client subscribes to the posts it is showing via `post_window`, and only
+    that slice of posts (with their evaluations and payouts) is synced.
+    The full data is kept in private attributes.
+    """
+
     channels: list[TiktokChannel] = []
+    post_window: PostWindow = PostWindow()
+    """The page of posts the client is currently showing"""
+    post_counts_by_channel_id: dict[str, int] = {}
+    """Total number of posts by channel id"""
     posts_by_channel_id: dict[str, list[TiktokPost]] = {}
+    """Posts in the current window, by channel id"""
     post_evaluations: dict[str, TiktokPostEvaluation] = {}
-    """Post evaluations by post id"""
+    """Post evaluations of the posts in the current window, by post id"""
     post_payouts: dict[str, list[Payout]] = {}
-    """Payout history by post id"""
+    """Payout history of the posts in the current window, by post id"""
+    payout_jobs: dict[str, PayoutJob] = {}
+    """Payout jobs started from this session, by post id"""
+    payout_progress: dict[str, PayoutProgress] = {}
+    """Live progress of the single payouts running in this session, by post id"""
+    analytics: PostAnalytics = PostAnalytics()
+    """Result of the last analytics query, over the posts of all channels"""
 
     @sync_all()
     def model_post_init(self, _):
-        self._tiktok_service = TiktokService()
-        self._task_init = asyncio.create_task(self._tiktok_service.start())
-        self._task_init.add_done_callback(_log_task_exception)
+        stored = store.snapshot()
+        self.channels = stored.channels
+        self._posts_by_channel_id = stored.posts_by_channel_id
+        """All posts by channel id"""
+        self._post_evaluations = stored.post_evaluations
+        """All post evaluations by post id"""
+        self._post_payouts = stored.post_payouts
+        """All payouts by post id"""
+        self._sorted_posts: dict[tuple[str, str, bool], list[TiktokPost]] = {}
+        """Sorted posts by (channel id, sort key, descending), dropped on change"""
+
+        # id-keyed indexes, kept consistent with the lists above
+        self._channels_by_id: dict[str, TiktokChannel] = {}
+        self._posts_by_id: dict[str, TiktokPost] = {}
+        self._channel_id_by_post_id: dict[str, str] = {}
+        self._channel_positions: dict[str, int] = {}
+        """Index of each channel id in `channels`"""
+        self._reindex()
 
         self._tracked_users = [
             "tenminai.korean",
@@ -49,102 +188,599 @@ class BackendState(SessionState, SyncedAsCamelCase, Model):
             "emmalearnshard",
             "sophiaandlanguages",
         ]
+        self._fetch_concurrency = FETCH_CONCURRENCY
+        self._channel_order: dict[str, int] = {}
+        """Position of each tracked channel id in the tracked users"""
         self._task_fetch_from_tiktok: asyncio.Task[None] | None = None
+        self._task_cancel_detached_fetch: asyncio.Task[None] | None = None
+        self._date_fetched: float | None = None
+        """Monotonic time the last fetch completed without failures"""
+        self._num_connections = 0
+        self._backfilling_channel_ids: set[str] = set()
+        self._tasks_evaluate: set[asyncio.Task[None]] = set()
+        self._update_window()
+
+    def _is_fetching(self) -> bool:
+        return (
+            self._task_fetch_from_tiktok is not None
+            and not self._task_fetch_from_tiktok.done()
+        )
 
     @override
     async def on_connect(self):
-        await self._task_init
+        """
+        At most one fetch runs per session: a new connection attaches to the
+        running fetch (the current state is sent on connect anyway), and only starts
+        a new one if the data is stale
+        """
+        self._num_connections += 1
+        if self._task_cancel_detached_fetch is not None:
+            self._task_cancel_detached_fetch.cancel()
+            self._task_cancel_detached_fetch = None
+
+        if self._is_fetching():
+            logger.info("Attaching to the running fetch from TikTok")
+            return
+        if (
+            self._date_fetched is not None
+            and time.monotonic() - self._date_fetched < FETCH_STALE_AFTER
+        ):
+            return
         self._task_fetch_from_tiktok = asyncio.create_task(self.fetch_from_tiktok())
         self._task_fetch_from_tiktok.add_done_callback(_log_task_exception)
 
-    async def fetch_from_tiktok(self):
-        self.channels = []
-        self.posts_by_channel_id = {}
-        for username in self._tracked_users:
-            channel = await self._tiktok_service.get_user_info(username)
-            self.channels.append(channel)
-            await self.sync()
+    @override
+    async def on_disconnect(self):
+        self._num_connections = max(self._num_connections - 1, 0)
+        if (
+            self._num_connections == 0
+            and self._is_fetching()
+            and self._task_cancel_detached_fetch is None
+        ):
+            self._task_cancel_detached_fetch = asyncio.create_task(
+                self._cancel_detached_fetch()
+            )
+
+    async def _cancel_detached_fetch(self):
+        """
+        Cancel the fetch if no client reconnects within the grace period. What was
+        fetched so far is kept, and the next connection fetches the rest.
+        """
+        await asyncio.sleep(FETCH_DETACHED_GRACE)
+        self._task_cancel_detached_fetch = None
+        if self._num_connections == 0 and self._task_fetch_from_tiktok is not None:
+            logger.info("Cancelling the fetch from TikTok, no clients are connected")
+            self._task_fetch_from_tiktok.cancel()
+
+    @override
+    async def sync(self, *args, **kwargs):
+        if not metrics.ENABLED:
+            return await super().sync(*args, **kwargs)
+        metrics.state_syncs_total.inc()
+        with metrics.state_sync_seconds.time():
+            return await super().sync(*args, **kwargs)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: SessionSnapshot) -> "BackendState":
+        """Rehydrate an evicted session, must be called in the new session's context"""
+        state = cls(
+            post_window=snapshot.post_window,
+            payout_jobs={
+                post_id: payout_queue.jobs[post_id]
+                for post_id in snapshot.payout_job_post_ids
+                if post_id in payout_queue.jobs
+            },
+        )
+        state._tracked_users = snapshot.tracked_users
+        return state
+
+    def snapshot(self) -> SessionSnapshot:
+        return SessionSnapshot(
+            post_window=self.post_window,
+            payout_job_post_ids=list(self.payout_jobs),
+            tracked_users=self._tracked_users,
+            date_evicted=datetime.now(),
+        )
+
+    async def close(self):
+        """Stop the background tasks, before the session is dropped"""
+        tasks = [*self._tasks_evaluate]
+        if self._task_fetch_from_tiktok is not None:
+            tasks.append(self._task_fetch_from_tiktok)
+        if self._task_cancel_detached_fetch is not None:
+            tasks.append(self._task_cancel_detached_fetch)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fetch_user_info(self, username: str) -> TiktokChannel:
+        return localize_channel(await tiktok_service.get_user_info(username))
+
+    async def _fetch_user_videos(
+        self, username: str, channel_id: str
+    ) -> list[TiktokPost]:
+        """
+        Fetch the newest posts of a user, and stop paging past the newest known
+        post. Known posts that weren't re-fetched keep their last stats.
+        The known posts are the stored ones, not this session's, as the result is
+        shared by all sessions through the posts cache.
+        """
+        known_posts = store.channel_posts(channel_id)
+        paging = VideoPaging()
+        if known_posts:
+            newest = max(post.date_posted for post in known_posts.values())
+            paging = VideoPaging(since=newest)
+        fetched: list[TiktokPost] = []
+        pages = tiktok_service.get_user_video_pages(username, paging)
+        async with aclosing(pages):
+            async for page in pages:
+                fetched.extend(localize_post(post) for post in page.posts)
+
+        fetched_ids = {post.id for post in fetched}
+        return fetched + [
+            post for post in known_posts.values() if post.id not in fetched_ids
+        ]
 
-            async for post in self._tiktok_service.get_user_videos(username):
-                if not self.posts_by_channel_id.get(channel.id):
-                    self.posts_by_channel_id[channel.id] = []
-                self.posts_by_channel_id[channel.id].append(post)
+    async def fetch_from_tiktok(self, full_refresh: bool = False):
+        """
+        Fetch the tracked channels and their posts.
+        By default this is incremental: existing posts are kept, only new posts are
+        scraped, and only new or changed entries are replaced, so that the synced
+        patch contains just those.
+        """
+        if full_refresh:
+            self.channels = []
+            self._posts_by_channel_id = {}
+            self._sorted_posts = {}
+            self._reindex()
+            self._update_window()
+        semaphore = asyncio.Semaphore(self._fetch_concurrency)
 
-                # Generate mock evaluation for each post
-                self._generate_mock_evaluation(post)
+        async def fetch_channel(username: str):
+            async with semaphore:
+                channel = await channel_cache.get(
+                    username, lambda: self._fetch_user_info(username)
+                )
+                self._set_channel_order(channel.id, self._tracked_users.index(username))
+                self._merge_channel(channel)
+                self._update_window()
+                await self.sync()
 
+                posts = await posts_cache.get(
+                    username, lambda: self._fetch_user_videos(username, channel.id)
+                )
+                if channel.id not in self._channels_by_id:
+                    return  # removed meanwhile, so its posts mustn't be saved again
+                self._merge_posts(channel.id, posts)
+
+                self._evaluate_in_background(
+                    channel,
+                    [
+                        post
+                        for post in posts
+                        if needs_evaluation(post, self._post_evaluations.get(post.id))
+                    ],
+                )
+
+                self._update_window()
                 await self.sync(if_since_last=1 / 60)
-        await self.sync(toast="Finished fetching from TikTok")
-
-    def _generate_mock_evaluation(self, post: TiktokPost):
-        """Generate mock evaluation data for a post"""
-        import random
-
-        post_types = ["demo", "review", "product recommendation", "trend", "other"]
-        prominence_levels = ["high", "medium", "low"]
-        target_fit_levels = ["high", "medium", "low"]
-
-        product_mentioned = random.choice([True, False])
-        prominence = random.choice(prominence_levels)
-        target_fit = random.choice(target_fit_levels)
-        post_type = random.choice(post_types)
-        estimated_ctr = random.uniform(0.2, 5.0)
-
-        evaluation_text = f"This {post_type} post shows {'strong' if product_mentioned else 'no'} product presence with {prominence} prominence. The content aligns {target_fit} with our target audience. Based on engagement metrics and content quality, we estimate a {estimated_ctr:.2f}% CTR."
-
-        self.post_evaluations[post.id] = TiktokPostEvaluation(
-            id=post.id,
-            product_mentioned=product_mentioned,
-            prominence_of_product=prominence,
-            target_group_fit=target_fit,
-            post_type=post_type,
-            estimated_ctr=round(estimated_ctr, 2),
-            date_evaluated=datetime.now(),
-            evaluation_text=evaluation_text,
+
+        results = await asyncio.gather(
+            *(fetch_channel(username) for username in self._tracked_users),
+            return_exceptions=True,
+        )
+
+        failed_users = []
+        for username, result in zip(self._tracked_users, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"Failed to fetch {username} from TikTok",
+                    exc_info=(type(result), result, result.__traceback__),
+                )
+                failed_users.append(username)
+
+        if failed_users:
+            await self.sync(
+                toast=f"Finished fetching from TikTok, failed: {', '.join(failed_users)}"
+            )
+        else:
+            self._date_fetched = time.monotonic()
+            await self.sync(toast="Finished fetching from TikTok")
+
+    async def apply_refreshed_channel(self, channel: TiktokChannel):
+        """
+        Apply re-polled channel stats, if the session shows the channel. The
+        scheduler has stored them already.
+        """
+        if channel.id not in self._channels_by_id:
+            return
+        self._merge_channel(channel, persist=False)
+        await self.sync()
+
+    async def apply_refreshed_posts(self, channel_id: str, posts: list[TiktokPost]):
+        """
+        Apply re-polled stats of known posts of the channel, so that only the
+        changed posts are synced. The scheduler has stored them already, and
+        re-evaluates them once for all sessions.
+        """
+        known = self._posts_by_channel_id.get(channel_id)
+        if channel_id not in self._channels_by_id or known is None:
+            return
+        refreshed = {post.id: post for post in posts if post.id in self._posts_by_id}
+        if not refreshed:
+            return
+        self._merge_posts(
+            channel_id,
+            [refreshed.get(post.id, post) for post in known],
+            persist=False,
         )
+        self._update_window()
+        await self.sync()
+
+    async def apply_evaluation(self, post_id: str, evaluation: TiktokPostEvaluation):
+        """Apply an evaluation made outside of the session, if it shows the post"""
+        if post_id not in self._posts_by_id:
+            return
+        self._post_evaluations[post_id] = evaluation
+        self._update_window()
+        await self.sync()
+
+    async def _backfill_channel(self, channel: TiktokChannel, max_posts: int) -> int:
+        """Page through the older posts of the channel, returns the number of new ones"""
+        cursor = store.video_cursor(channel.id)
+        if cursor is None:
+            return 0
+        paging = VideoPaging(
+            max_count=max_posts, cursor=cursor, pages_per_batch=BACKFILL_PAGES_PER_BATCH
+        )
+        num_new = 0
+        pages = tiktok_service.get_user_video_pages(channel.handle, paging)
+        async with aclosing(pages):
+            async for page in pages:
+                if channel.id not in self._channels_by_id:
+                    break  # removed meanwhile, so it mustn't be saved again
+                page_posts = [localize_post(post) for post in page.posts]
+                known = self._posts_by_channel_id.get(channel.id, [])
+                fetched = {post.id: post for post in page_posts}
+                new_posts = [
+                    post for post in page_posts if post.id not in self._posts_by_id
+                ]
+                # older posts go after the known ones, which keep their order
+                posts = [fetched.get(post.id, post) for post in known] + new_posts
+                self._merge_posts(channel.id, posts)
+                store.save_video_cursor(channel.id, page.cursor)
+                if posts_cache.peek(channel.handle) is not None:
+                    # or the next fetch would merge the cached posts without these
+                    posts_cache.set(channel.handle, posts)
+                num_new += len(new_posts)
+
+                self._evaluate_in_background(
+                    channel,
+                    [
+                        post
+                        for post in new_posts
+                        if needs_evaluation(post, self._post_evaluations.get(post.id))
+                    ],
+                )
+                self._update_window()
+                await self.sync(if_since_last=1 / 60)
+        return num_new
+
+    # ===== indexes ===== #
+    def get_channel(self, channel_id: str) -> TiktokChannel:
+        return self._channels_by_id[channel_id]
+
+    def get_channel_posts(self, channel_id: str) -> list[TiktokPost]:
+        return self._posts_by_channel_id.get(channel_id, [])
+
+    def get_post(self, post_id: str) -> TiktokPost:
+        return self._posts_by_id[post_id]
+
+    def get_post_channel(self, post_id: str) -> TiktokChannel:
+        """Reverse lookup of the channel that owns the post"""
+        return self._channels_by_id[self._channel_id_by_post_id[post_id]]
+
+    def _reindex(self):
+        self._channels_by_id = {channel.id: channel for channel in self.channels}
+        self._reindex_channel_positions()
+        self._posts_by_id = {}
+        self._channel_id_by_post_id = {}
+        for channel_id, posts in self._posts_by_channel_id.items():
+            self._index_posts(channel_id, posts)
+
+    def _index_posts(self, channel_id: str, posts: list[TiktokPost]):
+        for post in posts:
+            self._posts_by_id[post.id] = post
+            self._channel_id_by_post_id[post.id] = channel_id
+
+    def _reindex_channel_positions(self):
+        self._channel_positions = {
+            channel.id: i for i, channel in enumerate(self.channels)
+        }
+
+    def _channel_sort_key(self, channel: TiktokChannel) -> int:
+        return self._channel_order.get(channel.id, len(self._tracked_users))
+
+    def _set_channel_order(self, channel_id: str, order: int):
+        """Set the tracked position of the channel, and move it there"""
+        if self._channel_order.get(channel_id) == order:
+            return
+        self._channel_order[channel_id] = order
+        position = self._channel_positions.get(channel_id)
+        if position is not None:
+            channel = self.channels.pop(position)
+            bisect.insort(self.channels, channel, key=self._channel_sort_key)
+            self._reindex_channel_positions()
+
+    def _merge_channel(self, channel: TiktokChannel, persist: bool = True):
+        """
+        Replace the channel only if it changed, keeping the tracked order. Without
+        `persist`, the change isn't stored, as someone else stores it.
+        """
+        position = self._channel_positions.get(channel.id)
+        if position is not None:
+            if self.channels[position] != channel:
+                self.channels[position] = channel
+                self._channels_by_id[channel.id] = channel
+                if persist:
+                    store.save_channel(channel)
+            return
+        # the channels are kept sorted, so a new one is inserted in place
+        bisect.insort(self.channels, channel, key=self._channel_sort_key)
+        self._channels_by_id[channel.id] = channel
+        self._reindex_channel_positions()
+        if persist:
+            store.save_channel(channel)
+
+    def _merge_posts(
+        self, channel_id: str, posts: list[TiktokPost], persist: bool = True
+    ):
+        """
+        Take the order of the fetched posts, but keep the unchanged post objects.
+        Without `persist`, the changed posts aren't stored, as someone else stores
+        them.
+        """
+        merged = []
+        changed = []
+        for post in posts:
+            known = self._posts_by_id.get(post.id)
+            if known == post:
+                merged.append(known)
+            else:
+                merged.append(post)
+                changed.append(post)
+        self._posts_by_channel_id[channel_id] = merged
+        self._drop_sorted_posts(channel_id)
+        self._index_posts(channel_id, changed)
+        if persist:
+            store.save_posts(channel_id, changed)
+
+    def _remove_channel(self, channel_id: str):
+        channel = self._channels_by_id.pop(channel_id)
+        self.channels.remove(channel)
+        self._reindex_channel_positions()
+        for post in self._posts_by_channel_id.pop(channel_id, []):
+            self._posts_by_id.pop(post.id, None)
+            self._channel_id_by_post_id.pop(post.id, None)
+        self._drop_sorted_posts(channel_id)
+        store.delete_channel(channel_id)
+
+    # ===== windowed view ===== #
+    def _sorted_channel_posts(self, channel_id: str) -> list[TiktokPost]:
+        window = self.post_window
+        cache_key = (channel_id, window.sort_by, window.descending)
+        if cache_key not in self._sorted_posts:
+            self._sorted_posts[cache_key] = sorted(
+                self._posts_by_channel_id.get(channel_id, []),
+                key=POST_SORT_KEYS[window.sort_by],
+                reverse=window.descending,
+            )
+        return self._sorted_posts[cache_key]
+
+    def _drop_sorted_posts(self, channel_id: str):
+        for cache_key in [key for key in self._sorted_posts if key[0] == channel_id]:
+            del self._sorted_posts[cache_key]
+
+    def _update_window(self):
+        """Recompute the synced slice from the full data, call before syncing"""
+        window = self.post_window
+        if window.channel_id is not None:
+            channel_ids = [window.channel_id]
+        else:
+            channel_ids = [channel.id for channel in self.channels]
+
+        start = window.page * window.page_size
+        self.posts_by_channel_id = {
+            channel_id: self._sorted_channel_posts(channel_id)[
+                start : start + window.page_size
+            ]
+            for channel_id in channel_ids
+        }
+        visible_post_ids = [
+            post.id for posts in self.posts_by_channel_id.values() for post in posts
+        ]
+        self.post_evaluations = {
+            post_id: self._post_evaluations[post_id]
+            for post_id in visible_post_ids
+            if post_id in self._post_evaluations
+        }
+        self.post_payouts = {
+            post_id: self._post_payouts[post_id]
+            for post_id in visible_post_ids
+            if post_id in self._post_payouts
+        }
+        self.post_counts_by_channel_id = {
+            channel.id: len(self._posts_by_channel_id.get(channel.id, []))
+            for channel in self.channels
+        }
+
+    def _evaluate_in_background(self, channel: TiktokChannel, posts: list[TiktokPost]):
+        """Evaluate the posts without blocking the fetch, results are synced as they arrive"""
+
+        async def evaluate(post: TiktokPost):
+            try:
+                evaluation = await evaluation_engine.evaluate(channel, post)
+                self._post_evaluations[post.id] = evaluation
+                store.save_evaluation(post.id, evaluation)
+                self._update_window()
+            except Exception:
+                logger.exception(f"Failed to evaluate post {post.id}")
+            self._tasks_evaluate.discard(asyncio.current_task())
+            # throttled, except after the last one, so no result is left unsynced
+            await self.sync(if_since_last=1 / 10 if self._tasks_evaluate else None)
+
+        for post in posts:
+            task = asyncio.create_task(evaluate(post))
+            task.add_done_callback(_log_task_exception)
+            task.add_done_callback(self._tasks_evaluate.discard)
+            self._tasks_evaluate.add(task)
 
     @remote_action
     async def add_channel(self, channel: TiktokChannel):
-        self.channels.append(channel)
+        self._merge_channel(channel)
+        self._update_window()
         await self.sync(toast="Channel added")
 
     @remote_action
-    async def evaluate_and_pay_for_post(self, channel_id: str, post_id: str):
+    async def remove_channel(self, channel_id: str):
+        if channel_id not in self._channels_by_id:
+            await self.sync(toast=f"Channel {channel_id} doesn't exist")
+            return
+        self._remove_channel(channel_id)
+        self._update_window()
+        await self.sync(toast="Channel removed")
+
+    @remote_action
+    async def backfill_channel(
+        self, channel_id: str, max_posts: int = BACKFILL_MAX_POSTS
+    ):
+        """
+        Fetch older posts of the channel than the newest ones fetched on connect,
+        resuming from where its last backfill stopped (also across restarts)
+        """
+        channel = self.get_channel(channel_id)
+        if channel_id in self._backfilling_channel_ids:
+            await self.sync(toast=f"Already fetching older posts of {channel.nickname}")
+            return
+        self._backfilling_channel_ids.add(channel_id)
         try:
-            channel = next(
-                channel for channel in self.channels if channel.id == channel_id
-            )
-            post = next(
-                post
-                for post in self.posts_by_channel_id[channel_id]
-                if post.id == post_id
-            )
-            post_evaluation = self.post_evaluations[post_id]
-
-            final_payout = await PayoutAgentService.evaluate_and_pay_for_post(
-                creator_channel=channel,
-                post=post,
-                post_evaluation=post_evaluation,
-                chat_between_agent_and_creator=ChatBetweenAgentAndCreator(
-                    chat_history=[
-                        ChatMessage(
-                            role="creator",
-                            content="Hi I've just created my post, and I'm proud of the quality of the content",
-                            timestamp=datetime.now(),
-                        )
-                    ]
-                ),
-                destination_wallet_address="0x063c106d59a9b7aff602e7f1df600a9e10ba15de",
-                max_budget=4,
-            )
-            if not self.post_payouts.get(post_id):
-                self.post_payouts[post_id] = []
-            self.post_payouts[post_id].append(final_payout)
+            num_new = await self._backfill_channel(channel, max_posts)
+        finally:
+            self._backfilling_channel_ids.discard(channel_id)
+        await self.sync(toast=f"Fetched {num_new} older posts of {channel.nickname}")
+
+    @remote_action
+    async def set_post_window(self, window: PostWindow):
+        """Subscribe to another channel/page/sort order of posts"""
+        self.post_window = window
+        self._update_window()
+        await self.sync()
+
+    @remote_action
+    async def query_analytics(
+        self,
+        rank_by: RankingMetric = "view_velocity",
+        limit: int = 20,
+        channel_id: str | None = None,
+    ):
+        if not 0 < limit <= MAX_ANALYTICS_LIMIT:
             await self.sync(
-                toast=f"Payout completed: {final_payout.determined_final_payout} USDC"
+                toast=f"The limit must be between 1 and {MAX_ANALYTICS_LIMIT}"
             )
-        except Exception as e:
-            logger.exception(f"Error evaluating and paying for post {post_id}: {e}")
+            return
+        self.analytics = post_stats.query(rank_by, limit=limit, channel_id=channel_id)
+        await self.sync()
+
+    @remote_action
+    async def evaluate_and_pay_for_post(self, channel_id: str, post_id: str):
+        """
+        Queue a payout for the post as a job of its own, like the bulk payouts, so
+        it's paid at most once. Its progress is streamed into `payout_progress`.
+        """
+        try:
+            channel = self.get_channel(channel_id)
+            post = self.get_post(post_id)
+            post_evaluation = self._post_evaluations[post_id]
+        except KeyError as e:
+            await self.sync(toast=f"Can't pay for post {post_id}, unknown {e}")
+            return
+        if self._channel_id_by_post_id.get(post_id) != channel_id:
             await self.sync(
-                toast=f"Error evaluating and paying for post {post_id}: {e}"
+                toast=f"Post {post_id} doesn't belong to channel {channel_id}"
+            )
+            return
+
+        async def on_progress(progress: PayoutProgress):
+            self.payout_progress[post_id] = progress
+            # the final stage is synced with the job's final status
+            if progress.stage not in ("paid", "failed"):
+                await self.sync(if_since_last=PAYOUT_PROGRESS_SYNC_INTERVAL)
+
+        job = payout_queue.enqueue(
+            creator_channel=channel,
+            post=post,
+            post_evaluation=post_evaluation,
+            chat_between_agent_and_creator=_initial_chat(),
+            destination_wallet_address=DESTINATION_WALLET_ADDRESS,
+            max_budget_per_post=MAX_BUDGET_PER_POST,
+            budget=PayoutBudget(MAX_BUDGET_PER_POST),
+            on_update=self._on_payout_job_update,
+            on_progress=on_progress,
+        )
+        if job is None:
+            status = payout_queue.jobs[post_id].status
+            await self.sync(toast=f"Post {post_id} already has a {status} payout")
+            return
+        self.payout_jobs[post_id] = job
+        await self.sync()
+
+    @remote_action
+    async def pay_all_eligible_posts(self, max_budget: float):
+        """
+        Queue payouts for all evaluated posts that were never paid, sharing
+        `max_budget` (in USDC) between them. Posts the pricing rules price at
+        nothing are skipped without asking the agent.
+        """
+        budget = PayoutBudget(max_budget)
+        num_queued = 0
+        for channel in self.channels:
+            posts = [
+                post
+                for post in self._posts_by_channel_id.get(channel.id, [])
+                if payout_queue.is_eligible(post.id)
+                and post.id in self._post_evaluations
+            ]
+            _, base_payouts = price_posts(
+                posts, [self._post_evaluations[post.id] for post in posts]
             )
+            for post, base_payout in zip(posts, base_payouts):
+                if base_payout < MIN_PAYOUT_BUDGET:
+                    continue
+                job = payout_queue.enqueue(
+                    creator_channel=channel,
+                    post=post,
+                    post_evaluation=self._post_evaluations[post.id],
+                    chat_between_agent_and_creator=_initial_chat(),
+                    destination_wallet_address=DESTINATION_WALLET_ADDRESS,
+                    max_budget_per_post=MAX_BUDGET_PER_POST,
+                    budget=budget,
+                    on_update=self._on_payout_job_update,
+                )
+                if job is not None:
+                    self.payout_jobs[post.id] = job
+                    num_queued += 1
+        await self.sync(toast=f"Queued {num_queued} payouts")
+
+    async def _on_payout_job_update(self, job: PayoutJob, payout: Payout | None):
+        self.payout_jobs[job.post_id] = job
+        if payout is not None:
+            self._post_payouts.setdefault(job.post_id, []).append(payout)
+            self._update_window()
+
+        if job.status in ("queued", "running"):
+            await self.sync(if_since_last=0.1)
+        elif self.payout_progress.pop(job.post_id, None) is not None:
+            # a single payout, replaced by the payout or the error
+            await self.sync(toast=_payout_job_toast(job))
+        else:
+            await self.sync()
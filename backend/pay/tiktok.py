@@ -1,13 +1,43 @@
+import itertools
 import os
+from contextlib import aclosing
+from dataclasses import dataclass
 from datetime import datetime
-from typing import AsyncIterator
-
-from TikTokApi import TikTokApi
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable
 
+from pay import config, metrics
+from pay.cache import AsyncTTLCache
 from pay.model import Model
+from pay.rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from TikTokApi.api.video import Video
+
+    from pay.tiktok_pool import TiktokSessionPool
+
+NUM_SESSIONS = int(os.getenv("TIKTOK_NUM_SESSIONS", "0"))
+"""Number of browser sessions in the scraping pool, 0 for one per ms_token"""
+HEADLESS = os.getenv("TIKTOK_HEADLESS", "true").lower() != "false"
 
-ms_token = os.environ.get("ms_token", "")
-assert ms_token, "ms_token is not set"
+CACHE_TTL = float(os.getenv("TIKTOK_CACHE_TTL", "300"))
+"""Seconds until cached TikTok data is considered stale and re-scraped"""
+CACHE_MAX_SIZE = int(os.getenv("TIKTOK_CACHE_MAX_SIZE", "1000"))
+"""Max number of usernames kept in each TikTok data cache"""
+VIDEOS_PAGE_SIZE = 30
+"""Number of videos TikTok returns per request"""
+VIDEOS_URL = "https://www.tiktok.com/api/post/item_list/"
+MAX_VIDEOS = int(os.getenv("TIKTOK_MAX_VIDEOS", "30")) or None
+"""Default max number of posts fetched per user, 0 for all"""
+SCRAPE_RATE = float(os.getenv("TIKTOK_SCRAPE_RATE", "0.5"))
+"""Average number of TikTok requests per second, across the whole process"""
+SCRAPE_BURST = float(os.getenv("TIKTOK_SCRAPE_BURST", "10"))
+"""Max number of TikTok requests in a burst"""
+
+TakeToken = Callable[[str], Awaitable[None]]
+"""
+Awaited with the operation right before each TikTok request, to take a token of
+`scrape_budget`
+"""
 
 
 #  ========= user/channel stats ========= #
@@ -68,27 +98,73 @@ class TiktokPost(Model):
     """Post aggregated stats"""
 
 
+@dataclass(frozen=True)
+class VideoPaging:
+    """Where to start and stop paging through the videos of a user, newest first"""
+
+    max_count: int | None = MAX_VIDEOS
+    """Max number of posts, None for all"""
+    since: datetime | None = None
+    """Stop at the first post older than this, pinned posts aside"""
+    since_post_id: str | None = None
+    """Stop at this post, exclusive"""
+    cursor: int = 0
+    """Start from the cursor of a previous page, 0 for the newest posts"""
+    pages_per_batch: int = 1
+    """Number of TikTok pages per yielded page"""
+
+    def stops_at(self, post: TiktokPost, pinned: bool) -> bool:
+        if post.id == self.since_post_id:
+            return True
+        return self.since is not None and not pinned and post.date_posted < self.since
+
+
+@dataclass
+class TiktokVideoPage:
+    posts: list[TiktokPost]
+    cursor: int | None
+    """
+    Cursor to resume after these posts from, None if there are no more. A page cut
+    short by a stop condition has the cursor of its start, so resuming from it never
+    skips posts, but may repeat some.
+    """
+
+
 class TiktokService:
     def __init__(self):
-        self.api = TikTokApi()
+        self._pool: "TiktokSessionPool | None" = None
+
+    @property
+    def pool(self) -> "TiktokSessionPool":
+        """Built on first use, so importing this module doesn't load Playwright"""
+        if self._pool is None:
+            from pay.tiktok_pool import TiktokSessionPool
+
+            ms_tokens = config.ms_tokens()
+            self._pool = TiktokSessionPool(
+                ms_tokens=ms_tokens,
+                num_sessions=NUM_SESSIONS or len(ms_tokens),
+                headless=HEADLESS,
+                browser=os.getenv("TIKTOK_BROWSER", "chromium"),
+            )
+        return self._pool
 
     async def start(self):
-        await self.api.__aenter__()
-        await self.api.create_sessions(
-            ms_tokens=[ms_token],
-            num_sessions=1,
-            sleep_after=3,
-            browser=os.getenv("TIKTOK_BROWSER", "chromium"),
-            headless=False,
-        )
+        """Launch and warm up the browser sessions, called on app startup"""
+        await self.pool.start()
 
     async def end(self):
-        await self.api.__aexit__(None, None, None)
-        await self.api.close_sessions()
+        """Close the browser sessions, called on app shutdown"""
+        if self._pool is not None:
+            await self._pool.close()
 
-    async def get_user_info(self, username: str) -> TiktokChannel:
-        user = self.api.user(username)
-        user_data = (await user.info())["userInfo"]
+    async def get_user_info(
+        self, username: str, take_token: TakeToken | None = None
+    ) -> TiktokChannel:
+        await (take_token or spend_token)("user_info")
+        async with self.pool.checkout() as api:
+            with metrics.tiktok_request_seconds.time(operation="user_info"):
+                user_data = (await api.user(username).info())["userInfo"]
         return TiktokChannel(
             id=user_data["user"]["id"],
             nickname=user_data["user"]["nickname"],
@@ -103,23 +179,118 @@ class TiktokService:
             ),
         )
 
-    async def get_user_videos(self, username: str) -> AsyncIterator[TiktokPost]:
-        user = self.api.user(username)
-        async for video in user.videos(count=30):
-            v = video.as_dict
-            yield TiktokPost(
-                id=video.id or "",
-                date_posted=datetime.fromtimestamp(v["createTime"]),
-                description=v["desc"],
-                url=None,
-                dynamic_cover_url=v["video"].get("dynamicCover")
-                or v["video"].get("cover")
-                or "",
-                stats=TiktokPostStats(
-                    play_count=v["stats"]["playCount"],
-                    like_count=v["stats"]["diggCount"],
-                    comment_count=v["stats"]["commentCount"],
-                    share_count=v["stats"]["shareCount"],
-                    save_count=v["stats"]["collectCount"],
-                ),
-            )
+    async def get_user_video_pages(
+        self,
+        username: str,
+        paging: VideoPaging = VideoPaging(),
+        take_token: TakeToken | None = None,
+    ) -> AsyncIterator[TiktokVideoPage]:
+        """
+        Yield the videos of the user newest first, in batches of
+        `paging.pages_per_batch` TikTok pages, each with the cursor to resume from
+        """
+        take_token = take_token or spend_token
+        batch: list[TiktokPost] = []
+        count = 0
+        cursor = paging.cursor
+        await take_token("user_info")
+        async with self.pool.checkout() as api:
+            user = api.user(username)
+            with metrics.tiktok_request_seconds.time(operation="user_info"):
+                await user.info()  # resolves the secUid the videos are listed by
+            for num_pages in itertools.count(1):
+                await take_token("videos_page")
+                with metrics.tiktok_request_seconds.time(operation="videos_page"):
+                    resp = await api.make_request(
+                        url=VIDEOS_URL,
+                        params={
+                            "secUid": user.sec_uid,
+                            "count": VIDEOS_PAGE_SIZE,
+                            "cursor": cursor,
+                        },
+                    )
+                if resp is None:
+                    raise RuntimeError("TikTok returned an invalid response")
+
+                stopped = False
+                for item in resp.get("itemList", []):
+                    post = _post_from_video(api.video(data=item))
+                    if paging.stops_at(post, pinned=bool(item.get("isPinnedItem"))):
+                        stopped = True
+                        break
+                    batch.append(post)
+                    count += 1
+                    if paging.max_count is not None and count >= paging.max_count:
+                        stopped = True
+                        break
+
+                if stopped:
+                    # resume from the start of the page, so no post is skipped
+                    yield TiktokVideoPage(posts=batch, cursor=cursor)
+                    return
+                if not resp.get("hasMore", False):
+                    yield TiktokVideoPage(posts=batch, cursor=None)
+                    return
+                cursor = int(resp["cursor"])
+                if num_pages % paging.pages_per_batch == 0:
+                    yield TiktokVideoPage(posts=batch, cursor=cursor)
+                    batch = []
+
+    async def get_user_videos(
+        self,
+        username: str,
+        paging: VideoPaging = VideoPaging(),
+        take_token: TakeToken | None = None,
+    ) -> AsyncIterator[TiktokPost]:
+        """The posts of `get_user_video_pages`, one at a time"""
+        pages = self.get_user_video_pages(username, paging, take_token)
+        async with aclosing(pages):
+            async for page in pages:
+                for post in page.posts:
+                    yield post
+
+
+def _post_from_video(video: "Video") -> TiktokPost:
+    v = video.as_dict
+    return TiktokPost(
+        id=video.id or "",
+        date_posted=datetime.fromtimestamp(v["createTime"]),
+        description=v["desc"],
+        url=None,
+        dynamic_cover_url=v["video"].get("dynamicCover")
+        or v["video"].get("cover")
+        or "",
+        stats=TiktokPostStats(
+            play_count=v["stats"]["playCount"],
+            like_count=v["stats"]["diggCount"],
+            comment_count=v["stats"]["commentCount"],
+            share_count=v["stats"]["shareCount"],
+            save_count=v["stats"]["collectCount"],
+        ),
+    )
+
+
+# process-wide caches shared by all sessions, keyed by username
+channel_cache: AsyncTTLCache[str, TiktokChannel] = AsyncTTLCache(
+    ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE
+)
+posts_cache: AsyncTTLCache[str, list[TiktokPost]] = AsyncTTLCache(
+    ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE
+)
+
+scrape_budget = TokenBucket(rate=SCRAPE_RATE, capacity=SCRAPE_BURST)
+"""
+The process-wide TikTok request budget, one token per user info or page of videos,
+taken right before each request, also when it's made by a scrape worker process.
+Background polling waits for tokens, fetches for connected clients only spend them.
+"""
+
+
+async def spend_token(operation: str):
+    """Take a token without waiting, for the clients waiting on the request"""
+    scrape_budget.spend()
+
+
+async def wait_for_token(operation: str):
+    """Wait for a token, for background scraping"""
+    await scrape_budget.acquire()
@@ -0,0 +1,200 @@
+import asyncio
+import importlib
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from TikTokApi import TikTokApi
+from TikTokApi.exceptions import (
+    CaptchaException,
+    EmptyResponseException,
+    NotFoundException,
+)
+
+from pay import metrics
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_EXCEPTIONS = (CaptchaException, EmptyResponseException)
+"""Errors that mean TikTok is blocking the session, so it is replaced right away"""
+API_CLASS = os.getenv("TIKTOK_API_CLASS", "")
+"""Import path ("module:Class") of a TikTokApi replacement, e.g. a fake for benchmarks"""
+
+
+def _api_class() -> type[TikTokApi]:
+    if not API_CLASS:
+        return TikTokApi
+    module, name = API_CLASS.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+@dataclass
+class PoolSlot:
+    index: int
+    ms_token: str
+    api: TikTokApi | None = None
+    """The slot's own browser, so a dead one can be relaunched on its own"""
+    in_flight: int = 0
+    """Number of requests currently running on this slot"""
+    consecutive_failures: int = 0
+    healthy: bool = False
+    replacing: asyncio.Task[None] | None = None
+
+
+class TiktokSessionPool:
+    """
+    A pool of headless TikTok browser sessions, spread round-robin over the ms_tokens.
+
+    Requests check out the least loaded healthy session. Sessions that die or get
+    blocked are closed and relaunched in the background, while the remaining
+    sessions keep serving requests.
+    """
+
+    def __init__(
+        self,
+        ms_tokens: list[str],
+        num_sessions: int,
+        headless: bool = True,
+        browser: str = "chromium",
+        sleep_after: int = 3,
+        max_failures: int = 3,
+        health_check_interval: float = 60,
+    ):
+        assert ms_tokens, "at least one ms_token is required"
+        self.headless = headless
+        self.browser = browser
+        self.sleep_after = sleep_after
+        self.max_failures = max_failures
+        self.health_check_interval = health_check_interval
+        self.slots = [
+            PoolSlot(index=i, ms_token=ms_tokens[i % len(ms_tokens)])
+            for i in range(num_sessions)
+        ]
+        self._slot_available = asyncio.Condition()
+        self._task_health_check: asyncio.Task[None] | None = None
+
+    async def start(self):
+        results = await asyncio.gather(
+            *(self._launch(slot) for slot in self.slots), return_exceptions=True
+        )
+        for slot, result in zip(self.slots, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to launch TikTok session {slot.index}: {result}")
+                self._schedule_replacement(slot)
+        self._task_health_check = asyncio.create_task(self._health_check_loop())
+
+    async def close(self):
+        if self._task_health_check:
+            self._task_health_check.cancel()
+        for slot in self.slots:
+            if slot.replacing:
+                slot.replacing.cancel()
+        await asyncio.gather(*(self._shutdown(slot) for slot in self.slots))
+
+    @property
+    def num_healthy(self) -> int:
+        return sum(slot.healthy for slot in self.slots)
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[TikTokApi]:
+        """Use the least loaded healthy session for the duration of the block"""
+        slot = await self._acquire()
+        try:
+            yield slot.api
+        except NotFoundException:
+            slot.consecutive_failures = 0
+            raise
+        except Exception as e:
+            slot.consecutive_failures += 1
+            if (
+                isinstance(e, BLOCKED_EXCEPTIONS)
+                or slot.consecutive_failures >= self.max_failures
+                or not self._is_alive(slot)
+            ):
+                logger.warning(f"TikTok session {slot.index} is unhealthy: {e!r}")
+                self._schedule_replacement(slot)
+            raise
+        else:
+            slot.consecutive_failures = 0
+        finally:
+            slot.in_flight -= 1
+            async with self._slot_available:
+                self._slot_available.notify_all()
+
+    async def _acquire(self) -> PoolSlot:
+        async with self._slot_available:
+            await self._slot_available.wait_for(lambda: self.num_healthy > 0)
+            slot = min(
+                (slot for slot in self.slots if slot.healthy),
+                key=lambda slot: slot.in_flight,
+            )
+            slot.in_flight += 1
+            return slot
+
+    async def _launch(self, slot: PoolSlot):
+        api = _api_class()()
+        try:
+            await api.create_sessions(
+                ms_tokens=[slot.ms_token],
+                num_sessions=1,
+                sleep_after=self.sleep_after,
+                browser=self.browser,
+                headless=self.headless,
+            )
+        except Exception:
+            await api.close_sessions()
+            raise
+        slot.api = api
+        metrics.tiktok_browsers.inc()
+        slot.consecutive_failures = 0
+        slot.healthy = True
+        async with self._slot_available:
+            self._slot_available.notify_all()
+
+    async def _shutdown(self, slot: PoolSlot):
+        slot.healthy = False
+        api, slot.api = slot.api, None
+        if api is not None:
+            metrics.tiktok_browsers.dec()
+            try:
+                await api.close_sessions()
+            except Exception:
+                logger.exception(f"Error closing TikTok session {slot.index}")
+
+    def _schedule_replacement(self, slot: PoolSlot):
+        slot.healthy = False
+        if slot.replacing is None or slot.replacing.done():
+            slot.replacing = asyncio.create_task(self._replace(slot))
+
+    async def _replace(self, slot: PoolSlot):
+        # wait for requests still running on the old session, then relaunch it
+        while slot.in_flight > 0:
+            async with self._slot_available:
+                await self._slot_available.wait()
+        await self._shutdown(slot)
+
+        delay = 1.0
+        while True:
+            try:
+                await self._launch(slot)
+                logger.info(f"Replaced TikTok session {slot.index}")
+                return
+            except Exception as e:
+                logger.error(f"Failed to relaunch TikTok session {slot.index}: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def _is_alive(self, slot: PoolSlot) -> bool:
+        if slot.api is None or not slot.api.sessions:
+            return False
+        return all(not session.page.is_closed() for session in slot.api.sessions)
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for slot in self.slots:
+                if slot.healthy and not self._is_alive(slot):
+                    logger.warning(f"TikTok session {slot.index} died")
+                    self._schedule_replacement(slot)
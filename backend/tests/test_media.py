@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.responses import RedirectResponse
+
+from pay.media import MediaCache, media_key
+
+
+class FailingClient:
+    def __init__(self):
+        self.num_requests = 0
+
+    def stream(self, method: str, url: str):
+        self.num_requests += 1
+        raise RuntimeError("403 Forbidden")
+
+    async def aclose(self):
+        pass
+
+
+class MediaCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = MediaCache(directory.name, max_bytes=10)
+        self.sources: dict[str, tuple[str, bool]] = {}
+        patcher = patch("pay.media.store")
+        store = patcher.start()
+        self.addCleanup(patcher.stop)
+        store.media_source.side_effect = self.sources.get
+        store.save_media_source.side_effect = self.save_media_source
+
+    def save_media_source(self, key: str, url: str, thumbnail: bool):
+        self.sources[key] = (url, thumbnail)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+
+    async def test_failed_download_is_not_retried_by_every_request(self):
+        client = self.cache._client = FailingClient()
+        url = "https://example.com/cover.jpg?signature=1"
+        key = media_key(url)
+        self.cache.localize(url)
+
+        for _ in range(3):
+            response = await self.cache.response(key, False, None)
+            self.assertIsInstance(response, RedirectResponse)
+        self.assertEqual(client.num_requests, 1)
+
+        # a new signed URL is tried right away
+        self.cache.localize("https://example.com/cover.jpg?signature=2")
+        await self.cache.get(key)
+        self.assertEqual(client.num_requests, 2)
+
+    async def test_file_being_sent_is_not_evicted(self):
+        path = self.cache.directory / f"{'a' * 64}.jpg"
+        path.write_bytes(b"12345678")
+        self.cache.start()
+        key = "a" * 64
+        self.sources[key] = ("https://example.com/a.jpg", False)
+
+        response = await self.cache.response(key, False, None)
+        # a download finishing meanwhile pushes the cache over its max size
+        self.cache.size += 8
+        self.cache._evict()
+        self.assertTrue(path.exists())
+
+        response._release()
+        self.assertFalse(path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch
+
+from pay.sessions import SessionRegistry
+
+
+class FakeSession:
+    def __init__(self, connected: bool = True):
+        self.is_connected = connected
+        self.state = None
+
+    async def disconnect(self, message: str):
+        self.is_connected = False
+
+
+class FakeState:
+    pass
+
+
+class EvictOverCapacityTest(unittest.IsolatedAsyncioTestCase):
+    def registry(self, **connected: bool) -> SessionRegistry:
+        registry = SessionRegistry(max_live_sessions=len(connected))
+        for session_id, is_connected in connected.items():
+            registry.sessions[session_id] = FakeSession(is_connected)
+            registry.touch(session_id)
+        return registry
+
+    async def test_connecting_session_is_kept_when_the_others_are_connected(self):
+        registry = self.registry(a=True, b=True)
+        evicted = registry.sessions["a"]
+
+        with patch("pay.sessions.BackendState", FakeState):
+            session = await registry.get_or_create("c")
+
+        self.assertIsInstance(session.state, FakeState)
+        self.assertEqual(list(registry.sessions), ["b", "c"])
+        self.assertFalse(evicted.is_connected)
+
+    async def test_disconnected_session_is_evicted_first(self):
+        registry = self.registry(a=True, b=False)
+
+        with patch("pay.sessions.BackendState", FakeState):
+            await registry.get_or_create("c")
+
+        self.assertEqual(list(registry.sessions), ["a", "c"])
+
+    async def test_reconnecting_session_is_kept(self):
+        registry = self.registry(a=True, b=True)
+        registry.max_live_sessions = 1
+
+        session = registry.sessions["a"]
+        self.assertIs(await registry.get_or_create("a"), session)
+
+        self.assertEqual(list(registry.sessions), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+
+from pay.store import Store
+
+
+class StoreTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "pay.db")
+        self.store = Store(self.path)
+        self.store.load()
+
+    async def asyncTearDown(self):
+        await self.store.close()
+
+    async def test_cursor_and_media_source_are_read_while_being_written(self):
+        self.store.save_video_cursor("channel", 42)
+        self.store.save_media_source("key", "https://example.com/a.jpg", True)
+
+        with self.store._lock:  # as held by the writer thread during a flush
+            self.store._pending = type(self.store._pending)()
+            self.assertEqual(self.store.video_cursor("channel"), 42)
+            self.assertEqual(
+                self.store.media_source("key"), ("https://example.com/a.jpg", True)
+            )
+
+    async def test_cursor_and_media_source_are_loaded(self):
+        self.store.save_video_cursor("channel", None)
+        self.store.save_media_source("key", "https://example.com/a.jpg", False)
+        await self.store.close()
+
+        self.store = Store(self.path)
+        self.store.load()
+
+        self.assertIsNone(self.store.video_cursor("channel"))
+        self.assertEqual(self.store.video_cursor("other"), 0)
+        self.assertEqual(
+            self.store.media_source("key"), ("https://example.com/a.jpg", False)
+        )
+
+    async def test_deleted_channel_restarts_its_backfill(self):
+        self.store.save_video_cursor("channel", 42)
+        self.store.delete_channel("channel")
+
+        self.assertEqual(self.store.video_cursor("channel"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,7 +26,7 @@ import {
   YAxis,
 } from "recharts";
 import { toast } from "sonner";
-import { backend, useBackend } from "./synced-store";
+import { BACKEND_URL, backend, useBackend } from "./synced-store";
 
 const chartData = [
   { month: "Jan", views: 8.2, cost: 1.52 },
@@ -37,6 +37,14 @@ const chartData = [
   { month: "Jun", views: 22.2, cost: 1.42 },
 ];
 
+// media cached by the backend is linked relative to the backend
+const isCachedMedia = (url: string) => url.startsWith("/media/");
+const mediaUrl = (url: string) =>
+  isCachedMedia(url) ? `${BACKEND_URL}${url}` : url;
+// covers cached by the backend have a downscaled thumbnail for the post grid
+const thumbnailUrl = (url: string) =>
+  isCachedMedia(url) ? mediaUrl(`${url}/thumbnail`) : url;
+
 export default function App() {
   const [currentPage, setCurrentPage] = useState("home");
   const [selectedChannelId, setSelectedChannelId] = useState<string | null>(
@@ -47,6 +55,13 @@ export default function App() {
 
   console.log("Backend state:", state);
 
+  // the backend only syncs one page of posts, so moving the window pages them
+  const showChannelPosts = (channelId: string | null, page = 0) => {
+    backend.setPostWindow({
+      window: { ...state.postWindow, channel_id: channelId, page },
+    });
+  };
+
   const renderContent = () => {
     if (currentPage === "home") {
       return (
@@ -333,8 +348,7 @@ export default function App() {
         );
         const channelPosts = state.postsByChannelId[selectedChannelId] || [];
         const selectedPost = channelPosts.find((p) => p.id === selectedPostId);
-        // @ts-expect-error - postEvaluations will be available after type regeneration
-        const evaluation = state.postEvaluations?.[selectedPostId];
+        const evaluation = state.postEvaluations[selectedPostId];
 
         if (!selectedPost || !selectedChannel) {
           setSelectedPostId(null);
@@ -348,13 +362,17 @@ export default function App() {
         );
 
         // Get payout history for this post
-        // @ts-expect-error - using snake_case to match runtime data
-        const payouts = state.postPayouts?.[selectedPostId] || [];
+        const payouts = state.postPayouts[selectedPostId] || [];
         const latestPayout = payouts[0]; // Get the most recent payout
-        // @ts-expect-error - using snake_case to match runtime data
         const chatHistory =
           latestPayout?.chat_between_agent_and_creator?.chat_history || [];
 
+        // Payout job of this post and its live progress, while it's running
+        const payoutJob = state.payoutJobs[selectedPostId];
+        const payoutProgress = state.payoutProgress[selectedPostId];
+        const payoutPending =
+          payoutJob?.status === "queued" || payoutJob?.status === "running";
+
         return (
           <div className="flex flex-1 gap-6 p-8">
             {/* Main Content */}
@@ -362,7 +380,7 @@ export default function App() {
               {/* Post Header */}
               <div className="flex items-start gap-6 pb-6">
                 <img
-                  src={selectedPost.dynamic_cover_url}
+                  src={mediaUrl(selectedPost.dynamic_cover_url)}
                   alt="Post thumbnail"
                   className="w-64 h-80 rounded-xl object-cover"
                 />
@@ -442,7 +460,7 @@ export default function App() {
                         </p>
                         <p className="text-xl font-bold text-green-600">
                           $
-                          {latestPayout.determined_final_payout.toLocaleString(
+                          {latestPayout.determined_final_payout?.toLocaleString(
                             "en-US",
                             {
                               minimumFractionDigits: 2,
@@ -452,26 +470,68 @@ export default function App() {
                         </p>
                       </div>
                     ) : (
-                      <div className="rounded-lg border bg-card p-4 inline-block">
-                        <p className="text-sm text-muted-foreground mb-2">
-                          Ready to evaluate and process payment
+                      !payoutPending && (
+                        <div className="rounded-lg border bg-card p-4 inline-block">
+                          <p className="text-sm text-muted-foreground mb-2">
+                            Ready to evaluate and process payment
+                          </p>
+                          <Button
+                            onClick={() => {
+                              toast.info("Evaluating and processing payment...");
+                              backend.evaluateAndPayForPost({
+                                channelId: selectedChannelId,
+                                postId: selectedPostId,
+                              });
+                            }}
+                            size="lg"
+                            className="w-full text-black"
+                          >
+                            Determine Payout & Send Payment
+                          </Button>
+                        </div>
+                      )
+                    )}
+                    {payoutJob && (
+                      <div className="rounded-lg border bg-card p-4 inline-block max-w-sm">
+                        <p className="text-sm text-muted-foreground mb-1">
+                          Payout Job
                         </p>
-                        <Button
-                          onClick={() => {
-                            toast.info("Evaluating and processing payment...");
-                            backend.evaluateAndPayForPost({
-                              channelId: selectedChannelId,
-                              postId: selectedPostId,
-                            });
-                          }}
-                          size="lg"
-                          className="w-full text-black"
-                        >
-                          Determine Payout & Send Payment
-                        </Button>
+                        <p className="font-semibold capitalize">
+                          {payoutJob.status}
+                        </p>
+                        {payoutJob.error && (
+                          <p className="text-xs text-red-600 mt-1">
+                            {payoutJob.error}
+                          </p>
+                        )}
                       </div>
                     )}
                   </div>
+
+                  {/* Live Payout Progress */}
+                  {payoutPending && payoutProgress && (
+                    <div className="mt-4 rounded-lg border bg-card p-4 space-y-2 max-w-xl">
+                      <p className="text-sm font-medium capitalize">
+                        {payoutProgress.stage}...
+                      </p>
+                      {payoutProgress.message_to_creator && (
+                        <p className="text-sm text-muted-foreground whitespace-pre-wrap">
+                          {payoutProgress.message_to_creator}
+                        </p>
+                      )}
+                      {payoutProgress.tool_calls.map((call) => (
+                        <div
+                          key={call.id}
+                          className="flex justify-between text-xs"
+                        >
+                          <span className="font-mono">{call.name}</span>
+                          <span className="text-muted-foreground capitalize">
+                            {call.status}
+                          </span>
+                        </div>
+                      ))}
+                    </div>
+                  )}
                 </div>
               </div>
 
@@ -725,13 +785,16 @@ export default function App() {
 
         // Get posts for this specific channel
         const channelPosts = state.postsByChannelId[selectedChannelId] || [];
+        const postCount = state.postCountsByChannelId[selectedChannelId] ?? 0;
+        const { page, page_size: pageSize } = state.postWindow;
+        const pageCount = Math.max(1, Math.ceil(postCount / pageSize));
 
         return (
           <div className="flex flex-1 flex-col gap-6 p-8">
             {/* Channel Header */}
             <div className="flex items-start gap-6 pb-6 border-b">
               <img
-                src={selectedChannel.avatar_url}
+                src={mediaUrl(selectedChannel.avatar_url)}
                 alt={selectedChannel.nickname}
                 className="w-24 h-24 rounded-full object-cover"
               />
@@ -750,7 +813,12 @@ export default function App() {
 
             {/* Posts */}
             <div>
-              <h2 className="text-2xl font-bold mb-4">Posts</h2>
+              <h2 className="text-2xl font-bold mb-4">
+                Posts{" "}
+                <span className="text-base font-normal text-muted-foreground">
+                  ({postCount.toLocaleString()})
+                </span>
+              </h2>
               {channelPosts.length === 0 ? (
                 <p className="text-muted-foreground">No posts found.</p>
               ) : (
@@ -776,7 +844,7 @@ export default function App() {
                         {/* Cover Image */}
                         <div className="aspect-[4/5] bg-muted relative">
                           <img
-                            src={post.dynamic_cover_url}
+                            src={thumbnailUrl(post.dynamic_cover_url)}
                             alt="Post cover"
                             className="w-full h-full object-cover"
                           />
@@ -830,6 +898,11 @@ export default function App() {
                             <span>
                               {new Date(post.date_posted).toLocaleDateString()}
                             </span>
+                            {state.payoutJobs[post.id] && (
+                              <span className="capitalize">
+                                {state.payoutJobs[post.id].status}
+                              </span>
+                            )}
                             {post.url && (
                               <a
                                 href={post.url}
@@ -847,6 +920,40 @@ export default function App() {
                   })}
                 </div>
               )}
+
+              {/* Paging */}
+              <div className="flex items-center justify-between mt-6">
+                <Button
+                  variant="outline"
+                  disabled={page === 0}
+                  onClick={() => showChannelPosts(selectedChannelId, page - 1)}
+                >
+                  Previous
+                </Button>
+                <span className="text-sm text-muted-foreground">
+                  Page {page + 1} of {pageCount}
+                </span>
+                {page + 1 < pageCount ? (
+                  <Button
+                    variant="outline"
+                    onClick={() =>
+                      showChannelPosts(selectedChannelId, page + 1)
+                    }
+                  >
+                    Next
+                  </Button>
+                ) : (
+                  <Button
+                    variant="outline"
+                    onClick={() => {
+                      toast.info("Fetching older posts...");
+                      backend.backfillChannel({ channelId: selectedChannelId });
+                    }}
+                  >
+                    Fetch Older Posts
+                  </Button>
+                )}
+              </div>
             </div>
           </div>
         );
@@ -865,12 +972,15 @@ export default function App() {
                 return (
                   <div
                     key={creator.id}
-                    onClick={() => setSelectedChannelId(creator.id)}
+                    onClick={() => {
+                      setSelectedChannelId(creator.id);
+                      showChannelPosts(creator.id);
+                    }}
                     className="rounded-xl border bg-card p-6 hover:shadow-lg transition-shadow cursor-pointer"
                   >
                     <div className="flex items-start gap-4 mb-4">
                       <img
-                        src={creator.avatar_url}
+                        src={mediaUrl(creator.avatar_url)}
                         alt={creator.nickname}
                         className="w-16 h-16 rounded-full object-cover"
                       />
@@ -968,6 +1078,7 @@ export default function App() {
                       onClick={() => {
                         setSelectedChannelId(null);
                         setSelectedPostId(null);
+                        showChannelPosts(null);
                       }}
                       className="cursor-pointer"
                     >
@@ -993,7 +1104,10 @@ export default function App() {
                 <>
                   <BreadcrumbItem>
                     <BreadcrumbLink
-                      onClick={() => setSelectedChannelId(null)}
+                      onClick={() => {
+                        setSelectedChannelId(null);
+                        showChannelPosts(null);
+                      }}
                       className="cursor-pointer"
                     >
                       Creators
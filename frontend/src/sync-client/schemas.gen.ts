@@ -3,7 +3,7 @@
 export const BackendStateActionsKeysSchema = {
     description: 'Lists all action keys as enum values',
     type: 'string',
-    enum: ['add_channel', 'evaluate_and_pay_for_post'],
+    enum: ['add_channel', 'remove_channel', 'backfill_channel', 'set_post_window', 'query_analytics', 'evaluate_and_pay_for_post', 'pay_all_eligible_posts'],
     title: 'BackendStateActionsKeys'
 } as const;
 
@@ -13,11 +13,26 @@ export const BackendStateActionsParamsSchema = {
         add_channel: {
             '$ref': '#/components/schemas/BackendStateActionAddChannel'
         },
+        remove_channel: {
+            '$ref': '#/components/schemas/BackendStateActionRemoveChannel'
+        },
+        backfill_channel: {
+            '$ref': '#/components/schemas/BackendStateActionBackfillChannel'
+        },
+        set_post_window: {
+            '$ref': '#/components/schemas/BackendStateActionSetPostWindow'
+        },
+        query_analytics: {
+            '$ref': '#/components/schemas/BackendStateActionQueryAnalytics'
+        },
         evaluate_and_pay_for_post: {
             '$ref': '#/components/schemas/BackendStateActionEvaluateAndPayForPost'
+        },
+        pay_all_eligible_posts: {
+            '$ref': '#/components/schemas/BackendStateActionPayAllEligiblePosts'
         }
     },
-    required: ['add_channel', 'evaluate_and_pay_for_post'],
+    required: ['add_channel', 'remove_channel', 'backfill_channel', 'set_post_window', 'query_analytics', 'evaluate_and_pay_for_post', 'pay_all_eligible_posts'],
     title: 'BackendStateActionsParams',
     type: 'object'
 } as const;
@@ -47,6 +62,26 @@ export const BackendStateSchema = {
             title: 'Channels',
             type: 'array'
         },
+        postWindow: {
+            '$ref': '#/components/schemas/PostWindow',
+            default: {
+                channel_id: null,
+                page: 0,
+                page_size: 30,
+                sort_by: 'date_posted',
+                descending: true
+            },
+            description: 'The page of posts the client is currently showing'
+        },
+        postCountsByChannelId: {
+            additionalProperties: {
+                type: 'integer'
+            },
+            default: {},
+            description: 'Total number of posts by channel id',
+            title: 'Postcountsbychannelid',
+            type: 'object'
+        },
         postsByChannelId: {
             additionalProperties: {
                 items: {
@@ -55,6 +90,7 @@ export const BackendStateSchema = {
                 type: 'array'
             },
             default: {},
+            description: 'Posts in the current window, by channel id',
             title: 'Postsbychannelid',
             type: 'object'
         },
@@ -63,7 +99,7 @@ export const BackendStateSchema = {
                 '$ref': '#/components/schemas/TiktokPostEvaluation'
             },
             default: {},
-            description: 'Post evaluations by post id',
+            description: 'Post evaluations of the posts in the current window, by post id',
             title: 'Postevaluations',
             type: 'object'
         },
@@ -75,12 +111,39 @@ export const BackendStateSchema = {
                 type: 'array'
             },
             default: {},
-            description: 'Payout history by post id',
+            description: 'Payout history of the posts in the current window, by post id',
             title: 'Postpayouts',
             type: 'object'
+        },
+        payoutJobs: {
+            additionalProperties: {
+                '$ref': '#/components/schemas/PayoutJob'
+            },
+            default: {},
+            description: 'Payout jobs started from this session, by post id',
+            title: 'Payoutjobs',
+            type: 'object'
+        },
+        payoutProgress: {
+            additionalProperties: {
+                '$ref': '#/components/schemas/PayoutProgress'
+            },
+            default: {},
+            description: 'Live progress of the single payouts running in this session, by post id',
+            title: 'Payoutprogress',
+            type: 'object'
+        },
+        analytics: {
+            '$ref': '#/components/schemas/PostAnalytics',
+            default: {
+                channels: [],
+                ranked_by: null,
+                ranking: []
+            },
+            description: 'Result of the last analytics query, over the posts of all channels'
         }
     },
-    required: ['channels', 'postsByChannelId', 'postEvaluations', 'postPayouts'],
+    required: ['channels', 'postWindow', 'postCountsByChannelId', 'postsByChannelId', 'postEvaluations', 'postPayouts', 'payoutJobs', 'payoutProgress', 'analytics'],
     title: 'BackendState',
     type: 'object'
 } as const;
@@ -96,6 +159,23 @@ export const BackendStateActionAddChannelSchema = {
     type: 'object'
 } as const;
 
+export const BackendStateActionBackfillChannelSchema = {
+    properties: {
+        channelId: {
+            title: 'Channelid',
+            type: 'string'
+        },
+        maxPosts: {
+            default: 300,
+            title: 'Maxposts',
+            type: 'integer'
+        }
+    },
+    required: ['channelId'],
+    title: 'BackendStateActionBackfillChannel',
+    type: 'object'
+} as const;
+
 export const BackendStateActionEvaluateAndPayForPostSchema = {
     properties: {
         channelId: {
@@ -112,6 +192,148 @@ export const BackendStateActionEvaluateAndPayForPostSchema = {
     type: 'object'
 } as const;
 
+export const BackendStateActionPayAllEligiblePostsSchema = {
+    properties: {
+        maxBudget: {
+            title: 'Maxbudget',
+            type: 'number'
+        }
+    },
+    required: ['maxBudget'],
+    title: 'BackendStateActionPayAllEligiblePosts',
+    type: 'object'
+} as const;
+
+export const BackendStateActionQueryAnalyticsSchema = {
+    properties: {
+        rankBy: {
+            default: 'view_velocity',
+            enum: ['play_count', 'like_count', 'comment_count', 'share_count', 'save_count', 'engagement_rate', 'view_velocity', 'estimated_ctr', 'payout', 'cpm'],
+            title: 'Rankby',
+            type: 'string'
+        },
+        limit: {
+            default: 20,
+            title: 'Limit',
+            type: 'integer'
+        },
+        channelId: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            title: 'Channelid'
+        }
+    },
+    title: 'BackendStateActionQueryAnalytics',
+    type: 'object'
+} as const;
+
+export const BackendStateActionRemoveChannelSchema = {
+    properties: {
+        channelId: {
+            title: 'Channelid',
+            type: 'string'
+        }
+    },
+    required: ['channelId'],
+    title: 'BackendStateActionRemoveChannel',
+    type: 'object'
+} as const;
+
+export const BackendStateActionSetPostWindowSchema = {
+    properties: {
+        window: {
+            '$ref': '#/components/schemas/CreatePostWindow'
+        }
+    },
+    required: ['window'],
+    title: 'BackendStateActionSetPostWindow',
+    type: 'object'
+} as const;
+
+export const ChannelAnalyticsSchema = {
+    properties: {
+        channel_id: {
+            title: 'Channel Id',
+            type: 'string'
+        },
+        num_posts: {
+            title: 'Num Posts',
+            type: 'integer'
+        },
+        play_count: {
+            title: 'Play Count',
+            type: 'integer'
+        },
+        like_count: {
+            title: 'Like Count',
+            type: 'integer'
+        },
+        comment_count: {
+            title: 'Comment Count',
+            type: 'integer'
+        },
+        share_count: {
+            title: 'Share Count',
+            type: 'integer'
+        },
+        save_count: {
+            title: 'Save Count',
+            type: 'integer'
+        },
+        engagement_rate: {
+            anyOf: [
+                {
+                    type: 'number'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            description: '(likes + comments + shares + saves) / plays over all posts of the channel',
+            title: 'Engagement Rate'
+        },
+        mean_estimated_ctr: {
+            anyOf: [
+                {
+                    type: 'number'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            description: 'Mean estimated CTR of the evaluated posts, in percent',
+            title: 'Mean Estimated Ctr'
+        },
+        payout_total: {
+            description: 'Total paid for the channel\'s posts, in USDC',
+            title: 'Payout Total',
+            type: 'number'
+        },
+        cpm: {
+            anyOf: [
+                {
+                    type: 'number'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            description: 'Payouts per 1k plays implied by the paid posts, in USDC',
+            title: 'Cpm'
+        }
+    },
+    required: ['channel_id', 'num_posts', 'play_count', 'like_count', 'comment_count', 'share_count', 'save_count', 'engagement_rate', 'mean_estimated_ctr', 'payout_total', 'cpm'],
+    title: 'ChannelAnalytics',
+    type: 'object'
+} as const;
+
 export const ChatBetweenAgentAndCreatorSchema = {
     properties: {
         chat_history: {
@@ -153,6 +375,54 @@ export const ChatMessageSchema = {
     type: 'object'
 } as const;
 
+export const CreatePostWindowSchema = {
+    properties: {
+        channel_id: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'Channel whose posts are shown, or None for the first page(s) of every channel',
+            title: 'Channel Id'
+        },
+        page: {
+            default: 0,
+            description: 'Zero-based page index',
+            minimum: 0,
+            title: 'Page',
+            type: 'integer'
+        },
+        page_size: {
+            default: 30,
+            description: 'Number of posts per page',
+            exclusiveMinimum: 0,
+            maximum: 500,
+            title: 'Page Size',
+            type: 'integer'
+        },
+        sort_by: {
+            default: 'date_posted',
+            description: 'Post field to sort by',
+            enum: ['date_posted', 'play_count', 'like_count', 'comment_count', 'share_count'],
+            title: 'Sort By',
+            type: 'string'
+        },
+        descending: {
+            default: true,
+            description: 'Sort order',
+            title: 'Descending',
+            type: 'boolean'
+        }
+    },
+    title: 'PostWindow',
+    type: 'object'
+} as const;
+
 export const CreateTiktokChannelSchema = {
     properties: {
         id: {
@@ -312,6 +582,277 @@ export const PayoutSchema = {
     type: 'object'
 } as const;
 
+export const PayoutJobSchema = {
+    properties: {
+        post_id: {
+            description: 'The post to pay for, a post is paid at most once by a payout job',
+            title: 'Post Id',
+            type: 'string'
+        },
+        channel_id: {
+            description: 'The channel of the post',
+            title: 'Channel Id',
+            type: 'string'
+        },
+        status: {
+            default: 'queued',
+            description: 'Current status of the job. A failed job sent nothing, while an unconfirmed job\nmay have paid, and must be reconciled with the wallet before paying again',
+            enum: ['queued', 'running', 'paid', 'failed', 'skipped', 'unconfirmed'],
+            title: 'Status',
+            type: 'string'
+        },
+        reserved_budget: {
+            anyOf: [
+                {
+                    type: 'number'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'Budget reserved for this payout from the shared budget, in USDC',
+            title: 'Reserved Budget'
+        },
+        final_payout: {
+            anyOf: [
+                {
+                    type: 'number'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'The amount paid, in USDC',
+            title: 'Final Payout'
+        },
+        error: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'Why the job failed, was skipped or is unconfirmed',
+            title: 'Error'
+        },
+        date_created: {
+            description: 'Date enqueued',
+            format: 'date-time',
+            title: 'Date Created',
+            type: 'string'
+        },
+        date_updated: {
+            description: 'Date of the last status change',
+            format: 'date-time',
+            title: 'Date Updated',
+            type: 'string'
+        }
+    },
+    required: ['post_id', 'channel_id', 'status', 'reserved_budget', 'final_payout', 'error', 'date_created', 'date_updated'],
+    title: 'PayoutJob',
+    type: 'object'
+} as const;
+
+export const PayoutProgressSchema = {
+    properties: {
+        stage: {
+            default: 'deciding',
+            enum: ['deciding', 'paying', 'paid', 'failed'],
+            title: 'Stage',
+            type: 'string'
+        },
+        message_to_creator: {
+            default: '',
+            description: 'The message to the creator, partial while the agent is still writing it',
+            title: 'Message To Creator',
+            type: 'string'
+        },
+        result: {
+            anyOf: [
+                {
+                    '$ref': '#/components/schemas/PayoutResult'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'The agent\'s decision, once complete'
+        },
+        tool_calls: {
+            default: [],
+            description: 'MCP tool calls of the settlement batch the payment is sent in',
+            items: {
+                '$ref': '#/components/schemas/ToolCallProgress'
+            },
+            title: 'Tool Calls',
+            type: 'array'
+        },
+        error: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            title: 'Error'
+        }
+    },
+    required: ['stage', 'message_to_creator', 'result', 'tool_calls', 'error'],
+    title: 'PayoutProgress',
+    type: 'object'
+} as const;
+
+export const PayoutResultSchema = {
+    description: 'The agent\'s judgement on top of the base payout of the pricing rules',
+    properties: {
+        success: {
+            title: 'Success',
+            type: 'boolean'
+        },
+        determined_penalty: {
+            title: 'Determined Penalty',
+            type: 'number'
+        },
+        penalty_reason: {
+            title: 'Penalty Reason',
+            type: 'string'
+        },
+        determined_bonus: {
+            title: 'Determined Bonus',
+            type: 'number'
+        },
+        bonus_reason: {
+            title: 'Bonus Reason',
+            type: 'string'
+        },
+        message_to_creator: {
+            title: 'Message To Creator',
+            type: 'string'
+        }
+    },
+    required: ['success', 'determined_penalty', 'penalty_reason', 'determined_bonus', 'bonus_reason', 'message_to_creator'],
+    title: 'PayoutResult',
+    type: 'object'
+} as const;
+
+export const PostAnalyticsSchema = {
+    properties: {
+        channels: {
+            default: [],
+            description: 'Per-channel aggregates',
+            items: {
+                '$ref': '#/components/schemas/ChannelAnalytics'
+            },
+            title: 'Channels',
+            type: 'array'
+        },
+        ranked_by: {
+            anyOf: [
+                {
+                    enum: ['play_count', 'like_count', 'comment_count', 'share_count', 'save_count', 'engagement_rate', 'view_velocity', 'estimated_ctr', 'payout', 'cpm'],
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            title: 'Ranked By'
+        },
+        ranking: {
+            default: [],
+            description: 'Top posts by `ranked_by`',
+            items: {
+                '$ref': '#/components/schemas/RankedPost'
+            },
+            title: 'Ranking',
+            type: 'array'
+        }
+    },
+    required: ['channels', 'ranked_by', 'ranking'],
+    title: 'PostAnalytics',
+    type: 'object'
+} as const;
+
+export const PostWindowSchema = {
+    properties: {
+        channel_id: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'Channel whose posts are shown, or None for the first page(s) of every channel',
+            title: 'Channel Id'
+        },
+        page: {
+            default: 0,
+            description: 'Zero-based page index',
+            minimum: 0,
+            title: 'Page',
+            type: 'integer'
+        },
+        page_size: {
+            default: 30,
+            description: 'Number of posts per page',
+            exclusiveMinimum: 0,
+            maximum: 500,
+            title: 'Page Size',
+            type: 'integer'
+        },
+        sort_by: {
+            default: 'date_posted',
+            description: 'Post field to sort by',
+            enum: ['date_posted', 'play_count', 'like_count', 'comment_count', 'share_count'],
+            title: 'Sort By',
+            type: 'string'
+        },
+        descending: {
+            default: true,
+            description: 'Sort order',
+            title: 'Descending',
+            type: 'boolean'
+        }
+    },
+    required: ['channel_id', 'page', 'page_size', 'sort_by', 'descending'],
+    title: 'PostWindow',
+    type: 'object'
+} as const;
+
+export const RankedPostSchema = {
+    properties: {
+        post_id: {
+            title: 'Post Id',
+            type: 'string'
+        },
+        channel_id: {
+            title: 'Channel Id',
+            type: 'string'
+        },
+        value: {
+            description: 'Value of the ranking metric',
+            title: 'Value',
+            type: 'number'
+        }
+    },
+    required: ['post_id', 'channel_id', 'value'],
+    title: 'RankedPost',
+    type: 'object'
+} as const;
+
 export const TiktokChannelSchema = {
     properties: {
         id: {
@@ -503,9 +1044,22 @@ export const TiktokPostEvaluationSchema = {
             default: null,
             description: 'Evaluation',
             title: 'Evaluation Text'
+        },
+        content_hash: {
+            anyOf: [
+                {
+                    type: 'string'
+                },
+                {
+                    type: 'null'
+                }
+            ],
+            default: null,
+            description: 'Hash of the evaluated post content, see `evaluation_content_hash`',
+            title: 'Content Hash'
         }
     },
-    required: ['id', 'product_mentioned', 'prominence_of_product', 'target_group_fit', 'post_type', 'estimated_ctr', 'date_evaluated', 'evaluation_text'],
+    required: ['id', 'product_mentioned', 'prominence_of_product', 'target_group_fit', 'post_type', 'estimated_ctr', 'date_evaluated', 'evaluation_text', 'content_hash'],
     title: 'TiktokPostEvaluation',
     type: 'object'
 } as const;
@@ -566,3 +1120,26 @@ export const TiktokUserStatsSchema = {
     title: 'TiktokUserStats',
     type: 'object'
 } as const;
+
+export const ToolCallProgressSchema = {
+    properties: {
+        id: {
+            title: 'Id',
+            type: 'string'
+        },
+        name: {
+            description: 'Name of the MCP tool',
+            title: 'Name',
+            type: 'string'
+        },
+        status: {
+            default: 'running',
+            enum: ['running', 'completed', 'failed'],
+            title: 'Status',
+            type: 'string'
+        }
+    },
+    required: ['id', 'name', 'status'],
+    title: 'ToolCallProgress',
+    type: 'object'
+} as const;
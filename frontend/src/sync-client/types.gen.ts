@@ -11,7 +11,12 @@ export type ClientOptions = {
  */
 export const BackendStateActionsKeys = {
     addChannel: 'add_channel',
-    evaluateAndPayForPost: 'evaluate_and_pay_for_post'
+    removeChannel: 'remove_channel',
+    backfillChannel: 'backfill_channel',
+    setPostWindow: 'set_post_window',
+    queryAnalytics: 'query_analytics',
+    evaluateAndPayForPost: 'evaluate_and_pay_for_post',
+    payAllEligiblePosts: 'pay_all_eligible_posts'
 } as const;
 
 /**
@@ -28,7 +33,12 @@ export type BackendStateActionsKeys = typeof BackendStateActionsKeys[keyof typeo
  */
 export type BackendStateActionsParams = {
     add_channel: BackendStateActionAddChannel;
+    remove_channel: BackendStateActionRemoveChannel;
+    backfill_channel: BackendStateActionBackfillChannel;
+    set_post_window: BackendStateActionSetPostWindow;
+    query_analytics: BackendStateActionQueryAnalytics;
     evaluate_and_pay_for_post: BackendStateActionEvaluateAndPayForPost;
+    pay_all_eligible_posts: BackendStateActionPayAllEligiblePosts;
 };
 
 /**
@@ -62,8 +72,22 @@ export type BackendState = {
      * Channels
      */
     channels: Array<TiktokChannel>;
+    /**
+     * The page of posts the client is currently showing
+     */
+    postWindow: PostWindow;
+    /**
+     * Postcountsbychannelid
+     *
+     * Total number of posts by channel id
+     */
+    postCountsByChannelId: {
+        [key: string]: number;
+    };
     /**
      * Postsbychannelid
+     *
+     * Posts in the current window, by channel id
      */
     postsByChannelId: {
         [key: string]: Array<TiktokPost>;
@@ -71,7 +95,7 @@ export type BackendState = {
     /**
      * Postevaluations
      *
-     * Post evaluations by post id
+     * Post evaluations of the posts in the current window, by post id
      */
     postEvaluations: {
         [key: string]: TiktokPostEvaluation;
@@ -79,11 +103,31 @@ export type BackendState = {
     /**
      * Postpayouts
      *
-     * Payout history by post id
+     * Payout history of the posts in the current window, by post id
      */
     postPayouts: {
         [key: string]: Array<Payout>;
     };
+    /**
+     * Payoutjobs
+     *
+     * Payout jobs started from this session, by post id
+     */
+    payoutJobs: {
+        [key: string]: PayoutJob;
+    };
+    /**
+     * Payoutprogress
+     *
+     * Live progress of the single payouts running in this session, by post id
+     */
+    payoutProgress: {
+        [key: string]: PayoutProgress;
+    };
+    /**
+     * Result of the last analytics query, over the posts of all channels
+     */
+    analytics: PostAnalytics;
 };
 
 /**
@@ -93,6 +137,20 @@ export type BackendStateActionAddChannel = {
     channel: CreateTiktokChannel;
 };
 
+/**
+ * BackendStateActionBackfillChannel
+ */
+export type BackendStateActionBackfillChannel = {
+    /**
+     * Channelid
+     */
+    channelId: string;
+    /**
+     * Maxposts
+     */
+    maxPosts?: number;
+};
+
 /**
  * BackendStateActionEvaluateAndPayForPost
  */
@@ -107,6 +165,109 @@ export type BackendStateActionEvaluateAndPayForPost = {
     postId: string;
 };
 
+/**
+ * BackendStateActionPayAllEligiblePosts
+ */
+export type BackendStateActionPayAllEligiblePosts = {
+    /**
+     * Maxbudget
+     */
+    maxBudget: number;
+};
+
+/**
+ * BackendStateActionQueryAnalytics
+ */
+export type BackendStateActionQueryAnalytics = {
+    /**
+     * Rankby
+     */
+    rankBy?: 'play_count' | 'like_count' | 'comment_count' | 'share_count' | 'save_count' | 'engagement_rate' | 'view_velocity' | 'estimated_ctr' | 'payout' | 'cpm';
+    /**
+     * Limit
+     */
+    limit?: number;
+    /**
+     * Channelid
+     */
+    channelId?: string | null;
+};
+
+/**
+ * BackendStateActionRemoveChannel
+ */
+export type BackendStateActionRemoveChannel = {
+    /**
+     * Channelid
+     */
+    channelId: string;
+};
+
+/**
+ * BackendStateActionSetPostWindow
+ */
+export type BackendStateActionSetPostWindow = {
+    window: CreatePostWindow;
+};
+
+/**
+ * ChannelAnalytics
+ */
+export type ChannelAnalytics = {
+    /**
+     * Channel Id
+     */
+    channel_id: string;
+    /**
+     * Num Posts
+     */
+    num_posts: number;
+    /**
+     * Play Count
+     */
+    play_count: number;
+    /**
+     * Like Count
+     */
+    like_count: number;
+    /**
+     * Comment Count
+     */
+    comment_count: number;
+    /**
+     * Share Count
+     */
+    share_count: number;
+    /**
+     * Save Count
+     */
+    save_count: number;
+    /**
+     * Engagement Rate
+     *
+     * (likes + comments + shares + saves) / plays over all posts of the channel
+     */
+    engagement_rate: number | null;
+    /**
+     * Mean Estimated Ctr
+     *
+     * Mean estimated CTR of the evaluated posts, in percent
+     */
+    mean_estimated_ctr: number | null;
+    /**
+     * Payout Total
+     *
+     * Total paid for the channel's posts, in USDC
+     */
+    payout_total: number;
+    /**
+     * Cpm
+     *
+     * Payouts per 1k plays implied by the paid posts, in USDC
+     */
+    cpm: number | null;
+};
+
 /**
  * ChatBetweenAgentAndCreator
  */
@@ -141,6 +302,42 @@ export type ChatMessage = {
     timestamp: string;
 };
 
+/**
+ * PostWindow
+ */
+export type CreatePostWindow = {
+    /**
+     * Channel Id
+     *
+     * Channel whose posts are shown, or None for the first page(s) of every channel
+     */
+    channel_id?: string | null;
+    /**
+     * Page
+     *
+     * Zero-based page index
+     */
+    page?: number;
+    /**
+     * Page Size
+     *
+     * Number of posts per page
+     */
+    page_size?: number;
+    /**
+     * Sort By
+     *
+     * Post field to sort by
+     */
+    sort_by?: 'date_posted' | 'play_count' | 'like_count' | 'comment_count' | 'share_count';
+    /**
+     * Descending
+     *
+     * Sort order
+     */
+    descending?: boolean;
+};
+
 /**
  * TiktokChannel
  */
@@ -245,6 +442,201 @@ export type Payout = {
     date_paid: string;
 };
 
+/**
+ * PayoutJob
+ */
+export type PayoutJob = {
+    /**
+     * Post Id
+     *
+     * The post to pay for, a post is paid at most once by a payout job
+     */
+    post_id: string;
+    /**
+     * Channel Id
+     *
+     * The channel of the post
+     */
+    channel_id: string;
+    /**
+     * Status
+     *
+     * Current status of the job. A failed job sent nothing, while an unconfirmed job
+     * may have paid, and must be reconciled with the wallet before paying again
+     */
+    status: 'queued' | 'running' | 'paid' | 'failed' | 'skipped' | 'unconfirmed';
+    /**
+     * Reserved Budget
+     *
+     * Budget reserved for this payout from the shared budget, in USDC
+     */
+    reserved_budget: number | null;
+    /**
+     * Final Payout
+     *
+     * The amount paid, in USDC
+     */
+    final_payout: number | null;
+    /**
+     * Error
+     *
+     * Why the job failed, was skipped or is unconfirmed
+     */
+    error: string | null;
+    /**
+     * Date Created
+     *
+     * Date enqueued
+     */
+    date_created: string;
+    /**
+     * Date Updated
+     *
+     * Date of the last status change
+     */
+    date_updated: string;
+};
+
+/**
+ * PayoutProgress
+ */
+export type PayoutProgress = {
+    /**
+     * Stage
+     */
+    stage: 'deciding' | 'paying' | 'paid' | 'failed';
+    /**
+     * Message To Creator
+     *
+     * The message to the creator, partial while the agent is still writing it
+     */
+    message_to_creator: string;
+    /**
+     * The agent's decision, once complete
+     */
+    result: PayoutResult | null;
+    /**
+     * Tool Calls
+     *
+     * MCP tool calls of the settlement batch the payment is sent in
+     */
+    tool_calls: Array<ToolCallProgress>;
+    /**
+     * Error
+     */
+    error: string | null;
+};
+
+/**
+ * PayoutResult
+ *
+ * The agent's judgement on top of the base payout of the pricing rules
+ */
+export type PayoutResult = {
+    /**
+     * Success
+     */
+    success: boolean;
+    /**
+     * Determined Penalty
+     */
+    determined_penalty: number;
+    /**
+     * Penalty Reason
+     */
+    penalty_reason: string;
+    /**
+     * Determined Bonus
+     */
+    determined_bonus: number;
+    /**
+     * Bonus Reason
+     */
+    bonus_reason: string;
+    /**
+     * Message To Creator
+     */
+    message_to_creator: string;
+};
+
+/**
+ * PostAnalytics
+ */
+export type PostAnalytics = {
+    /**
+     * Channels
+     *
+     * Per-channel aggregates
+     */
+    channels: Array<ChannelAnalytics>;
+    /**
+     * Ranked By
+     */
+    ranked_by: 'play_count' | 'like_count' | 'comment_count' | 'share_count' | 'save_count' | 'engagement_rate' | 'view_velocity' | 'estimated_ctr' | 'payout' | 'cpm' | null;
+    /**
+     * Ranking
+     *
+     * Top posts by `ranked_by`
+     */
+    ranking: Array<RankedPost>;
+};
+
+/**
+ * PostWindow
+ */
+export type PostWindow = {
+    /**
+     * Channel Id
+     *
+     * Channel whose posts are shown, or None for the first page(s) of every channel
+     */
+    channel_id: string | null;
+    /**
+     * Page
+     *
+     * Zero-based page index
+     */
+    page: number;
+    /**
+     * Page Size
+     *
+     * Number of posts per page
+     */
+    page_size: number;
+    /**
+     * Sort By
+     *
+     * Post field to sort by
+     */
+    sort_by: 'date_posted' | 'play_count' | 'like_count' | 'comment_count' | 'share_count';
+    /**
+     * Descending
+     *
+     * Sort order
+     */
+    descending: boolean;
+};
+
+/**
+ * RankedPost
+ */
+export type RankedPost = {
+    /**
+     * Post Id
+     */
+    post_id: string;
+    /**
+     * Channel Id
+     */
+    channel_id: string;
+    /**
+     * Value
+     *
+     * Value of the ranking metric
+     */
+    value: number;
+};
+
 /**
  * TiktokChannel
  */
@@ -377,6 +769,12 @@ export type TiktokPostEvaluation = {
      * Evaluation
      */
     evaluation_text: string | null;
+    /**
+     * Content Hash
+     *
+     * Hash of the evaluated post content, see `evaluation_content_hash`
+     */
+    content_hash: string | null;
 };
 
 /**
@@ -436,3 +834,23 @@ export type TiktokUserStats = {
      */
     video_count: number;
 };
+
+/**
+ * ToolCallProgress
+ */
+export type ToolCallProgress = {
+    /**
+     * Id
+     */
+    id: string;
+    /**
+     * Name
+     *
+     * Name of the MCP tool
+     */
+    name: string;
+    /**
+     * Status
+     */
+    status: 'running' | 'completed' | 'failed';
+};
@@ -9,7 +9,12 @@ import { z } from 'zod';
  */
 export const zBackendStateActionsKeys = z.enum([
     'add_channel',
-    'evaluate_and_pay_for_post'
+    'remove_channel',
+    'backfill_channel',
+    'set_post_window',
+    'query_analytics',
+    'evaluate_and_pay_for_post',
+    'pay_all_eligible_posts'
 ]);
 
 /**
@@ -26,6 +31,14 @@ export const zBackendStateTasksKeys = z.unknown();
  */
 export const zBackendStateTasksParams = z.record(z.string(), z.unknown());
 
+/**
+ * BackendStateActionBackfillChannel
+ */
+export const zBackendStateActionBackfillChannel = z.object({
+    channelId: z.string(),
+    maxPosts: z.optional(z.int()).default(300)
+});
+
 /**
  * BackendStateActionEvaluateAndPayForPost
  */
@@ -34,6 +47,69 @@ export const zBackendStateActionEvaluateAndPayForPost = z.object({
     postId: z.string()
 });
 
+/**
+ * BackendStateActionPayAllEligiblePosts
+ */
+export const zBackendStateActionPayAllEligiblePosts = z.object({
+    maxBudget: z.number()
+});
+
+/**
+ * BackendStateActionQueryAnalytics
+ */
+export const zBackendStateActionQueryAnalytics = z.object({
+    rankBy: z.optional(z.enum([
+        'play_count',
+        'like_count',
+        'comment_count',
+        'share_count',
+        'save_count',
+        'engagement_rate',
+        'view_velocity',
+        'estimated_ctr',
+        'payout',
+        'cpm'
+    ])).default('view_velocity'),
+    limit: z.optional(z.int()).default(20),
+    channelId: z.optional(z.union([
+        z.string(),
+        z.null()
+    ])).default(null)
+});
+
+/**
+ * BackendStateActionRemoveChannel
+ */
+export const zBackendStateActionRemoveChannel = z.object({
+    channelId: z.string()
+});
+
+/**
+ * ChannelAnalytics
+ */
+export const zChannelAnalytics = z.object({
+    channel_id: z.string(),
+    num_posts: z.int(),
+    play_count: z.int(),
+    like_count: z.int(),
+    comment_count: z.int(),
+    share_count: z.int(),
+    save_count: z.int(),
+    engagement_rate: z.union([
+        z.number(),
+        z.null()
+    ]),
+    mean_estimated_ctr: z.union([
+        z.number(),
+        z.null()
+    ]),
+    payout_total: z.number(),
+    cpm: z.union([
+        z.number(),
+        z.null()
+    ])
+});
+
 /**
  * ChatMessage
  */
@@ -53,6 +129,33 @@ export const zChatBetweenAgentAndCreator = z.object({
     chat_history: z.array(zChatMessage).default([])
 });
 
+/**
+ * PostWindow
+ */
+export const zCreatePostWindow = z.object({
+    channel_id: z.optional(z.union([
+        z.string(),
+        z.null()
+    ])).default(null),
+    page: z.optional(z.int().gte(0)).default(0),
+    page_size: z.optional(z.int().gt(0).lte(500)).default(30),
+    sort_by: z.optional(z.enum([
+        'date_posted',
+        'play_count',
+        'like_count',
+        'comment_count',
+        'share_count'
+    ])).default('date_posted'),
+    descending: z.optional(z.boolean()).default(true)
+});
+
+/**
+ * BackendStateActionSetPostWindow
+ */
+export const zBackendStateActionSetPostWindow = z.object({
+    window: zCreatePostWindow
+});
+
 /**
  * Payout
  */
@@ -93,6 +196,102 @@ export const zPayout = z.object({
     date_paid: z.iso.datetime()
 });
 
+/**
+ * PayoutJob
+ */
+export const zPayoutJob = z.object({
+    post_id: z.string(),
+    channel_id: z.string(),
+    status: z.enum([
+        'queued',
+        'running',
+        'paid',
+        'failed',
+        'skipped',
+        'unconfirmed'
+    ]).default('queued'),
+    reserved_budget: z.union([
+        z.number(),
+        z.null()
+    ]).default(null),
+    final_payout: z.union([
+        z.number(),
+        z.null()
+    ]).default(null),
+    error: z.union([
+        z.string(),
+        z.null()
+    ]).default(null),
+    date_created: z.iso.datetime(),
+    date_updated: z.iso.datetime()
+});
+
+/**
+ * PayoutResult
+ *
+ * The agent's judgement on top of the base payout of the pricing rules
+ */
+export const zPayoutResult = z.object({
+    success: z.boolean(),
+    determined_penalty: z.number(),
+    penalty_reason: z.string(),
+    determined_bonus: z.number(),
+    bonus_reason: z.string(),
+    message_to_creator: z.string()
+});
+
+/**
+ * PostWindow
+ */
+export const zPostWindow = z.object({
+    channel_id: z.union([
+        z.string(),
+        z.null()
+    ]).default(null),
+    page: z.int().gte(0).default(0),
+    page_size: z.int().gt(0).lte(500).default(30),
+    sort_by: z.enum([
+        'date_posted',
+        'play_count',
+        'like_count',
+        'comment_count',
+        'share_count'
+    ]).default('date_posted'),
+    descending: z.boolean().default(true)
+});
+
+/**
+ * RankedPost
+ */
+export const zRankedPost = z.object({
+    post_id: z.string(),
+    channel_id: z.string(),
+    value: z.number()
+});
+
+/**
+ * PostAnalytics
+ */
+export const zPostAnalytics = z.object({
+    channels: z.array(zChannelAnalytics).default([]),
+    ranked_by: z.union([
+        z.enum([
+            'play_count',
+            'like_count',
+            'comment_count',
+            'share_count',
+            'save_count',
+            'engagement_rate',
+            'view_velocity',
+            'estimated_ctr',
+            'payout',
+            'cpm'
+        ]),
+        z.null()
+    ]).default(null),
+    ranking: z.array(zRankedPost).default([])
+});
+
 /**
  * TiktokPostEvaluation
  */
@@ -142,6 +341,10 @@ export const zTiktokPostEvaluation = z.object({
     evaluation_text: z.union([
         z.string(),
         z.null()
+    ]).default(null),
+    content_hash: z.union([
+        z.string(),
+        z.null()
     ]).default(null)
 });
 
@@ -207,7 +410,12 @@ export const zBackendStateActionAddChannel = z.object({
  */
 export const zBackendStateActionsParams = z.object({
     add_channel: zBackendStateActionAddChannel,
-    evaluate_and_pay_for_post: zBackendStateActionEvaluateAndPayForPost
+    remove_channel: zBackendStateActionRemoveChannel,
+    backfill_channel: zBackendStateActionBackfillChannel,
+    set_post_window: zBackendStateActionSetPostWindow,
+    query_analytics: zBackendStateActionQueryAnalytics,
+    evaluate_and_pay_for_post: zBackendStateActionEvaluateAndPayForPost,
+    pay_all_eligible_posts: zBackendStateActionPayAllEligiblePosts
 });
 
 /**
@@ -222,12 +430,62 @@ export const zTiktokChannel = z.object({
     stats: zTiktokUserStats
 });
 
+/**
+ * ToolCallProgress
+ */
+export const zToolCallProgress = z.object({
+    id: z.string(),
+    name: z.string(),
+    status: z.enum([
+        'running',
+        'completed',
+        'failed'
+    ]).default('running')
+});
+
+/**
+ * PayoutProgress
+ */
+export const zPayoutProgress = z.object({
+    stage: z.enum([
+        'deciding',
+        'paying',
+        'paid',
+        'failed'
+    ]).default('deciding'),
+    message_to_creator: z.string().default(''),
+    result: z.union([
+        zPayoutResult,
+        z.null()
+    ]).default(null),
+    tool_calls: z.array(zToolCallProgress).default([]),
+    error: z.union([
+        z.string(),
+        z.null()
+    ]).default(null)
+});
+
 /**
  * BackendState
  */
 export const zBackendState = z.object({
     channels: z.array(zTiktokChannel).default([]),
+    postWindow: zPostWindow.default({
+        channel_id: null,
+        page: 0,
+        page_size: 30,
+        sort_by: 'date_posted',
+        descending: true
+    }),
+    postCountsByChannelId: z.record(z.string(), z.int()).default({}),
     postsByChannelId: z.record(z.string(), z.array(zTiktokPost)).default({}),
     postEvaluations: z.record(z.string(), zTiktokPostEvaluation).default({}),
-    postPayouts: z.record(z.string(), z.array(zPayout)).default({})
+    postPayouts: z.record(z.string(), z.array(zPayout)).default({}),
+    payoutJobs: z.record(z.string(), zPayoutJob).default({}),
+    payoutProgress: z.record(z.string(), zPayoutProgress).default({}),
+    analytics: zPostAnalytics.default({
+        channels: [],
+        ranked_by: null,
+        ranking: []
+    })
 });
@@ -8,9 +8,11 @@ import {
 } from "./sync-client/types.gen";
 import { zBackendState } from "./sync-client/zod.gen";
 
+export const BACKEND_URL = "http://localhost:8000";
+
 // global ws-session
 export const session = new Session(
-  "http://localhost:8000/ws/test-session",
+  `${BACKEND_URL}/ws/test-session`,
   "Backend",
   toast,
   "arraybuffer" // receive arraybuffer instead of blob